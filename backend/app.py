@@ -1,11 +1,12 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
 from flask_cors import CORS
 from flask import send_file, Response
-from models import ensure_indexes, init_mock_partners, upsert_user, partners, requests_col, campaigns, users
+from models import ensure_indexes, backfill_campaign_expiry_fields, backfill_campaign_channel_names, init_mock_partners, upsert_user, partners, requests_col, campaigns, users
 from scheduler import start_scheduler, check_and_post_campaigns, cleanup_finished_campaigns
 from bot import send_message, send_open_button_message
 from config import STARS_PER_CPC, TELEGRAM_BOT_TOKEN, BOT_ADMIN_CHAT_ID, APP_URL, BOT_URL, BASE_URL
-from auth import create_token, verify_token, token_required
+from auth import create_token, verify_token, token_required, create_stream_ticket, verify_stream_ticket
+import events
 from bot_handler import bot_webhook
 from time_utils import parse_day_time_to_utc, calculate_end_time
 import hmac, hashlib, time
@@ -13,12 +14,20 @@ import datetime
 import os
 import io
 import requests as http_requests
-from models import channels, validate_channel_with_telegram, add_user_channel
-from config import ADMIN_TELEGRAM_ID
+from models import channel_loader, user_loader, sync_campaign_channel_names, encode_cursor, decode_cursor
+from models import get_user_requests, count_user_requests, get_sync_delta, tombstone_channel_history
+from models import backfill_channel_analytics, get_channel_analytics, record_campaign_engagement
+from models import backfill_platform_analytics, get_platform_analytics, get_admin_counts, get_purchase_summary, get_completed_campaign_totals
+from models import get_admin_channels, get_users_by_telegram_ids
+from models import channels, validate_channel_with_telegram, add_user_channel, note_channels_viewed
+from config import ADMIN_TELEGRAM_ID, METRICS_TOKEN, TELEGRAM_API_BASE, SSE_ENABLED, SSE_TICKET_SECONDS
+from metrics import render_metrics
+from loader import open_scope, close_scope
 from models import user_tasks, folder_promo_configs, folder_promo_registrations
 import uuid
 import json
 import logging
+from bson import ObjectId
 from models import transactions
 from urllib.parse import parse_qsl
 from urllib.parse import quote, unquote
@@ -92,10 +101,33 @@ def find_next_slot_for_channel(channel_doc):
 app = Flask(__name__)
 CORS(app)
 
+CAMPAIGNS_PAGE_SIZE = 20
+MAX_CAMPAIGNS_PAGE_SIZE = 100
+REQUESTS_PAGE_SIZE = 20
+MAX_REQUESTS_PAGE_SIZE = 100
+ADMIN_CHANNELS_PAGE_SIZE = 25
+MAX_ADMIN_CHANNELS_PAGE_SIZE = 100
+# Range of the admin analytics series when no ?days= / ?from= is given
+ADMIN_ANALYTICS_DEFAULT_DAYS = 30
+
 # Register bot webhook blueprint
 app.register_blueprint(bot_webhook)
 logging.info(f"[APP] Bot webhook registered at /bot{TELEGRAM_BOT_TOKEN}")
 
+
+@app.before_request
+def open_lookup_scope():
+    """Channel/user lookups are cached for the length of one request"""
+    rule = request.url_rule.rule if request.url_rule else request.path
+    g.lookup_scope_token = open_scope(f"{request.method} {rule}")
+
+
+@app.teardown_request
+def close_lookup_scope(exc=None):
+    token = g.pop('lookup_scope_token', None)
+    if token is not None:
+        close_scope(token)
+
 #Helper function to generate proxy image URLs
 def get_proxied_image_url(original_url):
     """
@@ -284,6 +316,7 @@ def complete_invite_task(campaign_id, telegram_id):
                 '$set': {'updated_at': datetime.datetime.utcnow()}
             }
         )
+        events.reward_credited(telegram_id, reward, 'invite_task', campaign_id=campaign_id)
         
         # Mark invite task as fully completed
         user_tasks.update_one(
@@ -317,7 +350,7 @@ def generate_telegram_invoice(telegram_id, transaction_id, cpc_amount, stars_cos
     """Generate a Telegram Stars invoice using Bot API"""
     try:
         # Create invoice using sendInvoice
-        api_url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendInvoice"
+        api_url = f"{TELEGRAM_API_BASE}/bot{TELEGRAM_BOT_TOKEN}/sendInvoice"
         
         payload = {
             'chat_id': telegram_id,
@@ -397,7 +430,7 @@ def setup_telegram_webhook():
         # For local development, you can use ngrok
         # webhook_url = f"https://your-ngrok-url.ngrok.io/bot{TELEGRAM_BOT_TOKEN}"
         
-        api_url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/setWebhook"
+        api_url = f"{TELEGRAM_API_BASE}/bot{TELEGRAM_BOT_TOKEN}/setWebhook"
         
         response = requests.post(api_url, json={'url': webhook_url})
         
@@ -606,33 +639,125 @@ def list_all_channels():
 @app.route('/api/requests', methods=['GET'])
 @token_required  # ADD authentication
 def list_requests():
-    """Get requests relevant to the authenticated user"""
+    """
+    Get requests relevant to the authenticated user, newest first
+    
+    Query params (all optional):
+      box: 'inbox' (received) or 'outbox' (sent); both when omitted
+      status: one status or a comma separated list (e.g. Pending,Accepted)
+      limit, cursor: page through the list; the response is then
+        {'requests': [...], 'next_cursor': ..., 'counts': ...} instead of a
+        bare list, with per-status counts on the first page only
+    """
     telegram_id = request.telegram_id  # ADD this
+    box = request.args.get('box')
+    statuses = [s for s in request.args.get('status', '').split(',') if s]
+    limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor')
+    
+    if box not in (None, 'inbox', 'outbox'):
+        return jsonify({'error': "box must be 'inbox' or 'outbox'"}), 400
     
     try:
         # Get user's channels
-        user_channels = list(channels.find({'owner_id': telegram_id}, {'_id': 0}))
-        channel_ids = [ch.get('id') for ch in user_channels]
-        
-        if not channel_ids:
-            # No channels, return empty list
-            return jsonify([])
-        
-        # Get requests where user is either sender OR receiver
-        user_requests = list(requests_col.find({
-            '$or': [
-                {'fromChannelId': {'$in': channel_ids}},  # User sent the request
-                {'toChannelId': {'$in': channel_ids}}      # User received the request
-            ]
-        }, {'_id': 0}))
-        
-        return jsonify(user_requests)
+        channel_ids = [ch['id'] for ch in channels.find({'owner_id': telegram_id}, {'id': 1, '_id': 0})]
+        
+        if limit is None and not cursor:
+            user_requests = get_user_requests(channel_ids, box=box, statuses=statuses)
+            for req in user_requests:
+                req.pop('_id', None)
+            return jsonify(user_requests)
+        
+        after = None
+        if cursor:
+            after = decode_cursor(cursor)
+            if not after:
+                return jsonify({'error': 'Invalid cursor'}), 400
+        
+        limit = max(1, min(limit or REQUESTS_PAGE_SIZE, MAX_REQUESTS_PAGE_SIZE))
+        # One extra row tells us whether there is a next page
+        page = get_user_requests(channel_ids, box=box, statuses=statuses, after=after, limit=limit + 1)
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            last = page[-1]
+            if last.get('created_at'):
+                next_cursor = encode_cursor(last['created_at'], str(last['_id']))
+        for req in page:
+            req.pop('_id', None)
+        
+        body = {'requests': page, 'next_cursor': next_cursor}
+        if not cursor:
+            body['counts'] = count_user_requests(channel_ids)
+        return jsonify(body)
     
     except Exception as e:
         print(f"Error fetching requests: {e}")
         return jsonify([])
 
 
+@app.route('/api/sync', methods=['GET'])
+@token_required
+def sync():
+    """
+    Campaigns and requests changed since ?since=<cursor>, plus deleted ids
+    
+    Without since (or with one too old to serve incrementally) everything is
+    returned and reset is true. Pass the returned cursor on the next call.
+    """
+    since = request.args.get('since')
+    
+    try:
+        since_at = None
+        if since:
+            decoded = decode_cursor(since)
+            if not decoded:
+                return jsonify({'error': 'Invalid cursor'}), 400
+            since_at = decoded[0]
+        
+        return jsonify(get_sync_delta(request.telegram_id, since_at))
+    
+    except Exception as e:
+        logging.error(f"[SYNC] Failed to build delta for {request.telegram_id}: {e}")
+        return jsonify({'error': 'Failed to sync'}), 500
+
+
+@app.route('/api/events/ticket', methods=['POST'])
+@token_required
+def create_event_stream_ticket():
+    """Short-lived ticket for opening /api/events (404 while streaming is disabled)"""
+    if not SSE_ENABLED:
+        return jsonify({'error': 'Live events are disabled, poll /api/sync instead'}), 404
+    return jsonify({'ticket': create_stream_ticket(request.telegram_id), 'expires_in': SSE_TICKET_SECONDS})
+
+
+@app.route('/api/events', methods=['GET'])
+def event_stream():
+    """
+    Server-Sent Events stream of the user's campaign, request and balance events
+    
+    Only served with SSE_ENABLED (see config.py for the worker class it needs).
+    EventSource cannot send headers, so the stream is opened with
+    ?ticket= from /api/events/ticket rather than the session token.
+    Reconnects resume from the Last-Event-ID header (or ?last_event_id=);
+    anything older should be fetched through /api/sync.
+    """
+    if not SSE_ENABLED:
+        return jsonify({'error': 'Live events are disabled, poll /api/sync instead'}), 404
+    
+    ticket = request.args.get('ticket')
+    telegram_id = verify_stream_ticket(ticket) if ticket else None
+    if not telegram_id:
+        return jsonify({'error': 'invalid or expired ticket'}), 401
+    
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    return Response(
+        events.stream(telegram_id, last_event_id),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
 @app.route('/api/request', methods=['POST'])
 @token_required
 def create_request():
@@ -678,7 +803,8 @@ def create_request():
         'cpcCost': data.get('cpcCost'),
         'promo': data.get('promo'),
         'status': 'Pending',
-        'created_at': datetime.datetime.utcnow()
+        'created_at': datetime.datetime.utcnow(),
+        'updated_at': datetime.datetime.utcnow()
     }
     res = requests_col.insert_one(req)
     # store a string id for easy frontend references
@@ -689,6 +815,8 @@ def create_request():
         to_channel = channels.find_one({'id': req.get('toChannelId')})
         if to_channel and to_channel.get('owner_id'):
             owner_chat = to_channel.get('owner_id')
+            events.publish([owner_chat], 'request_received', request_id=str_id,
+                           fromChannel=req['fromChannel'], toChannelId=req['toChannelId'])
             text = (
                 f"📨 New cross-promo request\n\nFrom: {req['fromChannel']}\nTo: {req['toChannel']}\n"
                 f"Duration: {req.get('duration')} hrs\nScheduled: {req.get('daySelected')} {req.get('timeSelected')}"
@@ -734,7 +862,8 @@ def accept_request(req_id):
             '$set': {
                 'status': 'Accepted',
                 'accepted_at': datetime.datetime.utcnow(),
-                'accepted_by': telegram_id
+                'accepted_by': telegram_id,
+                'updated_at': datetime.datetime.utcnow()
             }
         }
     )
@@ -774,6 +903,8 @@ def accept_request(req_id):
             'status': 'pending_posting',
             'fromChannelId': req.get('fromChannelId'),
             'toChannelId': req.get('toChannelId'),
+            'from_channel_name': from_ch.get('name') if from_ch else None,
+            'to_channel_name': to_ch.get('name') if to_ch else None,
             'requester_promo': requester_promo,
             'acceptor_promo': selected_promo,
             'start_at': start_at,
@@ -784,6 +915,9 @@ def accept_request(req_id):
             'updated_at': datetime.datetime.utcnow()
         })
         
+        events.publish([from_ch.get('owner_id') if from_ch else None], 'request_accepted',
+                       request_id=req_id, campaign_id=campaign_id, toChannel=to_ch.get('name') if to_ch else None)
+        
         # Notify both parties
         time_msg = f"{daySelected} at {timeSelected.split(' - ')[0]} UTC" if daySelected and timeSelected else "the scheduled time"
         
@@ -856,7 +990,8 @@ def decline_request(req_id):
                 'status': 'Rejected',
                 'declined_at': datetime.datetime.utcnow(),
                 'declined_by': telegram_id,
-                'decline_reason': reason
+                'decline_reason': reason,
+                'updated_at': datetime.datetime.utcnow()
             }
         }
     )
@@ -867,6 +1002,7 @@ def decline_request(req_id):
     # Notify requester about the decline
     if from_ch and from_ch.get('owner_id'):
         requester_id = from_ch.get('owner_id')
+        events.publish([requester_id], 'request_declined', request_id=req_id, reason=reason)
         
         decline_message = (
             f"❌ Cross-Promo Request Declined\n\n"
@@ -913,35 +1049,44 @@ def decline_request(req_id):
 @app.route('/api/campaigns', methods=['GET'])
 @token_required
 def list_campaigns():
-    """Get campaigns relevant to the authenticated user"""
+    """
+    Get campaigns relevant to the authenticated user, newest first
+    
+    Query params (all optional):
+      status: only campaigns with this (role-specific) status
+      limit, cursor: page through the list; the response is then
+        {'campaigns': [...], 'next_cursor': ...} instead of a bare list
+    """
     telegram_id = request.telegram_id
+    status = request.args.get('status')
+    limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor')
     
     try:
         from models import get_user_campaigns
-        user_campaigns = get_user_campaigns(telegram_id)
-        
-        # Convert datetime objects to ISO strings and remove ALL ObjectId fields
-        for campaign in user_campaigns:
-            # Remove ALL MongoDB ObjectId fields that could cause issues
-            campaign.pop('_id', None)
-            campaign.pop('request_id', None)
-            
-            # Also remove nested ObjectIds in promos if they exist
-            if 'requester_promo' in campaign and isinstance(campaign['requester_promo'], dict):
-                campaign['requester_promo'].pop('_id', None)
-            if 'acceptor_promo' in campaign and isinstance(campaign['acceptor_promo'], dict):
-                campaign['acceptor_promo'].pop('_id', None)
-            if 'promo' in campaign and isinstance(campaign['promo'], dict):
-                campaign['promo'].pop('_id', None)
-            
-            # Convert datetime objects to ISO strings
-            for field in ['requester_posted_at', 'requester_ended_at', 
-                         'acceptor_posted_at', 'acceptor_ended_at',
-                         'created_at', 'updated_at', 'actual_start_at', 'actual_end_at', 'posting_deadline']:
-                if field in campaign and campaign[field]:
-                    campaign[field] = campaign[field].isoformat()
         
-        return jsonify(user_campaigns)
+        if limit is None and not cursor:
+            return jsonify(get_user_campaigns(telegram_id, status=status))
+        
+        after = None
+        if cursor:
+            after = decode_cursor(cursor)
+            if not after:
+                return jsonify({'error': 'Invalid cursor'}), 400
+        
+        limit = max(1, min(limit or CAMPAIGNS_PAGE_SIZE, MAX_CAMPAIGNS_PAGE_SIZE))
+        # One extra row tells us whether there is a next page
+        page = get_user_campaigns(telegram_id, status=status, after=after, limit=limit + 1)
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            last = page[-1]
+            if last.get('cursor_created_at'):
+                next_cursor = encode_cursor(last['cursor_created_at'], last.get('id'))
+        for camp in page:
+            camp.pop('cursor_created_at', None)
+        
+        return jsonify({'campaigns': page, 'next_cursor': next_cursor})
     
     except Exception as e:
         print(f"Error fetching campaigns: {e}")
@@ -965,8 +1110,9 @@ def send_campaign_to_telegram(campaign_id):
         from_id = campaign.get('fromChannelId')
         to_id = campaign.get('toChannelId')
         
-        from_ch = channels.find_one({'id': from_id})
-        to_ch = channels.find_one({'id': to_id})
+        found = channel_loader.load_many([from_id, to_id])
+        from_ch = found.get(from_id)
+        to_ch = found.get(to_id)
         
         if not from_ch or not to_ch:
             return jsonify({'error': 'Channel not found'}), 404
@@ -1025,8 +1171,9 @@ def verify_and_start_campaign(campaign_id):
         from_id = campaign.get('fromChannelId')
         to_id = campaign.get('toChannelId')
         
-        from_ch = channels.find_one({'id': from_id})
-        to_ch = channels.find_one({'id': to_id})
+        found = channel_loader.load_many([from_id, to_id])
+        from_ch = found.get(from_id)
+        to_ch = found.get(to_id)
         
         if not from_ch or not to_ch:
             return jsonify({'error': 'Channel not found'}), 404
@@ -1067,8 +1214,9 @@ def end_campaign(campaign_id):
         from_id = campaign.get('fromChannelId')
         to_id = campaign.get('toChannelId')
         
-        from_ch = channels.find_one({'id': from_id})
-        to_ch = channels.find_one({'id': to_id})
+        found = channel_loader.load_many([from_id, to_id])
+        from_ch = found.get(from_id)
+        to_ch = found.get(to_id)
         
         if not from_ch or not to_ch:
             return jsonify({'error': 'Channel not found'}), 404
@@ -1307,6 +1455,7 @@ def get_user_channels():
     
     try:
         user_channels_raw = list(channels.find({'owner_id': telegram_id}, {'_id': 0}))
+        note_channels_viewed(ch.get('id') for ch in user_channels_raw)
         user_channels = [_normalize_channel_for_frontend(ch) for ch in user_channels_raw]
         return jsonify(user_channels)
     except Exception as e:
@@ -1325,6 +1474,8 @@ def get_channel(channel_id):
         if not channel:
             return jsonify({'error': 'Channel not found'}), 404
 
+        note_channels_viewed([channel_id])
+
         # Normalize for frontend compatibility
         normalized = _normalize_channel_for_frontend(channel)
 
@@ -1367,19 +1518,27 @@ def update_channel(channel_id):
         
         # Update allowed fields
         update_fields = {}
-        allowed_fields = ['topic', 'selected_days', 'promos_per_day', 'price_settings', 
+        allowed_fields = ['name', 'topic', 'selected_days', 'promos_per_day', 'price_settings', 
                          'time_slots', 'promo_materials']
         
         for field in allowed_fields:
             if field in data:
                 update_fields[field] = data[field]
         
+        if 'name' in update_fields and not (isinstance(update_fields['name'], str) and update_fields['name'].strip()):
+            return jsonify({'error': 'Channel name cannot be empty'}), 400
+        
         if update_fields:
             update_fields['updated_at'] = datetime.datetime.utcnow()
             channels.update_one(
                 {'id': channel_id, 'owner_id': telegram_id},
                 {'$set': update_fields}
             )
+            channel_loader.forget(channel_id)
+            
+            # Campaigns carry the channel name; keep them in step
+            if 'name' in update_fields and update_fields['name'] != channel.get('name'):
+                sync_campaign_channel_names(channel_id, update_fields['name'])
         
         return jsonify({'ok': True, 'message': 'Channel updated successfully'})
     
@@ -1394,7 +1553,14 @@ def delete_channel(channel_id):
     telegram_id = request.telegram_id
     
     try:
+        channel = channels.find_one({'id': channel_id, 'owner_id': telegram_id}, {'_id': 1})
+        if not channel:
+            return jsonify({'error': 'Channel not found'}), 404
+        
+        # The channel's campaigns and requests leave the owner's view; tell synced clients
+        tombstone_channel_history(channel_id, telegram_id)
         result = channels.delete_one({'id': channel_id, 'owner_id': telegram_id})
+        channel_loader.forget(channel_id)
         
         if result.deleted_count == 0:
             return jsonify({'error': 'Channel not found'}), 404
@@ -1550,6 +1716,7 @@ def claim_welcome_bonus():
                 '$set': {'updated_at': datetime.datetime.utcnow()}
             }
         )
+        events.reward_credited(telegram_id, reward, 'welcome_bonus')
         
         # Mark task as completed
         user_tasks.update_one(
@@ -1589,7 +1756,7 @@ def verify_channel_join():
         # Verify user is member of the channel using Bot API
         # The channel is @cpgram_news
         try:
-            api_url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/getChatMember"
+            api_url = f"{TELEGRAM_API_BASE}/bot{TELEGRAM_BOT_TOKEN}/getChatMember"
             response = http_requests.get(
                 api_url, 
                 params={
@@ -1617,6 +1784,7 @@ def verify_channel_join():
                                 '$set': {'updated_at': datetime.datetime.utcnow()}
                             }
                         )
+                        events.reward_credited(telegram_id, reward, 'channel_join')
                         
                         # Mark task as completed
                         user_tasks.update_one(
@@ -1730,6 +1898,8 @@ def initiate_invite_task():
             },
             'post_link': None,
             'posted_at': None,
+            'expires_at': None,
+            'expiry_notified': False,
             'ended_at': None,
             'reward_given': False,
             'created_at': datetime.datetime.utcnow(),
@@ -1850,6 +2020,8 @@ def verify_invite_post_and_start(task_id):
                     'status': 'active',
                     'post_link': post_link,
                     'posted_at': now,
+                    'expires_at': now + datetime.timedelta(hours=invite_task.get('duration_hours', 12)),
+                    'expiry_notified': False,
                     'updated_at': now
                 }
             }
@@ -1900,24 +2072,11 @@ def complete_invite_task(task_id, telegram_id=None):
         if telegram_id and invite_task.get('user_id') != telegram_id:
             return {'ok': False, 'error': 'Unauthorized', 'status_code': 403}
             
-        # Check if already rewarded
-        if invite_task.get('reward_given'):
-            return {'ok': False, 'error': 'Reward already claimed', 'status_code': 400}
-            
-        # Give reward
-        reward = invite_task.get('reward', 5000)
-        users.update_one(
-            {'telegram_id': user_id},
-            {
-                '$inc': {'cpcBalance': reward},
-                '$set': {'updated_at': datetime.datetime.utcnow()}
-            }
-        )
-        
-        # Mark task as completed
+        # Mark task as completed first; only the caller that flips reward_given
+        # pays out, so the scheduler and a manual claim never both credit it
         now = datetime.datetime.utcnow()
-        campaigns.update_one(
-            {'id': task_id},
+        claimed = campaigns.find_one_and_update(
+            {'id': task_id, 'reward_given': {'$ne': True}},
             {
                 '$set': {
                     'status': 'completed',
@@ -1925,8 +2084,22 @@ def complete_invite_task(task_id, telegram_id=None):
                     'reward_given': True,
                     'updated_at': now
                 }
+            },
+            projection={'_id': 1}
+        )
+        if not claimed:
+            return {'ok': False, 'error': 'Reward already claimed', 'status_code': 400}
+            
+        # Give reward
+        reward = invite_task.get('reward', 5000)
+        users.update_one(
+            {'telegram_id': user_id},
+            {
+                '$inc': {'cpcBalance': reward},
+                '$set': {'updated_at': now}
             }
         )
+        events.reward_credited(user_id, reward, 'invite_task', campaign_id=task_id)
         
         # Mark in user_tasks that invite task is completed
         user_tasks.update_one(
@@ -2058,6 +2231,7 @@ def claim_ad_reward():
                 }
             }
         )
+        events.reward_credited(telegram_id, reward, 'ad_watch')
         
         # Log ad reward (optional - for analytics)
         try:
@@ -2109,6 +2283,7 @@ def adsgram_callback():
                 '$set': {'updated_at': datetime.datetime.utcnow()}
             }
         )
+        events.reward_credited(str(user_id), reward_amount, 'ad_watch')
         
         # Notify user
         try:
@@ -2238,7 +2413,7 @@ def telegram_webhook():
             query_id = pre_checkout_query.get('id')
             
             # Always approve (you can add validation here)
-            approve_url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/answerPreCheckoutQuery"
+            approve_url = f"{TELEGRAM_API_BASE}/bot{TELEGRAM_BOT_TOKEN}/answerPreCheckoutQuery"
             http_requests.post(approve_url, json={'pre_checkout_query_id': query_id, 'ok': True})
             
             return jsonify({'ok': True})
@@ -2299,6 +2474,7 @@ def telegram_webhook():
                         '$set': {'updated_at': datetime.datetime.utcnow()}
                     }
                 )
+                events.publish([telegram_id], 'balance_changed', delta=cpc_amount, reason='purchase')
                 
                 # Notify user
                 send_message(
@@ -2376,7 +2552,7 @@ def get_transaction(transaction_id):
         return jsonify({'error': 'Failed to fetch transaction'}), 500
 
 def update_campaign_stats(campaign_id, impressions=0, clicks=0):
-    """Update campaign statistics"""
+    """Update campaign statistics (and the host channel's analytics rollup)"""
     try:
         campaigns.update_one(
             {'id': campaign_id},
@@ -2388,6 +2564,7 @@ def update_campaign_stats(campaign_id, impressions=0, clicks=0):
                 '$set': {'updated_at': datetime.datetime.utcnow()}
             }
         )
+        record_campaign_engagement(campaign_id, impressions, clicks)
     except Exception as e:
         print(f"Error updating campaign stats: {e}")
     
@@ -2399,8 +2576,7 @@ def get_analytics():
     
     try:
         # Get user's channels
-        user_channels = list(channels.find({'owner_id': telegram_id}, {'_id': 0}))
-        channel_ids = [ch.get('id') for ch in user_channels]
+        channel_ids = [ch['id'] for ch in channels.find({'owner_id': telegram_id}, {'id': 1, '_id': 0})]
         
         if not channel_ids:
             # No channels, return zeros
@@ -2410,46 +2586,18 @@ def get_analytics():
                 'newSubscribers': 0
             })
         
-        # Calculate total impressions from completed campaigns
-        # Impressions = sum of all campaign views from user's channels
-        completed_campaigns = list(campaigns.find({
-            'status': {'$in': ['completed', 'finished']},
-            'toChannelId': {'$in': channel_ids}
-        }))
-        
-        total_impressions = 0
-        total_clicks = 0
-        
-        for campaign in completed_campaigns:
-            # Get channel subscribers as proxy for impressions
-            channel_id = campaign.get('toChannelId')
-            channel = channels.find_one({'id': channel_id})
-            if channel:
-                subscribers = channel.get('subscribers', 0)
-                # Estimate impressions as a percentage of subscribers
-                estimated_impressions = int(subscribers * 0.15)  # 15% view rate estimate
-                total_impressions += estimated_impressions
-                
-                # Estimate clicks as a percentage of impressions
-                estimated_clicks = int(estimated_impressions * 0.08)  # 8% CTR estimate
-                total_clicks += estimated_clicks
+        # Everything comes from the channels' daily rollups (kept up to date as
+        # campaigns complete), optionally limited to the last ?days=N days
+        days = request.args.get('days', type=int)
+        since = datetime.datetime.utcnow() - datetime.timedelta(days=days) if days else None
+        totals = get_channel_analytics(channel_ids, since)
+        total_impressions = totals['impressions']
+        new_subscribers = totals['new_subscribers']
         
         # Calculate engagement rate
         engagement_rate = 0
         if total_impressions > 0:
-            engagement_rate = round((total_clicks / total_impressions) * 100, 1)
-        
-        # Calculate new subscribers gained from cross-promos
-        # This is an estimate based on successful campaigns
-        new_subscribers = 0
-        successful_campaigns = campaigns.count_documents({
-            'status': {'$in': ['completed', 'finished']},
-            'fromChannelId': {'$in': channel_ids}
-        })
-        
-        # Estimate: each successful campaign brings ~20-50 new subscribers
-        # This is a rough estimate that should be replaced with actual tracking
-        new_subscribers = successful_campaigns * 35  # Average of 35 new subs per campaign
+            engagement_rate = round((totals['clicks'] / total_impressions) * 100, 1)
         
         return jsonify({
             'totalImpressions': total_impressions,
@@ -2776,42 +2924,105 @@ def get_user_settings():
 def health_check():
     """Health check endpoint for keeping the service alive"""
     return jsonify({'status': 'ok', 'timestamp': datetime.datetime.utcnow().isoformat()})
+
+# Prometheus scrape endpoint (per process); protected by METRICS_TOKEN when it is set
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    if METRICS_TOKEN and not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {METRICS_TOKEN}"):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
     
 #API routes for admin functionalities  
 @app.route('/api/admin/channels', methods=['GET'])
 @token_required
 @admin_required
 def get_all_channels_admin():
-    """Get all channels with owner information (Admin only)"""
-    try:
-        # Get all channels
-        all_channels = list(channels.find({}, {'_id': 0}))
-        
-        # Get all unique owner IDs
-        owner_ids = list(set(ch.get('owner_id') for ch in all_channels if ch.get('owner_id')))
-        
-        # Fetch owner information
-        owners = {}
-        for owner_id in owner_ids:
-            user = users.find_one({'telegram_id': owner_id}, {'_id': 0})
-            if user:
-                owners[owner_id] = {
-                    'telegram_id': user.get('telegram_id'),
-                    'first_name': user.get('first_name', ''),
-                    'last_name': user.get('last_name', ''),
-                    'username': user.get('username', '')
-                }
+    """
+    Get channels with owner information for moderation (Admin only), newest first
+    
+    Query params (all optional):
+      status, topic, language: exact filters
+      search: start of the channel name or username
+      limit, cursor: page size and where to continue from (next_cursor)
+    Rows are slim; GET /api/admin/channels/<id> has the full document.
+    The first page also carries the per-status counts.
+    """
+    limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor')
+    
+    try:
+        # Pages are keyed on _id, which every channel has (older ones lack created_at)
+        after = None
+        if cursor:
+            decoded = decode_cursor(cursor)
+            if not decoded or not ObjectId.is_valid(decoded[1]):
+                return jsonify({'error': 'Invalid cursor'}), 400
+            after = ObjectId(decoded[1])
+        
+        limit = max(1, min(limit or ADMIN_CHANNELS_PAGE_SIZE, MAX_ADMIN_CHANNELS_PAGE_SIZE))
+        # One extra row tells us whether there is a next page
+        page = get_admin_channels(
+            status=request.args.get('status'),
+            topic=request.args.get('topic'),
+            language=request.args.get('language'),
+            search=request.args.get('search'),
+            after=after,
+            limit=limit + 1
+        )
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            last_id = page[-1]['_id']
+            next_cursor = encode_cursor(last_id.generation_time.replace(tzinfo=None), str(last_id))
+        for ch in page:
+            ch.pop('_id', None)
+        
+        # Owners of this page in one $in query
+        owners = get_users_by_telegram_ids(
+            [ch.get('owner_id') for ch in page],
+            {'_id': 0, 'telegram_id': 1, 'first_name': 1, 'last_name': 1, 'username': 1}
+        )
         
-        return jsonify({
-            'channels': all_channels,
-            'owners': owners
-        })
+        response = {
+            'channels': page,
+            'owners': owners,
+            'next_cursor': next_cursor
+        }
+        if not cursor:
+            response['counts'] = get_admin_counts()['channels']
+        return jsonify(response)
     
     except Exception as e:
         print(f"Error fetching all channels: {e}")
         return jsonify({'error': 'Failed to fetch channels'}), 500
 
 
+@app.route('/api/admin/channels/<channel_id>', methods=['GET'])
+@token_required
+@admin_required
+def get_channel_admin(channel_id):
+    """Get one channel's full document and owner (Admin only)"""
+    try:
+        channel = channels.find_one({'id': channel_id}, {'_id': 0})
+        if not channel:
+            return jsonify({'error': 'Channel not found'}), 404
+        
+        owner = user_loader.load(channel.get('owner_id'))
+        return jsonify({
+            'channel': channel,
+            'owner': {
+                'telegram_id': owner.get('telegram_id'),
+                'first_name': owner.get('first_name', ''),
+                'last_name': owner.get('last_name', ''),
+                'username': owner.get('username', '')
+            } if owner else None
+        })
+    
+    except Exception as e:
+        print(f"Error fetching channel {channel_id}: {e}")
+        return jsonify({'error': 'Failed to fetch channel'}), 500
+
+
 @app.route('/api/admin/channels/<channel_id>/moderate', methods=['POST'])
 @token_required
 @admin_required
@@ -2906,30 +3117,9 @@ def moderate_channel(channel_id):
 @token_required
 @admin_required
 def get_admin_stats():
-    """Get admin dashboard statistics"""
+    """Get admin dashboard statistics (cached for ADMIN_STATS_CACHE_SECONDS)"""
     try:
-        total_channels = channels.count_documents({})
-        pending_channels = channels.count_documents({'status': 'pending'})
-        approved_channels = channels.count_documents({'status': 'approved'})
-        rejected_channels = channels.count_documents({'status': 'rejected'})
-        paused_channels = channels.count_documents({'status': 'paused'})
-        
-        total_users = users.count_documents({})
-        total_requests = requests_col.count_documents({})
-        total_campaigns = campaigns.count_documents({})
-        
-        return jsonify({
-            'channels': {
-                'total': total_channels,
-                'pending': pending_channels,
-                'approved': approved_channels,
-                'rejected': rejected_channels,
-                'paused': paused_channels
-            },
-            'users': total_users,
-            'requests': total_requests,
-            'campaigns': total_campaigns
-        })
+        return jsonify(get_admin_counts())
     
     except Exception as e:
         print(f"Error fetching admin stats: {e}")
@@ -2939,23 +3129,56 @@ def get_admin_stats():
 @token_required
 @admin_required
 def get_admin_analytics():
-    """Get platform-wide analytics (Admin only)"""
+    """
+    Get platform-wide analytics (Admin only)
+    Totals plus a day/week series (?period=, ?days= or ?from=/?to= as
+    YYYY-MM-DD, optional ?niche=) and a per-niche breakdown over the range,
+    served from the rollups the scheduler keeps up to date
+    """
     try:
-        total_channels = channels.count_documents({'status': 'approved'})
-        total_campaigns = campaigns.count_documents({})
-        completed_campaigns = campaigns.count_documents({'status': {'$in': ['completed', 'finished']}})
-        
-        # Total platform impressions
-        all_campaigns = list(campaigns.find({'status': {'$in': ['completed', 'finished']}}))
-        platform_impressions = sum(c.get('impressions', 0) for c in all_campaigns)
-        platform_clicks = sum(c.get('clicks', 0) for c in all_campaigns)
+        period = request.args.get('period', 'day')
+        if period not in ('day', 'week'):
+            return jsonify({'error': 'period must be day or week'}), 400
+        try:
+            since = datetime.datetime.strptime(request.args['from'], '%Y-%m-%d') if request.args.get('from') else None
+            until = datetime.datetime.strptime(request.args['to'], '%Y-%m-%d') if request.args.get('to') else None
+        except ValueError:
+            return jsonify({'error': 'from/to must be YYYY-MM-DD'}), 400
+        if not since:
+            days = request.args.get('days', ADMIN_ANALYTICS_DEFAULT_DAYS, type=int)
+            since = datetime.datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) \
+                - datetime.timedelta(days=max(days, 1) - 1)
+        if period == 'week':
+            # Weekly buckets start on Monday
+            since -= datetime.timedelta(days=since.weekday())
+        
+        # All-time totals come from the same short-lived cache as the dashboard counts
+        counts = get_admin_counts()
+        completed = get_completed_campaign_totals()
+        
+        rollups = get_platform_analytics(period, since, until, request.args.get('niche'))
+        
+        def bucket(row):
+            return {
+                'campaignsCreated': row['campaigns_created'],
+                'campaignsCompleted': row['campaigns_completed'],
+                'impressions': row['impressions'],
+                'clicks': row['clicks'],
+                'newSubscribers': row['new_subscribers'],
+                'newChannels': row['new_channels']
+            }
         
         return jsonify({
-            'totalChannels': total_channels,
-            'totalCampaigns': total_campaigns,
-            'completedCampaigns': completed_campaigns,
-            'platformImpressions': platform_impressions,
-            'platformClicks': platform_clicks
+            'totalChannels': counts['channels']['approved'],
+            'totalCampaigns': counts['campaigns'],
+            'completedCampaigns': completed['count'],
+            'platformImpressions': completed['impressions'],
+            'platformClicks': completed['clicks'],
+            'period': period,
+            'from': since.date().isoformat(),
+            'to': until.date().isoformat() if until else None,
+            'series': [{'start': row['_id'].date().isoformat(), **bucket(row)} for row in rollups['series']],
+            'niches': [{'niche': row['_id'], **bucket(row)} for row in rollups['niches']]
         })
     
     except Exception as e:
@@ -2988,31 +3211,8 @@ def admin_reset_invite_tasks():
 @token_required
 @admin_required
 def get_purchase_stats():
-    """Get purchase statistics"""
-    total_transactions = transactions.count_documents({})
-    successful = transactions.count_documents({'status': 'SUCCESS'})
-    pending = transactions.count_documents({'status': 'PENDING'})
-    failed = transactions.count_documents({'status': 'FAILED'})
-    
-    # Calculate total revenue
-    pipeline = [
-        {'$match': {'status': 'SUCCESS'}},
-        {'$group': {
-            '_id': None,
-            'total_cpc': {'$sum': '$cpc_amount'},
-            'total_stars': {'$sum': '$stars_cost'}
-        }}
-    ]
-    
-    revenue = list(transactions.aggregate(pipeline))
-    
-    return jsonify({
-        'total_transactions': total_transactions,
-        'successful': successful,
-        'pending': pending,
-        'failed': failed,
-        'revenue': revenue[0] if revenue else {'total_cpc': 0, 'total_stars': 0}
-    })
+    """Get purchase statistics (cached for ADMIN_STATS_CACHE_SECONDS)"""
+    return jsonify(get_purchase_summary())
     
 @app.route('/api/admin/campaigns/debug', methods=['GET'])
 @token_required
@@ -3241,6 +3441,21 @@ def get_broadcast_status(broadcast_id):
         'progress_percentage': round((status['sent'] + status['failed']) / status['total'] * 100, 1)
     })
 
+#Scheduler catch-up (post-downtime backlog drain) status endpoint
+@app.route('/api/admin/scheduler/catch-up', methods=['GET'])
+@token_required
+@admin_required
+def get_catch_up_status():
+    """Get progress of the scheduler's catch-up run"""
+    from scheduler import get_catch_up_status as load_catch_up_status
+    
+    status = dict(load_catch_up_status())
+    total = status.get('cleanups_total', 0) + status.get('posts_total', 0)
+    done = status.get('cleanups_done', 0) + status.get('posts_done', 0)
+    status['progress_percentage'] = round(done / total * 100, 1) if total else 100.0
+    
+    return jsonify({'ok': True, **status})
+
 #Test follow-up system for a user  
 @app.route('/api/admin/test-followup/<telegram_id>', methods=['POST'])
 @token_required
@@ -3289,7 +3504,7 @@ def setup_webhook_endpoint():
     try:
         import requests as http_requests
         
-        api_url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/setWebhook"
+        api_url = f"{TELEGRAM_API_BASE}/bot{TELEGRAM_BOT_TOKEN}/setWebhook"
         response = http_requests.post(api_url, json={'url': webhook_url})
         
         if response.status_code == 200:
@@ -3307,7 +3522,7 @@ def setup_webhook_endpoint():
 def check_webhook_status():
     """Check current webhook configuration"""
     try:
-        api_url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/getWebhookInfo"
+        api_url = f"{TELEGRAM_API_BASE}/bot{TELEGRAM_BOT_TOKEN}/getWebhookInfo"
         response = http_requests.get(api_url, timeout=10)
         
         if response.status_code == 200:
@@ -3342,7 +3557,7 @@ def setup_webhook_admin():
         logging.info(f"[WEBHOOK SETUP] Setting webhook to: {webhook_url}")
         
         # Set webhook with Telegram
-        api_url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/setWebhook"
+        api_url = f"{TELEGRAM_API_BASE}/bot{TELEGRAM_BOT_TOKEN}/setWebhook"
         
         payload = {
             'url': webhook_url,
@@ -3478,6 +3693,7 @@ def submit_folder_promo():
             
     # Deduct coins
     users.update_one({'telegram_id': telegram_id}, {'$inc': {'cpcBalance': -10000}})
+    events.publish([telegram_id], 'balance_changed', delta=-10000, reason='folder_promo_registration')
     
     reg_id = f"fp_{uuid.uuid4().hex[:12]}"
     
@@ -3605,6 +3821,7 @@ def reject_folder_promo(reg_id):
     # Refund the user
     refund_amount = reg.get('paid_amount', 10000)
     users.update_one({'telegram_id': reg.get('user_telegram_id')}, {'$inc': {'cpcBalance': refund_amount}})
+    events.publish([reg.get('user_telegram_id')], 'balance_changed', delta=refund_amount, reason='folder_promo_refund')
     
     # Notify user
     try:
@@ -3617,6 +3834,10 @@ def reject_folder_promo(reg_id):
 
 # Initialize database
 ensure_indexes()
+backfill_campaign_expiry_fields()
+backfill_campaign_channel_names()
+backfill_channel_analytics()
+backfill_platform_analytics()
 init_mock_partners()
 
 # Check if we should run background tasks (default to yes)
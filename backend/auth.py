@@ -1,5 +1,5 @@
 import jwt
-from config import JWT_SECRET, JWT_EXPIRY_HOURS
+from config import JWT_SECRET, JWT_EXPIRY_HOURS, SSE_TICKET_SECONDS
 from datetime import datetime, timedelta
 from functools import wraps
 from flask import request, jsonify
@@ -19,12 +19,40 @@ def verify_token(token):
     """Verify and decode a JWT token. Returns user_id or None."""
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+        # Single-purpose tokens (stream tickets) are not session tokens
+        if payload.get('purpose'):
+            return None
         return payload.get('telegram_id')
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidTokenError:
         return None
 
+
+def create_stream_ticket(telegram_id):
+    """
+    Short-lived ticket that only opens the user's /api/events stream
+    EventSource cannot send headers, so this goes in the URL instead of the session token
+    """
+    payload = {
+        'telegram_id': str(telegram_id),
+        'purpose': 'event_stream',
+        'iat': datetime.utcnow(),
+        'exp': datetime.utcnow() + timedelta(seconds=SSE_TICKET_SECONDS)
+    }
+    return jwt.encode(payload, JWT_SECRET, algorithm='HS256')
+
+
+def verify_stream_ticket(ticket):
+    """Verify a stream ticket. Returns user_id or None."""
+    try:
+        payload = jwt.decode(ticket, JWT_SECRET, algorithms=['HS256'])
+        if payload.get('purpose') != 'event_stream':
+            return None
+        return payload.get('telegram_id')
+    except jwt.InvalidTokenError:
+        return None
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -1,9 +1,9 @@
 import requests
 import json
-from config import TELEGRAM_BOT_TOKEN, BOT_URL
+from config import TELEGRAM_BOT_TOKEN, TELEGRAM_API_BASE, BOT_URL
 import logging
 
-API_URL = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}"
+API_URL = f"{TELEGRAM_API_BASE}/bot{TELEGRAM_BOT_TOKEN}"
 
 # Send a text message to a chat
 def send_message(chat_id, text, parse_mode='HTML', reply_markup=None):
@@ -72,6 +72,32 @@ def send_open_button_message(chat_id, text, button_text='Open'):
     return send_message(chat_id, text, reply_markup=keyboard)
 
 
+def copy_message(chat_id, from_chat_id, message_id, reply_markup=None):
+    """Copy an existing message (media, caption and formatting) into another chat without re-uploading"""
+    url = f"{API_URL}/copyMessage"
+    payload = {'chat_id': chat_id, 'from_chat_id': from_chat_id, 'message_id': message_id}
+    if reply_markup is not None:
+        payload['reply_markup'] = reply_markup
+    try:
+        r = requests.post(url, json=payload, timeout=10)
+        try:
+            r.raise_for_status()
+        except requests.exceptions.HTTPError:
+            try:
+                resp = r.json()
+            except Exception:
+                resp = {'ok': False, 'description': r.text}
+            logging.error(f'Failed to copy message {message_id} to {chat_id}: {resp}')
+            return resp
+        try:
+            return r.json()
+        except Exception:
+            return {'ok': True, 'result': {}}
+    except Exception as e:
+        logging.exception('Failed to copy message')
+        return {'ok': False, 'description': str(e)}
+
+
 def delete_message(chat_id, message_id):
     url = f"{API_URL}/deleteMessage"
     payload = {'chat_id': chat_id, 'message_id': message_id}
@@ -175,6 +201,96 @@ def send_campaign_promo_for_posting(chat_id, promo_text, promo_link, promo_image
         logging.exception(f'[BOT] Failed to send campaign promo to {chat_id}')
         return None
             
+def get_chat(chat_id):
+    """getChat: resolves @usernames to the chat's numeric id (result['id'])"""
+    url = f"{API_URL}/getChat"
+    try:
+        r = requests.post(url, json={'chat_id': chat_id}, timeout=10)
+        return r.json()
+    except Exception as e:
+        logging.exception(f'Failed to get chat {chat_id}')
+        return {'ok': False, 'description': str(e)}
+
+
+def _prepared(method, chat_id, text, photo=None, reply_markup=None):
+    payload = {'chat_id': chat_id, 'parse_mode': 'HTML'}
+    if photo:
+        payload.update({'photo': photo, 'caption': text})
+    else:
+        payload['text'] = text
+    if reply_markup is not None:
+        payload['reply_markup'] = reply_markup
+    return {'method': method, 'payload': payload}
+
+
+def build_invite_campaign_post(chat_id, promo_text, bot_url):
+    """Ready-to-send invite campaign post (see send_prepared_post); falls back to text if the photo fails"""
+    # CP Gram branded image URL
+    image_url = "https://ibb.co/gbn6kctV"
+    
+    # Build the caption directly from the submitted promo text
+    caption = f"{promo_text}"
+    
+    # Create inline keyboard with call-to-action button
+    keyboard = {
+        'inline_keyboard': [[
+            {'text': '🚀 Join CP Gram Now', 'url': bot_url}
+        ]]
+    }
+    
+    prepared = _prepared('sendPhoto', chat_id, caption, photo=image_url, reply_markup=keyboard)
+    prepared['fallback'] = _prepared('sendMessage', chat_id, caption, reply_markup=keyboard)
+    return prepared
+
+
+def build_campaign_post(chat_id, promo):
+    """Ready-to-send cross-promotion post for promo (see send_prepared_post)"""
+    promo_text = promo.get('text', '')
+    promo_link = promo.get('link', '')
+    promo_image = promo.get('image', '')
+    promo_cta = promo.get('cta', 'Learn More')
+    
+    # Build the message WITHOUT any preview labels or titles to match manual posting
+    caption = f"{promo_text}\n\n<a href='{BOT_URL}'>Powered by CP Gram</a>"
+    
+    # Create inline keyboard with CTA button
+    keyboard = None
+    if promo_link and promo_cta:
+        keyboard = {
+            'inline_keyboard': [[
+                {'text': promo_cta, 'url': promo_link}
+            ]]
+        }
+    
+    # Send with image if available, otherwise just text
+    if promo_image:
+        return _prepared('sendPhoto', chat_id, caption, photo=promo_image, reply_markup=keyboard)
+    return _prepared('sendMessage', chat_id, caption, reply_markup=keyboard)
+
+
+def send_prepared_post(prepared):
+    """
+    Send a payload built by build_campaign_post / build_invite_campaign_post
+    (possibly pre-warmed with a canonical chat id and cached file_id)
+    """
+    chat_id = prepared['payload'].get('chat_id')
+    url = f"{API_URL}/{prepared['method']}"
+    try:
+        r = requests.post(url, json=prepared['payload'], timeout=10)
+        try:
+            result = r.json()
+        except Exception:
+            result = {'ok': r.ok, 'description': r.text, 'result': {}}
+    except Exception as e:
+        logging.exception(f"Failed to {prepared['method']} to {chat_id}")
+        result = {'ok': False, 'description': str(e)}
+    
+    if not result.get('ok') and prepared.get('fallback'):
+        logging.warning(f"[BOT] {prepared['method']} failed for {chat_id}, falling back: {result}")
+        return send_prepared_post(prepared['fallback'])
+    return result
+
+
 def send_invite_campaign_post(chat_id, promo_text, BOT_URL):
     """
     Send an invite campaign post with CP Gram branding
@@ -189,33 +305,9 @@ def send_invite_campaign_post(chat_id, promo_text, BOT_URL):
         Response from Telegram API with message details
     """
     try:
-        # CP Gram branded image URL
-        image_url = "https://ibb.co/gbn6kctV"
-        
-        # Build the caption directly from the submitted promo text
-        caption = f"{promo_text}"
-        
-        # Create inline keyboard with call-to-action button
-        keyboard = {
-            'inline_keyboard': [[
-                {'text': '🚀 Join CP Gram Now', 'url': BOT_URL}
-            ]]
-        }
-        
-        # Send photo with caption and button
+        # Send photo with caption and button (text fallback is part of the payload)
         logging.info(f"[BOT] Sending invite campaign to chat_id: {chat_id}")
-        result = send_photo(
-            chat_id=chat_id,
-            photo_url=image_url,
-            caption=caption,
-            parse_mode='HTML',
-            reply_markup=keyboard
-        )
-
-        # If photo fails, fallback to text
-        if not result or not result.get('ok'):
-            logging.warning(f"[BOT] Photo post failed for {chat_id}, falling back to text: {result}")
-            result = send_message(chat_id, caption, reply_markup=keyboard)
+        result = send_prepared_post(build_invite_campaign_post(chat_id, promo_text, BOT_URL))
 
         if result and result.get('ok'):
             logging.info(f"[BOT] Successfully posted invite campaign to {chat_id}, message_id: {result.get('result', {}).get('message_id')}")
@@ -240,42 +332,8 @@ def send_campaign_post(chat_id, promo):
         Response from Telegram API with message details
     """
     try:
-        promo_name = promo.get('name', 'Promotion')
-        promo_text = promo.get('text', '')
-        promo_link = promo.get('link', '')
-        promo_image = promo.get('image', '')
-        promo_cta = promo.get('cta', 'Learn More')
-        
-        # Build the message WITHOUT any preview labels or titles to match manual posting
-        caption = f"{promo_text}\n\n<a href='{BOT_URL}'>Powered by CP Gram</a>"
-        
-        # Create inline keyboard with CTA button
-        keyboard = None
-        if promo_link and promo_cta:
-            keyboard = {
-                'inline_keyboard': [[
-                    {'text': promo_cta, 'url': promo_link}
-                ]]
-            }
-        
-        # Send with image if available, otherwise just text
         logging.info(f"Sending campaign post to chat_id: {chat_id}")
-        
-        if promo_image:
-            result = send_photo(
-                chat_id=chat_id,
-                photo_url=promo_image,
-                caption=caption,
-                parse_mode='HTML',
-                reply_markup=keyboard
-            )
-        else:
-            result = send_message(
-                chat_id=chat_id,
-                text=caption,
-                parse_mode='HTML',
-                reply_markup=keyboard
-            )
+        result = send_prepared_post(build_campaign_post(chat_id, promo))
         
         if result and result.get('ok'):
             logging.info(f"Successfully posted campaign to {chat_id}, message_id: {result.get('result', {}).get('message_id')}")
@@ -446,6 +504,17 @@ def send_followup_message(chat_id, message_config):
         logging.exception(f'[BOT] Failed to send follow-up message to {chat_id}')
         return None
 
+def folder_promo_keyboard(promo_link):
+    """Call-to-action keyboard for folder promo posts (None without a link)"""
+    if not promo_link:
+        return None
+    return {
+        'inline_keyboard': [[
+            {'text': 'Join Channels', 'url': promo_link}
+        ]]
+    }
+
+
 def send_folder_promo_post(chat_id, promo_text, promo_link, promo_image, bot_url):
     """
     Send a folder cross promotion post with CP Gram branding
@@ -455,13 +524,7 @@ def send_folder_promo_post(chat_id, promo_text, promo_link, promo_image, bot_url
         caption = f"{promo_text}\n\n<a href='{bot_url}'>Powered by CP Gram</a>"
         
         # Create inline keyboard with call-to-action button
-        keyboard = None
-        if promo_link:
-            keyboard = {
-                'inline_keyboard': [[
-                    {'text': 'Join Channels', 'url': promo_link}
-                ]]
-            }
+        keyboard = folder_promo_keyboard(promo_link)
         
         # Send photo with caption and button
         logging.info(f"[BOT] Sending folder promo to chat_id: {chat_id}")
@@ -0,0 +1,119 @@
+import threading
+import logging
+import time
+from datetime import datetime
+from pymongo.errors import PyMongoError, OperationFailure
+from models import campaigns, folder_promo_registrations, scheduler_state
+
+# Server codes meaning the stored resume token can no longer be used
+RESUME_TOKEN_LOST_CODES = (260, 280, 286)
+
+# Only changes that can move a campaign's due time are interesting
+CAMPAIGN_PIPELINE = [{'$match': {'$or': [
+    {'operationType': {'$in': ['insert', 'replace']}},
+    {'updateDescription.updatedFields.status': {'$exists': True}},
+    {'updateDescription.updatedFields.start_at': {'$exists': True}},
+    {'updateDescription.updatedFields.end_at': {'$exists': True}}
+]}}]
+
+REGISTRATION_PIPELINE = [{'$match': {'$or': [
+    {'operationType': {'$in': ['insert', 'replace']}},
+    {'updateDescription.updatedFields.status': 'approved'}
+]}}]
+
+_stop = threading.Event()
+_threads = []
+
+
+def _state_id(collection):
+    return f"change_stream:{collection.name}"
+
+
+def load_resume_token(collection):
+    state = scheduler_state.find_one({'_id': _state_id(collection)})
+    return state.get('resume_token') if state else None
+
+
+def save_resume_token(collection, token):
+    scheduler_state.update_one(
+        {'_id': _state_id(collection)},
+        {'$set': {'resume_token': token, 'updated_at': datetime.utcnow()}},
+        upsert=True
+    )
+
+
+def clear_resume_token(collection):
+    scheduler_state.delete_one({'_id': _state_id(collection)})
+
+
+def _watch(collection, pipeline, on_change, on_reset):
+    """
+    Follow one collection's change stream until stopped
+    on_reset() is called whenever there is no usable resume token, so the
+    caller can rebuild its queue from a full scan
+    """
+    while not _stop.is_set():
+        token = load_resume_token(collection)
+        if token is None:
+            on_reset()
+
+        try:
+            with collection.watch(pipeline, full_document='updateLookup', resume_after=token) as stream:
+                logging.info(f"[CHANGE_STREAM] Watching {collection.name} (resumed={token is not None})")
+                while not _stop.is_set():
+                    change = stream.try_next()
+                    if change is None:
+                        # Remember where an idle stream is, so restarts skip nothing
+                        if stream.resume_token is not None:
+                            save_resume_token(collection, stream.resume_token)
+                        _stop.wait(1)
+                        continue
+
+                    doc = change.get('fullDocument')
+                    if doc:
+                        try:
+                            on_change(doc)
+                        except Exception as e:
+                            logging.error(f"[CHANGE_STREAM] Handler failed for {collection.name} change: {e}")
+                    save_resume_token(collection, change['_id'])
+        except OperationFailure as e:
+            if e.code in RESUME_TOKEN_LOST_CODES:
+                logging.warning(f"[CHANGE_STREAM] Resume token for {collection.name} is no longer valid, rescanning")
+                clear_resume_token(collection)
+            else:
+                logging.error(f"[CHANGE_STREAM] {collection.name} stream failed: {e}")
+                time.sleep(5)
+        except PyMongoError as e:
+            logging.error(f"[CHANGE_STREAM] {collection.name} stream failed: {e}")
+            time.sleep(5)
+
+
+def start_change_streams(on_campaign, on_registration, on_reset):
+    """
+    Start one daemon watcher thread per collection
+    on_campaign(doc) / on_registration(doc) receive the full changed document
+    """
+    stop_change_streams()
+    _stop.clear()
+    watchers = [
+        (campaigns, CAMPAIGN_PIPELINE, on_campaign),
+        (folder_promo_registrations, REGISTRATION_PIPELINE, on_registration)
+    ]
+    for collection, pipeline, on_change in watchers:
+        reset = on_reset if collection is campaigns else (lambda: None)
+        thread = threading.Thread(
+            target=_watch,
+            args=(collection, pipeline, on_change, reset),
+            name=f"change-stream-{collection.name}",
+            daemon=True
+        )
+        thread.start()
+        _threads.append(thread)
+
+
+def stop_change_streams(timeout=10):
+    """Stop the watchers and wait for them, so a restart never runs two per collection"""
+    _stop.set()
+    for thread in _threads:
+        thread.join(timeout)
+    _threads.clear()
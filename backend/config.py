@@ -5,7 +5,23 @@ import hashlib
 load_dotenv()
 
 MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/growthguru')
+# Transactions need a replica set (a local single-node one is enough)
+MONGO_USE_TRANSACTIONS = os.getenv('MONGO_USE_TRANSACTIONS', '0') == '1'
+MONGO_WRITE_BATCH_SIZE = int(os.getenv('MONGO_WRITE_BATCH_SIZE', '100'))  # Campaigns settled per round/transaction
+# Reactive scheduling from change streams (also needs a replica set)
+SCHEDULER_CHANGE_STREAMS = os.getenv('SCHEDULER_CHANGE_STREAMS', '0') == '1'
+SCHEDULER_SAFETY_POLL_SECONDS = int(os.getenv('SCHEDULER_SAFETY_POLL_SECONDS', '300'))  # Fallback polling while change streams are on
+# Every worker runs the scheduler, but only the holder of this Mongo lease runs
+# the change-stream watchers, the due-time queue and catch-up; others take over when it lapses
+SCHEDULER_LEADER_LEASE_SECONDS = int(os.getenv('SCHEDULER_LEADER_LEASE_SECONDS', '30'))
+FOLDER_PROMO_LATE_JOIN_MINUTES = int(os.getenv('FOLDER_PROMO_LATE_JOIN_MINUTES', '60'))  # Approvals this soon after a slot still join it
+# Catch-up mode drains campaigns that fell due while the scheduler was down
+SCHEDULER_CATCHUP_ON_START = os.getenv('SCHEDULER_CATCHUP_ON_START', '0') == '1'  # Runs in the scheduler leader only
+SCHEDULER_CATCHUP_RATE = float(os.getenv('SCHEDULER_CATCHUP_RATE', '5'))  # Telegram sends per second while catching up
+SCHEDULER_CATCHUP_STALE_POST_MINUTES = int(os.getenv('SCHEDULER_CATCHUP_STALE_POST_MINUTES', '60'))
+SCHEDULER_CATCHUP_STALE_POLICY = os.getenv('SCHEDULER_CATCHUP_STALE_POLICY', 'skip')  # post | skip | shift
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN', '')
+TELEGRAM_API_BASE = os.getenv('TELEGRAM_API_BASE', 'https://api.telegram.org').rstrip('/')  # Point at perf/fake_telegram.py for benchmarks
 BOT_ADMIN_CHAT_ID = os.getenv('BOT_ADMIN_CHAT_ID')
 VITE_API_URL = os.getenv('VITE_API_URL', 'http://localhost:5000')
 JWT_SECRET = os.getenv('JWT_SECRET', 'your-secret-key-change-in-production')
@@ -14,6 +30,31 @@ ADMIN_TELEGRAM_ID = os.getenv('ADMIN_TELEGRAM_ID', '123456789')
 APP_URL = os.getenv('APP_URL', 'http://localhost:3000')
 BOT_URL = os.getenv('BOT_URL', APP_URL)  # Fall back to APP_URL if BOT_URL not set
 BASE_URL = os.environ.get('VITE_API_URL') or os.environ.get('APP_URL') or 'http://localhost:5000'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')  # Bearer token required by /metrics when set
+
+# Bulk Telegram sends (folder promo fan-out etc.)
+TELEGRAM_MAX_SENDS_PER_SECOND = float(os.getenv('TELEGRAM_MAX_SENDS_PER_SECOND', '25'))  # Bot API allows ~30/s overall
+TELEGRAM_DISPATCH_WORKERS = int(os.getenv('TELEGRAM_DISPATCH_WORKERS', '8'))
+FOLLOWUP_BATCH_SIZE = int(os.getenv('FOLLOWUP_BATCH_SIZE', '200'))  # Onboarding users claimed per batch
+SUBSCRIBER_REFRESH_INTERVAL_MINUTES = int(os.getenv('SUBSCRIBER_REFRESH_INTERVAL_MINUTES', '30'))  # Every channel is refreshed about this often
+SUBSCRIBER_REFRESH_TICK_SECONDS = int(os.getenv('SUBSCRIBER_REFRESH_TICK_SECONDS', '60'))  # The interval's work is spread over ticks this long
+SUBSCRIBER_REFRESH_WORKERS = int(os.getenv('SUBSCRIBER_REFRESH_WORKERS', '4'))
+SUBSCRIBER_HISTORY_HOURLY_DAYS = int(os.getenv('SUBSCRIBER_HISTORY_HOURLY_DAYS', '14'))  # Raw samples kept this long, daily summaries forever
+FOLDER_PROMO_STAGING_CHAT_ID = os.getenv('FOLDER_PROMO_STAGING_CHAT_ID')  # Chat the bot posts each niche promo to once before copying it out
+SLOT_PREWARM_MINUTES = int(os.getenv('SLOT_PREWARM_MINUTES', '5'))  # Campaigns starting this soon get ready-to-send payloads
+SLOT_JITTER_SECONDS = int(os.getenv('SLOT_JITTER_SECONDS', '60'))  # Posts booked for the same slot are spread over this window before it
+MEDIA_STAGING_CHAT_ID = os.getenv('MEDIA_STAGING_CHAT_ID', FOLDER_PROMO_STAGING_CHAT_ID)  # Chat used to upload promo images once and cache their file_id
+SYNC_OVERLAP_SECONDS = int(os.getenv('SYNC_OVERLAP_SECONDS', '5'))  # /api/sync re-sends changes this close to the cursor so late-committed writes are not missed
+SYNC_TOMBSTONE_DAYS = int(os.getenv('SYNC_TOMBSTONE_DAYS', '30'))  # Deletions are kept this long; older cursors get a full resync
+USER_EVENTS_CAP_MB = int(os.getenv('USER_EVENTS_CAP_MB', '64'))  # Size of the capped collection feeding /api/events
+# Each open /api/events stream occupies a worker thread for up to SSE_MAX_STREAM_SECONDS:
+# only enable it with a threaded or async worker class (gunicorn -k gthread --threads N,
+# or -k gevent). While it is off the Mini App polls /api/sync instead
+SSE_ENABLED = os.getenv('SSE_ENABLED', '0') == '1'
+SSE_TICKET_SECONDS = int(os.getenv('SSE_TICKET_SECONDS', '60'))  # Stream tickets only open a stream, and only this soon after being issued
+SSE_HEARTBEAT_SECONDS = int(os.getenv('SSE_HEARTBEAT_SECONDS', '15'))
+SSE_MAX_STREAM_SECONDS = int(os.getenv('SSE_MAX_STREAM_SECONDS', '300'))  # Streams are closed after this and the browser reconnects, freeing the worker
+ADMIN_STATS_CACHE_SECONDS = int(os.getenv('ADMIN_STATS_CACHE_SECONDS', '30'))  # Admin dashboard counts are reused this long per worker (0 disables)
 
 def telegram_secret_key():
     # Per Telegram login widget verification: secret key is SHA256 of bot token
@@ -0,0 +1,76 @@
+import threading
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import TELEGRAM_MAX_SENDS_PER_SECOND, TELEGRAM_DISPATCH_WORKERS
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Drain the bucket so nobody sends for `seconds` (Telegram asked us to back off)"""
+        with self.lock:
+            self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+
+# One limiter shared by every bulk Telegram send in this process
+telegram_limiter = TokenBucket(TELEGRAM_MAX_SENDS_PER_SECOND)
+
+
+def _retry_after(result):
+    if isinstance(result, dict) and not result.get('ok') and result.get('error_code') == 429:
+        return (result.get('parameters') or {}).get('retry_after', 1)
+    return None
+
+
+def _call(func, args, max_retries):
+    result = None
+    for _ in range(max_retries + 1):
+        telegram_limiter.acquire()
+        try:
+            result = func(*args)
+        except Exception as e:
+            logging.error(f"[DISPATCH] {func.__name__} failed: {e}")
+            return None
+        retry_after = _retry_after(result)
+        if retry_after is None:
+            return result
+        logging.warning(f"[DISPATCH] Rate limited by Telegram, backing off {retry_after}s")
+        telegram_limiter.pause(retry_after)
+    return result
+
+
+def dispatch(func, calls, workers=None, max_retries=2):
+    """
+    Run func(*args) for every args tuple in `calls` on a thread pool,
+    sharing the process-wide Telegram rate limit. 429 responses are retried
+    after the advertised retry_after.
+    Returns results in the same order as `calls` (None where a call raised)
+    """
+    calls = list(calls)
+    if not calls:
+        return []
+    workers = min(workers or TELEGRAM_DISPATCH_WORKERS, len(calls))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tg-dispatch') as pool:
+        return list(pool.map(lambda args: _call(func, args, max_retries), calls))
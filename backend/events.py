@@ -0,0 +1,175 @@
+"""
+Per-user events pushed to the Mini App over Server-Sent Events
+
+Write paths call publish() (or reward_credited()), which appends to the
+capped user_events collection. Every process runs one tailer thread on
+that collection and hands new events to the streams of the users it
+serves, so an event published by the scheduler or another worker still
+reaches whichever worker holds the user's connection. Events are best
+effort: a failed publish is logged, never raised, and clients resync
+with /api/sync after reconnecting.
+
+Streams are off unless SSE_ENABLED is set: each one holds a worker thread
+for up to SSE_MAX_STREAM_SECONDS, so they need a threaded or async worker
+class. Without them the Mini App polls /api/sync.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import CursorType
+from pymongo.errors import PyMongoError
+from config import SSE_HEARTBEAT_SECONDS, SSE_MAX_STREAM_SECONDS
+from metrics import Counter, Gauge
+from models import user_events
+
+events_published = Counter('user_events_published_total', 'Events written for SSE delivery', ['type'])
+events_dropped = Counter('user_events_dropped_total', 'Events dropped because a stream fell behind')
+
+# Events replayed from Last-Event-ID after a reconnect
+REPLAY_LIMIT = 100
+STREAM_QUEUE_SIZE = 100
+# ObjectIds from different processes are only ordered to the second, so a
+# reopened tailer starts this far back and skips what it already delivered
+TAIL_OVERLAP = timedelta(seconds=5)
+SEEN_IDS = 5000
+
+_subscribers = {}  # telegram_id -> set of queues
+_lock = threading.Lock()
+_tailer = None
+
+
+def _count_streams():
+    with _lock:
+        return {(): sum(len(queues) for queues in _subscribers.values())}
+
+
+open_streams = Gauge('sse_streams_open', 'SSE streams open in this process', collect=_count_streams)
+
+
+def publish(telegram_ids, event_type, **data):
+    """Queue event_type for each of telegram_ids (None entries are skipped)"""
+    now = datetime.utcnow()
+    docs = [
+        {'telegram_id': str(tid), 'type': event_type, 'data': data, 'created_at': now}
+        for tid in dict.fromkeys(telegram_ids) if tid
+    ]
+    if not docs:
+        return
+    try:
+        user_events.insert_many(docs, ordered=False)
+        events_published.inc(len(docs), type=event_type)
+    except PyMongoError as e:
+        logging.error(f"[EVENTS] Failed to publish {event_type}: {e}")
+
+
+def reward_credited(telegram_id, amount, reason, **data):
+    """A reward landed on telegram_id's balance: tell them about both"""
+    publish([telegram_id], 'reward_credited', amount=amount, reason=reason, **data)
+    publish([telegram_id], 'balance_changed', delta=amount, reason=reason)
+
+
+def subscribe(telegram_id):
+    _ensure_tailer()
+    q = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+    with _lock:
+        _subscribers.setdefault(telegram_id, set()).add(q)
+    return q
+
+
+def unsubscribe(telegram_id, q):
+    with _lock:
+        queues = _subscribers.get(telegram_id)
+        if queues:
+            queues.discard(q)
+            if not queues:
+                del _subscribers[telegram_id]
+
+
+def _deliver(doc):
+    with _lock:
+        queues = list(_subscribers.get(doc.get('telegram_id'), ()))
+    for q in queues:
+        try:
+            q.put_nowait(doc)
+        except queue.Full:
+            events_dropped.inc()
+
+
+def _tail():
+    """Follow user_events for as long as the process lives"""
+    since = datetime.utcnow()
+    seen, seen_order = set(), deque()
+    while True:
+        try:
+            start = ObjectId.from_datetime(since - TAIL_OVERLAP)
+            cursor = user_events.find({'_id': {'$gte': start}}, cursor_type=CursorType.TAILABLE_AWAIT)
+            while cursor.alive:
+                for doc in cursor:
+                    if doc['_id'] in seen:
+                        continue
+                    seen.add(doc['_id'])
+                    seen_order.append(doc['_id'])
+                    if len(seen_order) > SEEN_IDS:
+                        seen.discard(seen_order.popleft())
+                    since = max(since, doc['_id'].generation_time.replace(tzinfo=None))
+                    _deliver(doc)
+        except PyMongoError as e:
+            logging.error(f"[EVENTS] Tailer error, retrying: {e}")
+        # A tailable cursor on an empty capped collection dies immediately
+        time.sleep(1)
+
+
+def _ensure_tailer():
+    global _tailer
+    with _lock:
+        if _tailer is None or not _tailer.is_alive():
+            _tailer = threading.Thread(target=_tail, name='user-events-tailer', daemon=True)
+            _tailer.start()
+
+
+def _format(doc):
+    payload = json.dumps({'type': doc['type'], **(doc.get('data') or {})}, default=str)
+    return f"id: {doc['_id']}\nevent: {doc['type']}\ndata: {payload}\n\n"
+
+
+def stream(telegram_id, last_event_id=None):
+    """
+    SSE body for one user: missed events after last_event_id, then live
+    ones, with heartbeats. Ends after SSE_MAX_STREAM_SECONDS so the worker
+    is freed; EventSource reconnects with Last-Event-ID on its own.
+    """
+    q = subscribe(telegram_id)
+    try:
+        replayed = set()
+        yield "retry: 3000\n\n"
+
+        try:
+            after = ObjectId(last_event_id) if last_event_id else None
+        except (InvalidId, TypeError):
+            after = None
+        if after is not None:
+            missed = user_events.find({'telegram_id': telegram_id, '_id': {'$gt': after}}) \
+                .sort('_id', 1).limit(REPLAY_LIMIT)
+            for doc in missed:
+                replayed.add(doc['_id'])
+                yield _format(doc)
+
+        deadline = time.monotonic() + SSE_MAX_STREAM_SECONDS
+        while time.monotonic() < deadline:
+            try:
+                doc = q.get(timeout=SSE_HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            # Already sent during replay
+            if doc['_id'] in replayed:
+                continue
+            yield _format(doc)
+    finally:
+        unsubscribe(telegram_id, q)
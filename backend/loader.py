@@ -0,0 +1,139 @@
+"""
+Request/tick-scoped identity map for channel and user lookups
+
+Inside a lookup scope (one per API request, one per scheduler tick) every
+document fetched through a Loader is remembered until the scope ends, and
+lookups for several ids go to Mongo as one $in query. Outside a scope
+loaders simply fetch. Loaded documents are shared: treat them as read-only
+and forget() any you write to and read again in the same scope.
+
+Counters on /metrics show lookups (hit/miss/unscoped) and the round trips
+they cost; a scope that needed many round trips for one kind is logged,
+since that is what an N+1 pattern looks like.
+"""
+import contextvars
+import functools
+import logging
+import threading
+from contextlib import contextmanager
+from metrics import Counter
+
+lookups = Counter('lookup_requests_total', 'Documents asked for through a loader', ['kind', 'result'])
+lookup_batches = Counter('lookup_batches_total', 'Mongo round trips made by loaders', ['kind'])
+
+# A scope needing more round trips than this for one kind is logged as a likely N+1
+N_PLUS_ONE_THRESHOLD = 5
+
+_current = contextvars.ContextVar('lookup_scope', default=None)
+
+
+class LookupScope:
+    def __init__(self, name):
+        self.name = name
+        self.cache = {}  # kind -> {key: doc, or None when it does not exist}
+        self.stats = {}  # kind -> {'lookups', 'hits', 'batches'}
+        self.lock = threading.Lock()
+
+    def kind_stats(self, kind):
+        return self.stats.setdefault(kind, {'lookups': 0, 'hits': 0, 'batches': 0})
+
+
+def current_scope():
+    return _current.get()
+
+
+def open_scope(name):
+    """Start a scope; pass the returned token to close_scope()"""
+    return _current.set(LookupScope(name))
+
+
+def close_scope(token):
+    scope = _current.get()
+    try:
+        _current.reset(token)
+    except ValueError:
+        # Closed from a different context than it was opened in
+        _current.set(None)
+    if scope is None:
+        return
+    for kind, stats in scope.stats.items():
+        if stats['batches'] > N_PLUS_ONE_THRESHOLD:
+            logging.warning(
+                f"[LOADER] {scope.name} made {stats['batches']} {kind} round trips "
+                f"for {stats['lookups']} lookups, likely an N+1"
+            )
+
+
+@contextmanager
+def lookup_scope(name):
+    token = open_scope(name)
+    try:
+        yield _current.get()
+    finally:
+        close_scope(token)
+
+
+def scoped(name):
+    """Run the decorated function (e.g. a scheduler job) inside its own lookup scope"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with lookup_scope(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Loader:
+    """
+    Deduplicating, batching lookups of one kind of document by key
+    fetch_many(keys) must return {key: doc} for the keys that exist
+    """
+
+    def __init__(self, kind, fetch_many):
+        self.kind = kind
+        self.fetch_many = fetch_many
+
+    def load_many(self, keys):
+        """{key: doc} for the keys that exist; one round trip at most"""
+        keys = {key for key in keys if key}
+        if not keys:
+            return {}
+
+        scope = _current.get()
+        if scope is None:
+            lookups.inc(len(keys), kind=self.kind, result='unscoped')
+            lookup_batches.inc(kind=self.kind)
+            return self.fetch_many(keys)
+
+        with scope.lock:
+            cache = scope.cache.setdefault(self.kind, {})
+            missing = [key for key in keys if key not in cache]
+            stats = scope.kind_stats(self.kind)
+            stats['lookups'] += len(keys)
+            stats['hits'] += len(keys) - len(missing)
+
+        if missing:
+            found = self.fetch_many(missing)
+            with scope.lock:
+                for key in missing:
+                    cache[key] = found.get(key)
+                stats['batches'] += 1
+            lookup_batches.inc(kind=self.kind)
+
+        lookups.inc(len(keys) - len(missing), kind=self.kind, result='hit')
+        lookups.inc(len(missing), kind=self.kind, result='miss')
+        return {key: cache[key] for key in keys if cache.get(key) is not None}
+
+    def load(self, key):
+        return self.load_many([key]).get(key)
+
+    def forget(self, *keys):
+        """Drop documents that were just written so the next load refetches them"""
+        scope = _current.get()
+        if scope is None:
+            return
+        with scope.lock:
+            cache = scope.cache.get(self.kind, {})
+            for key in keys:
+                cache.pop(key, None)
@@ -0,0 +1,184 @@
+"""
+Minimal in-process metrics rendered in the Prometheus text format
+Values are per process; scrape every worker that runs the scheduler
+"""
+import functools
+import logging
+import math
+import threading
+import time
+
+_registry = []
+_lock = threading.Lock()
+
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+LAG_BUCKETS = (1, 5, 10, 20, 30, 60, 120, 300, 600, 1800, 3600)
+ITEM_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = [
+        f'{k}="' + str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for k, v in pairs
+    ]
+    return '{' + ','.join(escaped) + '}'
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        with _lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with _lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), collect=None):
+        """collect() may return {label_tuple: value} to compute the gauge at scrape time"""
+        super().__init__(name, documentation, labelnames)
+        self._collect = collect
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = value
+
+    def _samples(self):
+        if self._collect:
+            try:
+                values = self._collect()
+                with _lock:
+                    self._values = dict(values)
+            except Exception as e:
+                logging.error(f"[METRICS] Failed to collect {self.name}: {e}")
+        with _lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            state = self._values.setdefault(key, {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][i] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    def _samples(self):
+        with _lock:
+            items = [(k, {'counts': list(v['counts']), 'sum': v['sum'], 'count': v['count']}) for k, v in self._values.items()]
+        lines = []
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state['counts']):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state['sum'])}")
+            lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+
+def render_metrics():
+    """All registered metrics in the Prometheus text exposition format"""
+    with _lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# ====== SCHEDULER METRICS ======
+
+job_duration = Histogram('scheduler_job_duration_seconds', 'Wall time of one scheduler job run', ['job'])
+job_items = Histogram('scheduler_job_items', 'Items processed by one scheduler job run', ['job'], buckets=ITEM_BUCKETS)
+job_errors = Counter('scheduler_job_errors_total', 'Scheduler job runs that raised', ['job'])
+posting_lag = Histogram('scheduler_posting_lag_seconds', 'Delay between a campaign start_at and its actual post', ['type'], buckets=LAG_BUCKETS)
+deletion_lag = Histogram('scheduler_deletion_lag_seconds', 'Delay between a campaign end_at and its actual deletion', ['type'], buckets=LAG_BUCKETS)
+
+
+def timed_job(job_name):
+    """
+    Record duration, errors and items processed for a scheduler job
+    The job may return the number of items it processed
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                job_errors.inc(job=job_name)
+                raise
+            finally:
+                job_duration.observe(time.perf_counter() - started, job=job_name)
+            if isinstance(result, int):
+                job_items.observe(result, job=job_name)
+            return result
+        return wrapper
+    return decorator
+
+
+def observe_lag(histogram, due_at, done_at, campaign_type):
+    """Record done_at - due_at (both naive UTC); missing due times are ignored"""
+    if due_at and done_at:
+        histogram.observe(max((done_at - due_at).total_seconds(), 0), type=campaign_type or 'regular')
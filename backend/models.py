@@ -1,9 +1,19 @@
-from pymongo import MongoClient
-from config import MONGO_URI
+from pymongo import MongoClient, UpdateOne
+from bson import ObjectId
+from bson.errors import InvalidId
+from config import MONGO_URI, MONGO_WRITE_BATCH_SIZE, SUBSCRIBER_HISTORY_HOURLY_DAYS, TELEGRAM_API_BASE
+from config import SYNC_OVERLAP_SECONDS, SYNC_TOMBSTONE_DAYS, USER_EVENTS_CAP_MB, ADMIN_STATS_CACHE_SECONDS
+from pymongo.errors import CollectionInvalid, DuplicateKeyError
+from loader import Loader
 import requests
+import base64
 import datetime
+import re
+import functools
+import time
 import uuid
 import logging
+import threading
 
 try:
     from langdetect import detect, DetectorFactory
@@ -29,17 +39,64 @@ ad_rewards = db.ad_rewards
 user_onboarding = db.user_onboarding
 folder_promo_configs = db.folder_promo_configs
 folder_promo_registrations = db.folder_promo_registrations
+scheduler_state = db.scheduler_state
+media_cache = db.media_cache  # promo image URL -> Telegram file_id
+tombstones = db.tombstones  # campaigns/requests that dropped out of a user's view, for /api/sync
+user_events = db.user_events  # capped; tailed by events.py for /api/events
+subscriber_history_hourly = db.subscriber_history_hourly
+subscriber_history_daily = db.subscriber_history_daily
+channel_analytics_daily = db.channel_analytics_daily  # per channel and UTC day: hosted campaigns, impressions, clicks, subscriber gains
+platform_analytics = db.platform_analytics  # per niche and day/week bucket, rebuilt from the above by the scheduler
+
+
+def ensure_user_events_collection():
+    """user_events has to be capped for the SSE tailer's tailable cursor"""
+    try:
+        if 'user_events' not in db.list_collection_names():
+            db.create_collection('user_events', capped=True, size=USER_EVENTS_CAP_MB * 1024 * 1024)
+    except CollectionInvalid:
+        pass  # Another process created it first
+    user_events.create_index([('telegram_id', 1), ('_id', 1)])
 
 
 def ensure_indexes():
     try:
+        ensure_user_events_collection()
         users.create_index('telegram_id', unique=True, sparse=True)
         partners.create_index('id', unique=True, sparse=True)
         requests_col.create_index('status')
+        requests_col.create_index('updated_at')
+        # Inbox / outbox listings, newest first within a status
+        requests_col.create_index([('toChannelId', 1), ('status', 1), ('created_at', -1), ('_id', -1)])
+        requests_col.create_index([('fromChannelId', 1), ('status', 1), ('created_at', -1), ('_id', -1)])
         campaigns.create_index('status')
+        campaigns.create_index('requester_expiry_claim', sparse=True)
+        campaigns.create_index('acceptor_expiry_claim', sparse=True)
+        # The expiry sweep only ever looks at active, not yet notified sides
+        campaigns.create_index('requester_expires_at', name='requester_expiry_due',
+                               partialFilterExpression={'requester_status': 'active', 'requester_notified_expiry': False})
+        campaigns.create_index('acceptor_expires_at', name='acceptor_expiry_due',
+                               partialFilterExpression={'acceptor_status': 'active', 'acceptor_notified_expiry': False})
+        campaigns.create_index('expires_at', name='invite_expiry_due',
+                               partialFilterExpression={'type': 'invite_task', 'status': 'active', 'expiry_notified': False})
+        campaigns.create_index('posting_deadline')
+        # Slot pre-warming / dispatch
+        campaigns.create_index([('status', 1), ('start_at', 1)])
+        campaigns.create_index('dispatch_claim', sparse=True)
+        # One folder promo per channel and slot, however many processes try to post it
+        campaigns.create_index([('promo_slot', 1), ('channel_id', 1)], unique=True, name='folder_promo_slot_channel',
+                               partialFilterExpression={'type': 'folder_promo', 'promo_slot': {'$exists': True}})
+        # Delta sync: a poll with nothing new is one empty range on this index
+        campaigns.create_index('updated_at')
+        tombstones.create_index([('owner_ids', 1), ('deleted_at', 1)])
+        tombstones.create_index('deleted_at', name='tombstone_ttl', expireAfterSeconds=SYNC_TOMBSTONE_DAYS * 86400)
+        # Campaign listing (newest first per channel) and partner name sync
+        campaigns.create_index([('fromChannelId', 1), ('created_at', -1), ('id', -1)])
+        campaigns.create_index([('toChannelId', 1), ('created_at', -1), ('id', -1)])
         channels.create_index('id', unique=True, sparse=True)
         channels.create_index('owner_id')
         channels.create_index('status')
+        channels.create_index([('status', 1), ('subscribers_refreshed_at', 1)])
         user_tasks.create_index('telegram_id', unique=True, sparse=True)
         transactions.create_index('transaction_id', unique=True, sparse=True)
         transactions.create_index('telegram_id')
@@ -49,11 +106,143 @@ def ensure_indexes():
         user_onboarding.create_index('telegram_id', unique=True, sparse=True)
         user_onboarding.create_index('last_start_at')
         user_onboarding.create_index('next_message_at')
+        user_onboarding.create_index([('sequence_active', 1), ('next_message_at', 1), ('current_message_index', 1)])
+        user_onboarding.create_index('claim_id', sparse=True)
+        subscriber_history_hourly.create_index([('channel_id', 1), ('hour', 1)])
+        subscriber_history_hourly.create_index('hour', expireAfterSeconds=SUBSCRIBER_HISTORY_HOURLY_DAYS * 86400, name='hour_ttl')
+        subscriber_history_daily.create_index([('channel_id', 1), ('day', 1)])
+        channel_analytics_daily.create_index([('channel_id', 1), ('day', 1)], unique=True)
+        campaigns.create_index('analytics_subscribers_due', sparse=True)
+        # Platform rollups rebuild the last few days of campaigns/channels by creation time
+        campaigns.create_index('created_at')
+        channels.create_index('created_at')
+        # Admin moderation listing, newest first by _id (optionally within a status)
+        channels.create_index([('status', 1), ('_id', -1)])
+        platform_analytics.create_index([('period', 1), ('start', 1), ('niche', 1)], unique=True)
     except Exception as e:
         import logging
         logging.error(f"Failed to create some MongoDB indexes: {e}")
 
 
+def acquire_lease(name, holder, seconds):
+    """
+    Take or renew the named lease in scheduler_state for `seconds`
+    Returns True while holder owns it; another process gets it only once it
+    has expired unrenewed
+    """
+    now = datetime.datetime.utcnow()
+    try:
+        scheduler_state.update_one(
+            {'_id': f"lease:{name}", '$or': [{'holder': holder}, {'expires_at': {'$lt': now}}]},
+            {'$set': {'holder': holder, 'expires_at': now + datetime.timedelta(seconds=seconds), 'updated_at': now}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        # Held by someone else: the upsert collided with their document
+        return False
+
+
+def lease_active(name):
+    """Whether any process currently holds the named lease"""
+    return scheduler_state.count_documents(
+        {'_id': f"lease:{name}", 'expires_at': {'$gt': datetime.datetime.utcnow()}}, limit=1
+    ) > 0
+
+
+def release_lease(name, holder):
+    """Give up the named lease if holder still owns it"""
+    scheduler_state.delete_one({'_id': f"lease:{name}", 'holder': holder})
+
+
+class WriteBatch:
+    """
+    Collect idempotent writes during a scheduler tick (notification flags and
+    the like) and flush them with one unordered bulk_write per collection,
+    MONGO_WRITE_BATCH_SIZE ops at a time. A failed flush is logged and its
+    ops dropped, so only queue writes that are safe to lose or repeat.
+    Campaign settlements, which move balances, go through
+    scheduler._settle_campaigns instead.
+    """
+
+    def __init__(self, max_ops=None):
+        self.max_ops = max_ops or MONGO_WRITE_BATCH_SIZE
+        self.ops = []
+
+    def __len__(self):
+        return len(self.ops)
+
+    def add(self, collection, op):
+        """Queue a pymongo write op (UpdateOne, InsertOne, ...) for collection"""
+        self.ops.append((collection, op))
+        if len(self.ops) >= self.max_ops:
+            self.flush()
+
+    def flush(self):
+        ops, self.ops = self.ops, []
+        by_collection = {}
+        for collection, op in ops:
+            by_collection.setdefault(collection.name, (collection, []))[1].append(op)
+        for collection, queued in by_collection.values():
+            try:
+                collection.bulk_write(queued, ordered=False)
+            except Exception:
+                logging.exception(f"[MODELS] Failed to flush {len(queued)} queued writes to {collection.name}")
+
+
+def backfill_campaign_expiry_fields():
+    """
+    Give campaigns created before expires_at was stored their expiry fields
+    Uses pipeline updates so the whole backfill runs server side
+    """
+    def duration_ms(default_hours):
+        return {'$multiply': [{'$ifNull': ['$duration_hours', default_hours]}, 3600 * 1000]}
+
+    try:
+        for role in ('requester', 'acceptor'):
+            campaigns.update_many(
+                {f'{role}_posted_at': {'$type': 'date'}, f'{role}_expires_at': {'$exists': False}},
+                [{'$set': {
+                    f'{role}_expires_at': {'$add': [f'${role}_posted_at', duration_ms(2)]},
+                    f'{role}_notified_expiry': {'$ifNull': [f'${role}_notified_expiry', False]}
+                }}]
+            )
+            campaigns.update_many(
+                {f'{role}_status': {'$exists': True}, f'{role}_notified_expiry': {'$exists': False}},
+                {'$set': {f'{role}_notified_expiry': False}}
+            )
+        campaigns.update_many(
+            {'type': 'invite_task', 'posted_at': {'$type': 'date'}, 'expires_at': {'$exists': False}},
+            [{'$set': {
+                'expires_at': {'$add': ['$posted_at', duration_ms(12)]},
+                'expiry_notified': {'$ifNull': ['$expiry_notified', False]}
+            }}]
+        )
+        campaigns.update_many(
+            {'type': 'invite_task', 'expiry_notified': {'$exists': False}},
+            {'$set': {'expiry_notified': False}}
+        )
+    except Exception as e:
+        logging.error(f"Failed to backfill campaign expiry fields: {e}")
+
+
+def backfill_campaign_channel_names():
+    """
+    Give campaigns created before channel names were stored on them their
+    from_channel_name / to_channel_name, joined server side and merged back
+    """
+    try:
+        for side, field in (('from', 'fromChannelId'), ('to', 'toChannelId')):
+            campaigns.aggregate([
+                {'$match': {field: {'$exists': True}, f'{side}_channel_name': {'$exists': False}}},
+                {'$lookup': {'from': 'channels', 'localField': field, 'foreignField': 'id', 'as': 'ch'}},
+                {'$project': {f'{side}_channel_name': {'$ifNull': [{'$first': '$ch.name'}, None]}}},
+                {'$merge': {'into': 'campaigns', 'on': '_id', 'whenMatched': 'merge', 'whenNotMatched': 'discard'}}
+            ])
+    except Exception as e:
+        logging.error(f"Failed to backfill campaign channel names: {e}")
+
+
 def init_mock_partners():
     # If partners empty, seed from minimal mock data similar to frontend
     if partners.count_documents({}) == 0:
@@ -98,7 +287,7 @@ def get_telegram_file_id_from_chat(chat_id, bot_token):
     Returns tuple: (file_id, telegram_id) or (None, None) if no photo
     """
     try:
-        api_url = f"https://api.telegram.org/bot{bot_token}/getChat"
+        api_url = f"{TELEGRAM_API_BASE}/bot{bot_token}/getChat"
         response = requests.get(api_url, params={'chat_id': chat_id}, timeout=10)
         
         if response.status_code != 200:
@@ -127,14 +316,14 @@ def get_telegram_file_url_from_file_id(file_id, bot_token):
     This function is called on-demand to ensure we always have fresh URLs.
     """
     try:
-        file_url = f"https://api.telegram.org/bot{bot_token}/getFile"
+        file_url = f"{TELEGRAM_API_BASE}/bot{bot_token}/getFile"
         file_response = requests.get(file_url, params={'file_id': file_id}, timeout=10)
         
         if file_response.status_code == 200:
             file_data = file_response.json()
             if file_data.get('ok'):
                 file_path = file_data['result'].get('file_path')
-                return f"https://api.telegram.org/file/bot{bot_token}/{file_path}"
+                return f"{TELEGRAM_API_BASE}/file/bot{bot_token}/{file_path}"
         
         return None
     except Exception as e:
@@ -146,11 +335,16 @@ def refresh_channel_subscribers_from_telegram(telegram_id, bot_token):
     """
     Fetch the current subscriber count from Telegram API for a channel.
     Returns the current subscriber count or None if fetch fails.
+    A 429 returns Telegram's error body instead, so dispatch() can honour
+    its retry_after.
     """
     try:
-        api_url = f"https://api.telegram.org/bot{bot_token}/getChatMemberCount"
+        api_url = f"{TELEGRAM_API_BASE}/bot{bot_token}/getChatMemberCount"
         response = requests.get(api_url, params={'chat_id': telegram_id}, timeout=10)
         
+        if response.status_code == 429:
+            return response.json()
+        
         if response.status_code == 200:
             data = response.json()
             if data.get('ok'):
@@ -161,6 +355,446 @@ def refresh_channel_subscribers_from_telegram(telegram_id, bot_token):
         print(f"Error refreshing channel subscribers: {e}")
         return None
     
+# ====== SUBSCRIBER HISTORY ======
+# Raw refresh samples live in one bucket document per channel and hour
+# (expired by TTL after SUBSCRIBER_HISTORY_HOURLY_DAYS); a daily job folds
+# them into one document per channel and day that is kept for good
+
+def record_subscriber_samples(samples, at=None):
+    """Append {channel_id: subscriber_count} samples taken at `at` to the hourly buckets"""
+    if not samples:
+        return
+    at = at or datetime.datetime.utcnow()
+    hour = at.replace(minute=0, second=0, microsecond=0)
+    ops = [
+        UpdateOne(
+            {'_id': f"{channel_id}:{hour:%Y%m%d%H}"},
+            {
+                '$setOnInsert': {'channel_id': channel_id, 'hour': hour, 'day': hour.replace(hour=0), 'first': count},
+                '$push': {'samples': {'t': at, 'n': count}},
+                '$set': {'last': count},
+                '$min': {'min': count},
+                '$max': {'max': count},
+                '$inc': {'count': 1}
+            },
+            upsert=True
+        )
+        for channel_id, count in samples.items()
+    ]
+    subscriber_history_hourly.bulk_write(ops, ordered=False)
+
+
+def downsample_subscriber_history(days=2):
+    """Fold the hourly buckets of the last `days` full days into daily documents (idempotent)"""
+    today = datetime.datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    subscriber_history_hourly.aggregate([
+        {'$match': {'day': {'$gte': today - datetime.timedelta(days=days), '$lt': today}}},
+        {'$sort': {'hour': 1}},
+        {'$group': {
+            '_id': {'channel_id': '$channel_id', 'day': '$day'},
+            'channel_id': {'$first': '$channel_id'},
+            'day': {'$first': '$day'},
+            'first': {'$first': '$first'},
+            'last': {'$last': '$last'},
+            'min': {'$min': '$min'},
+            'max': {'$max': '$max'},
+            'count': {'$sum': '$count'}
+        }},
+        {'$merge': {'into': 'subscriber_history_daily', 'on': '_id', 'whenMatched': 'replace', 'whenNotMatched': 'insert'}}
+    ])
+
+
+def subscriber_count_near(channel_id, at, after=False):
+    """
+    Recorded subscriber count closest to `at`: the last sample at or before it,
+    or with after=True the first sample at or after it. None if nothing recorded
+    Daily summaries only bound a whole day, so once the hourly buckets are gone
+    the previous day's last (or next day's first) count is used rather than
+    the same day's, which may have been sampled on the wrong side of `at`
+    """
+    hour = at.replace(minute=0, second=0, microsecond=0)
+    day = hour.replace(hour=0)
+    if after:
+        bucket = subscriber_history_hourly.find_one(
+            {'channel_id': channel_id, 'hour': {'$gte': hour}}, {'first': 1}, sort=[('hour', 1)]
+        )
+        if bucket:
+            return bucket['first']
+        daily = subscriber_history_daily.find_one(
+            {'channel_id': channel_id, 'day': {'$gt': day}}, {'first': 1}, sort=[('day', 1)]
+        )
+        return daily['first'] if daily else None
+    
+    bucket = subscriber_history_hourly.find_one(
+        {'channel_id': channel_id, 'hour': {'$lte': hour}}, {'last': 1}, sort=[('hour', -1)]
+    )
+    if bucket:
+        return bucket['last']
+    daily = subscriber_history_daily.find_one(
+        {'channel_id': channel_id, 'day': {'$lt': day}}, {'last': 1}, sort=[('day', -1)]
+    )
+    return daily['last'] if daily else None
+
+
+def subscriber_delta(channel_id, start, end):
+    """Subscribers gained by a channel between start and end, or None without history on both sides"""
+    before = subscriber_count_near(channel_id, start)
+    after = subscriber_count_near(channel_id, end, after=True)
+    if before is None or after is None:
+        return None
+    return after - before
+
+
+# Share of a host channel's subscribers assumed to see a promo, and of those to click it
+VIEW_RATE_ESTIMATE = 0.15
+CTR_ESTIMATE = 0.08
+
+# Subscriber gains are measured this long after a campaign ends (history is sampled hourly)
+SUBSCRIBER_GAIN_SETTLE = datetime.timedelta(hours=2)
+# ...and given up on (counted as zero) when no history shows up for this long
+SUBSCRIBER_GAIN_GIVE_UP = datetime.timedelta(days=2)
+# When a campaign ended, for aggregations (updated_at only if nothing better was recorded)
+CAMPAIGN_END_EXPR = {'$ifNull': ['$actual_end_at', {'$ifNull': ['$ended_at', {'$ifNull': ['$end_at', '$updated_at']}]}]}
+
+
+def _analytics_day(at):
+    return datetime.datetime(at.year, at.month, at.day)
+
+
+def _analytics_inc(channel_id, at, inc):
+    return UpdateOne(
+        {'channel_id': channel_id, 'day': _analytics_day(at)},
+        {'$inc': inc, '$set': {'updated_at': datetime.datetime.utcnow()}},
+        upsert=True
+    )
+
+
+def roll_up_completed_campaign(camp, host_channel, at, batch=None):
+    """
+    Count a completed campaign on its host channel's (toChannelId) day
+    Impressions and clicks are estimated from the host's subscribers at completion
+    Queued on `batch` (anything with add(collection, op)) instead of written immediately if given
+    """
+    impressions = int((host_channel or {}).get('subscribers', 0) * VIEW_RATE_ESTIMATE)
+    op = _analytics_inc(camp.get('toChannelId'), at, {
+        'campaigns_hosted': 1,
+        'impressions': impressions,
+        'clicks': int(impressions * CTR_ESTIMATE)
+    })
+    if batch is not None:
+        batch.add(channel_analytics_daily, op)
+        return
+    channel_analytics_daily.bulk_write([op])
+
+
+def record_campaign_engagement(campaign_id, impressions=0, clicks=0):
+    """Add measured impressions/clicks of a campaign to its host channel's rollup for today"""
+    camp = campaigns.find_one({'id': campaign_id}, {'toChannelId': 1})
+    if camp and camp.get('toChannelId'):
+        channel_analytics_daily.bulk_write([_analytics_inc(
+            camp['toChannelId'], datetime.datetime.utcnow(), {'impressions': impressions, 'clicks': clicks}
+        )])
+
+
+def roll_up_subscriber_gains(now=None, limit=200):
+    """
+    Add the subscribers each recently completed campaign brought its
+    requester channel (fromChannelId) to that channel's rollup for the end day.
+    Campaigns are picked up once SUBSCRIBER_GAIN_SETTLE has passed since they
+    ended (later unrelated writes to the campaign do not push that back);
+    returns how many were done
+    """
+    now = now or datetime.datetime.utcnow()
+    due = list(campaigns.find(
+        {'analytics_subscribers_due': True, '$expr': {'$lte': [CAMPAIGN_END_EXPR, now - SUBSCRIBER_GAIN_SETTLE]}},
+        {'fromChannelId': 1, 'actual_start_at': 1, 'posted_at': 1, 'start_at': 1,
+         'actual_end_at': 1, 'ended_at': 1, 'end_at': 1, 'updated_at': 1}
+    ).limit(limit))
+    
+    rollups, done = [], []
+    for campaign in due:
+        start = campaign.get('actual_start_at') or campaign.get('posted_at') or campaign.get('start_at')
+        end = campaign.get('actual_end_at') or campaign.get('ended_at') or campaign.get('end_at') or campaign['updated_at']
+        delta = subscriber_delta(campaign.get('fromChannelId'), start, end) if start else None
+        if delta is None and end > now - SUBSCRIBER_GAIN_GIVE_UP:
+            continue  # History may still arrive
+        if delta and delta > 0:
+            rollups.append(_analytics_inc(campaign.get('fromChannelId'), end, {'new_subscribers': delta}))
+        done.append(campaign['_id'])
+    
+    if rollups:
+        channel_analytics_daily.bulk_write(rollups, ordered=False)
+    if done:
+        campaigns.update_many({'_id': {'$in': done}}, {'$unset': {'analytics_subscribers_due': ''}})
+    return len(done)
+
+
+def backfill_channel_analytics():
+    """
+    Roll campaigns completed before the rollups existed into channel_analytics_daily
+    Impressions use the host channel's current subscribers, as the old
+    on-the-fly estimate did; subscriber gains are left to roll_up_subscriber_gains
+    """
+    tag = f"backfill_{uuid.uuid4().hex[:8]}"
+    end = CAMPAIGN_END_EXPR
+    impressions = {'$toLong': {'$floor': {'$multiply': [{'$ifNull': [{'$first': '$host.subscribers'}, 0]}, VIEW_RATE_ESTIMATE]}}}
+    try:
+        claimed = campaigns.update_many(
+            {'status': {'$in': ['completed', 'finished']}, 'toChannelId': {'$exists': True},
+             'analytics_rolled_up': {'$exists': False}},
+            {'$set': {'analytics_rolled_up': tag, 'analytics_subscribers_due': True,
+                      'updated_at': datetime.datetime.utcnow()}}
+        )
+        if not claimed.modified_count:
+            return
+        campaigns.aggregate([
+            {'$match': {'analytics_rolled_up': tag}},
+            {'$lookup': {'from': 'channels', 'localField': 'toChannelId', 'foreignField': 'id', 'as': 'host'}},
+            {'$project': {'channel_id': '$toChannelId', 'end': end, 'impressions': impressions}},
+            {'$match': {'end': {'$type': 'date'}}},
+            {'$group': {
+                '_id': {'channel_id': '$channel_id', 'day': {'$dateFromParts': {
+                    'year': {'$year': '$end'}, 'month': {'$month': '$end'}, 'day': {'$dayOfMonth': '$end'}
+                }}},
+                'campaigns_hosted': {'$sum': 1},
+                'impressions': {'$sum': '$impressions'},
+                'clicks': {'$sum': {'$toLong': {'$floor': {'$multiply': ['$impressions', CTR_ESTIMATE]}}}}
+            }},
+            {'$project': {'_id': 0, 'channel_id': '$_id.channel_id', 'day': '$_id.day',
+                          'campaigns_hosted': 1, 'impressions': 1, 'clicks': 1}},
+            {'$merge': {
+                'into': 'channel_analytics_daily',
+                'on': ['channel_id', 'day'],
+                'whenMatched': [{'$set': {
+                    field: {'$add': [{'$ifNull': [f'${field}', 0]}, f'$$new.{field}']}
+                    for field in ('campaigns_hosted', 'impressions', 'clicks')
+                }}],
+                'whenNotMatched': 'insert'
+            }}
+        ])
+        campaigns.update_many({'analytics_rolled_up': tag}, {'$set': {'analytics_rolled_up': True}})
+        logging.info(f"[MODELS] Backfilled channel analytics for {claimed.modified_count} campaigns")
+    except Exception as e:
+        logging.error(f"Failed to backfill channel analytics: {e}")
+
+
+def get_channel_analytics(channel_ids, since=None):
+    """Totals of the channels' daily rollups (from `since` if given) in one aggregation"""
+    totals = {'campaigns_hosted': 0, 'impressions': 0, 'clicks': 0, 'new_subscribers': 0}
+    if not channel_ids:
+        return totals
+    match = {'channel_id': {'$in': list(channel_ids)}}
+    if since:
+        match['day'] = {'$gte': _analytics_day(since)}
+    result = next(channel_analytics_daily.aggregate([
+        {'$match': match},
+        {'$group': {'_id': None, **{field: {'$sum': f'${field}'} for field in totals}}}
+    ]), None)
+    if result:
+        totals.update({field: result[field] for field in totals})
+    return totals
+
+
+# Niche of channels without a topic in the platform rollups
+PLATFORM_UNKNOWN_NICHE = 'Other'
+# Days the platform rollup job rebuilds each run; covers late subscriber gains
+# (SUBSCRIBER_GAIN_GIVE_UP) and engagement recorded after completion
+PLATFORM_ROLLUP_DAYS = 3
+PLATFORM_ANALYTICS_FIELDS = ('campaigns_created', 'campaigns_completed', 'impressions', 'clicks',
+                             'new_subscribers', 'new_channels')
+
+
+def _day_of(field):
+    return {'$dateFromParts': {'year': {'$year': field}, 'month': {'$month': field}, 'day': {'$dayOfMonth': field}}}
+
+
+def _niche_of(channel_field):
+    return {'$ifNull': [{'$first': f'{channel_field}.topic'}, PLATFORM_UNKNOWN_NICHE]}
+
+
+def roll_up_platform_analytics(days=PLATFORM_ROLLUP_DAYS):
+    """
+    Rebuild the platform's daily and weekly rollups per niche for the last
+    `days` days (all history when days is None) from the channel rollups,
+    campaign creations and channel sign-ups. Buckets are replaced, so reruns
+    are safe; a channel's niche is its current topic.
+    """
+    now = datetime.datetime.utcnow()
+    since = _analytics_day(now - datetime.timedelta(days=days - 1)) if days else None
+    # Weeks touched by the window are rebuilt whole from their days
+    week_since = since - datetime.timedelta(days=since.weekday()) if since else None
+    created = {'$gte': since} if since else {'$type': 'date'}
+
+    channel_niche = {'from': 'channels', 'localField': 'channel_id', 'foreignField': 'id', 'as': 'channel'}
+    zero = {field: {'$literal': 0} for field in PLATFORM_ANALYTICS_FIELDS}
+
+    channel_analytics_daily.aggregate([
+        {'$match': {'day': {'$gte': since}} if since else {}},
+        {'$lookup': channel_niche},
+        {'$project': {**zero, '_id': 0, 'day': 1, 'niche': _niche_of('$channel'),
+                      'campaigns_completed': {'$ifNull': ['$campaigns_hosted', 0]},
+                      'impressions': {'$ifNull': ['$impressions', 0]},
+                      'clicks': {'$ifNull': ['$clicks', 0]},
+                      'new_subscribers': {'$ifNull': ['$new_subscribers', 0]}}},
+        {'$unionWith': {'coll': 'campaigns', 'pipeline': [
+            {'$match': {'created_at': created}},
+            # Counted on the channel that hosts the post
+            {'$project': {'channel_id': {'$ifNull': ['$toChannelId', '$channel_id']}, 'created_at': 1}},
+            {'$lookup': channel_niche},
+            {'$project': {**zero, '_id': 0, 'day': _day_of('$created_at'), 'niche': _niche_of('$channel'),
+                          'campaigns_created': {'$literal': 1}}}
+        ]}},
+        {'$unionWith': {'coll': 'channels', 'pipeline': [
+            {'$match': {'created_at': created}},
+            {'$project': {**zero, '_id': 0, 'day': _day_of('$created_at'),
+                          'niche': {'$ifNull': ['$topic', PLATFORM_UNKNOWN_NICHE]},
+                          'new_channels': {'$literal': 1}}}
+        ]}},
+        {'$group': {'_id': {'start': '$day', 'niche': '$niche'},
+                    **{field: {'$sum': f'${field}'} for field in PLATFORM_ANALYTICS_FIELDS}}},
+        {'$project': {'_id': 0, 'period': 'day', 'start': '$_id.start', 'niche': '$_id.niche',
+                      **{field: 1 for field in PLATFORM_ANALYTICS_FIELDS}, 'updated_at': now}},
+        {'$merge': {'into': 'platform_analytics', 'on': ['period', 'start', 'niche'],
+                    'whenMatched': 'replace', 'whenNotMatched': 'insert'}}
+    ])
+
+    day_match = {'period': 'day'}
+    if week_since:
+        day_match['start'] = {'$gte': week_since}
+    platform_analytics.aggregate([
+        {'$match': day_match},
+        {'$group': {
+            '_id': {'niche': '$niche', 'start': {'$dateFromParts': {
+                'isoWeekYear': {'$isoWeekYear': '$start'}, 'isoWeek': {'$isoWeek': '$start'}, 'isoDayOfWeek': 1
+            }}},
+            **{field: {'$sum': f'${field}'} for field in PLATFORM_ANALYTICS_FIELDS}
+        }},
+        {'$project': {'_id': 0, 'period': 'week', 'start': '$_id.start', 'niche': '$_id.niche',
+                      **{field: 1 for field in PLATFORM_ANALYTICS_FIELDS}, 'updated_at': now}},
+        {'$merge': {'into': 'platform_analytics', 'on': ['period', 'start', 'niche'],
+                    'whenMatched': 'replace', 'whenNotMatched': 'insert'}}
+    ])
+
+
+def backfill_platform_analytics():
+    """Build the platform rollups over all history the first time they are needed"""
+    try:
+        if platform_analytics.find_one({}, {'_id': 1}):
+            return
+        roll_up_platform_analytics(days=None)
+        logging.info("[MODELS] Built platform analytics rollups")
+    except Exception as e:
+        logging.error(f"Failed to build platform analytics: {e}")
+
+
+def get_platform_analytics(period='day', since=None, until=None, niche=None):
+    """
+    Platform rollups between since and until (inclusive bucket starts) as
+    {'series': per bucket over all niches (or just `niche`), 'niches': per
+    niche over the whole range}, in one aggregation
+    """
+    match = {'period': period}
+    if since or until:
+        match['start'] = {}
+        if since:
+            match['start']['$gte'] = since
+        if until:
+            match['start']['$lte'] = until
+    sums = {field: {'$sum': f'${field}'} for field in PLATFORM_ANALYTICS_FIELDS}
+    series = [{'$group': {'_id': '$start', **sums}}, {'$sort': {'_id': 1}}]
+    if niche:
+        series.insert(0, {'$match': {'niche': niche}})
+    result = next(platform_analytics.aggregate([
+        {'$match': match},
+        {'$facet': {
+            'series': series,
+            'niches': [{'$group': {'_id': '$niche', **sums}}, {'$sort': {'campaigns_completed': -1, '_id': 1}}]
+        }}
+    ]), {'series': [], 'niches': []})
+    return result
+
+
+def ttl_cached(seconds):
+    """
+    Reuse the decorated function's result for `seconds` (per process and
+    arguments); callers must not mutate what they get back
+    """
+    def decorator(func):
+        cache = {}
+        lock = threading.Lock()
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            if seconds <= 0:
+                return func(*args)
+            with lock:
+                hit = cache.get(args)
+                if hit and hit[0] > time.monotonic():
+                    return hit[1]
+                # Computed under the lock so a burst of refreshes costs one query
+                value = func(*args)
+                cache[args] = (time.monotonic() + seconds, value)
+                return value
+        return wrapper
+    return decorator
+
+
+@ttl_cached(ADMIN_STATS_CACHE_SECONDS)
+def get_admin_counts():
+    """
+    Admin dashboard counts: channels per status in one aggregation, the
+    other collections from their metadata (estimated, no scan)
+    """
+    by_status = {row['_id']: row['count'] for row in channels.aggregate([
+        {'$group': {'_id': '$status', 'count': {'$sum': 1}}}
+    ])}
+    return {
+        'channels': {
+            'total': sum(by_status.values()),
+            **{status: by_status.get(status, 0) for status in ('pending', 'approved', 'rejected', 'paused')}
+        },
+        'users': users.estimated_document_count(),
+        'requests': requests_col.estimated_document_count(),
+        'campaigns': campaigns.estimated_document_count()
+    }
+
+
+@ttl_cached(ADMIN_STATS_CACHE_SECONDS)
+def get_completed_campaign_totals():
+    """All-time completed campaigns with their measured impressions and clicks, summed by Mongo"""
+    return next(campaigns.aggregate([
+        {'$match': {'status': {'$in': ['completed', 'finished']}}},
+        {'$group': {
+            '_id': None,
+            'count': {'$sum': 1},
+            'impressions': {'$sum': {'$ifNull': ['$impressions', 0]}},
+            'clicks': {'$sum': {'$ifNull': ['$clicks', 0]}}
+        }}
+    ]), {'count': 0, 'impressions': 0, 'clicks': 0})
+
+
+@ttl_cached(ADMIN_STATS_CACHE_SECONDS)
+def get_purchase_summary():
+    """Transaction counts per status and revenue from successful purchases, in one aggregation"""
+    result = next(transactions.aggregate([
+        {'$facet': {
+            'by_status': [{'$group': {'_id': '$status', 'count': {'$sum': 1}}}],
+            'revenue': [
+                {'$match': {'status': 'SUCCESS'}},
+                {'$group': {'_id': None, 'total_cpc': {'$sum': '$cpc_amount'}, 'total_stars': {'$sum': '$stars_cost'}}},
+                {'$project': {'_id': 0}}
+            ]
+        }}
+    ]))
+    by_status = {row['_id']: row['count'] for row in result['by_status']}
+    return {
+        'total_transactions': sum(by_status.values()),
+        'successful': by_status.get('SUCCESS', 0),
+        'pending': by_status.get('PENDING', 0),
+        'failed': by_status.get('FAILED', 0),
+        'revenue': result['revenue'][0] if result['revenue'] else {'total_cpc': 0, 'total_stars': 0}
+    }
+
 LANGUAGE_CODE_MAP = {
     'af': 'Afrikaans',
     'ar': 'Arabic',
@@ -353,7 +987,7 @@ def validate_channel_with_telegram(username, bot_token):
             # Assume it's a username without @
             chat_username = f"@{chat_identifier}"
         
-        api_url = f"https://api.telegram.org/bot{bot_token}/getChat"
+        api_url = f"{TELEGRAM_API_BASE}/bot{bot_token}/getChat"
         response = requests.get(api_url, params={'chat_id': chat_username}, timeout=10)
         
         if response.status_code != 200:
@@ -398,7 +1032,7 @@ def validate_channel_with_telegram(username, bot_token):
         chat_id = chat.get('id')
         bot_username = bot_token.split(':')[0]
         
-        admin_check_url = f"https://api.telegram.org/bot{bot_token}/getChatMember"
+        admin_check_url = f"{TELEGRAM_API_BASE}/bot{bot_token}/getChatMember"
         admin_response = requests.get(
             admin_check_url,
             params={
@@ -425,7 +1059,7 @@ def validate_channel_with_telegram(username, bot_token):
             }
         
         # Get member count
-        member_count_url = f"https://api.telegram.org/bot{bot_token}/getChatMemberCount"
+        member_count_url = f"{TELEGRAM_API_BASE}/bot{bot_token}/getChatMemberCount"
         member_response = requests.get(member_count_url, params={'chat_id': chat_id}, timeout=10)
         
         subscribers = 0
@@ -462,7 +1096,7 @@ def validate_channel_with_telegram(username, bot_token):
         if language == 'English' and description:
             # Try to get recent messages to better detect language
             try:
-                messages_url = f"https://api.telegram.org/bot{bot_token}/getUpdates"
+                messages_url = f"{TELEGRAM_API_BASE}/bot{bot_token}/getUpdates"
                 messages_response = requests.get(messages_url, params={'chat_id': chat_id, 'limit': 10}, timeout=10)
                 
                 if messages_response.status_code == 200:
@@ -587,6 +1221,24 @@ def get_user_channels_list(telegram_id):
     """
     return list(channels.find({'owner_id': telegram_id}, {'_id': 0}))
 
+# Channels opened in this process since the last subscriber refresh tick
+_viewed_channels = set()
+_viewed_lock = threading.Lock()
+
+
+def note_channels_viewed(channel_ids):
+    """Remember channels users just looked at so their subscriber counts are refreshed first"""
+    with _viewed_lock:
+        _viewed_channels.update(cid for cid in channel_ids if cid)
+
+
+def pop_viewed_channels():
+    """Take (and clear) the channel ids viewed since the last call"""
+    global _viewed_channels
+    with _viewed_lock:
+        viewed, _viewed_channels = _viewed_channels, set()
+    return viewed
+
 def get_channel_by_id(channel_id, telegram_id=None):
     """
     Get a specific channel by ID
@@ -599,6 +1251,74 @@ def get_channel_by_id(channel_id, telegram_id=None):
     return channels.find_one(query, {'_id': 0})
 
 
+def get_channels_by_ids(channel_ids, projection=None):
+    """
+    Fetch many channels with a single $in query
+    Returns a dict keyed by channel id (missing channels are simply absent)
+    Full documents go through channel_loader, so inside a lookup scope
+    channels already loaded are not fetched again
+    """
+    ids = list({cid for cid in channel_ids if cid})
+    if not ids:
+        return {}
+    if projection is None:
+        return channel_loader.load_many(ids)
+    return {ch['id']: ch for ch in channels.find({'id': {'$in': ids}}, projection)}
+
+
+def get_users_by_telegram_ids(telegram_ids, projection=None):
+    """
+    Fetch many users with a single $in query
+    Returns a dict keyed by telegram_id (full documents go through user_loader)
+    """
+    ids = list({tid for tid in telegram_ids if tid})
+    if not ids:
+        return {}
+    if projection is None:
+        return user_loader.load_many(ids)
+    return {u['telegram_id']: u for u in users.find({'telegram_id': {'$in': ids}}, projection)}
+
+
+channel_loader = Loader('channels', lambda ids: {ch['id']: ch for ch in channels.find({'id': {'$in': list(ids)}})})
+user_loader = Loader('users', lambda ids: {u['telegram_id']: u for u in users.find({'telegram_id': {'$in': list(ids)}})})
+
+# What a row of the admin moderation list needs; the full document is fetched on demand
+ADMIN_CHANNEL_LIST_PROJECTION = {
+    '_id': 1, 'id': 1, 'name': 1, 'username': 1, 'telegram_id': 1, 'avatar': 1, 'subscribers': 1,
+    'avgViews24h': 1, 'language': 1, 'topic': 1, 'owner_id': 1, 'status': 1, 'xExchanges': 1,
+    'promos_per_day': 1, 'created_at': 1, 'updated_at': 1,
+    'promo_count': {'$size': {'$ifNull': ['$promo_materials', []]}},
+    'days_count': {'$size': {'$ifNull': ['$selected_days', []]}},
+    'slots_count': {'$size': {'$ifNull': ['$time_slots', []]}}
+}
+
+
+def get_admin_channels(status=None, topic=None, language=None, search=None, after=None, limit=None):
+    """
+    Slim channel rows for admin moderation, newest first
+    
+    Rows are ordered and paged by _id, which every channel has (older ones
+    lack created_at); callers strip it before serializing. search matches the
+    start of the name or username (case-insensitive); after is the ObjectId
+    of the last row already shown
+    """
+    conditions = []
+    for field, value in (('status', status), ('topic', topic), ('language', language)):
+        if value:
+            conditions.append({field: value})
+    if search:
+        pattern = {'$regex': '^' + re.escape(search.strip().lstrip('@')), '$options': 'i'}
+        conditions.append({'$or': [{'name': pattern}, {'username': pattern}]})
+    if after:
+        conditions.append({'_id': {'$lt': after}})
+    
+    query = {'$and': conditions} if conditions else {}
+    cursor = channels.find(query, ADMIN_CHANNEL_LIST_PROJECTION).sort('_id', -1)
+    if limit:
+        cursor = cursor.limit(limit)
+    return list(cursor)
+
+
 def update_channel_status(channel_id, status):
     """
     Update channel status (pending, approved, rejected)
@@ -609,15 +1329,50 @@ def update_channel_status(channel_id, status):
     )
 
 
-def increment_channel_exchanges(channel_id):
+def increment_channel_exchanges(channel_id, batch=None):
     """
     Increment the exchange counter for a channel
+    Queued on `batch` (anything with add(collection, op)) instead of written immediately if given
     """
-    channels.update_one(
-        {'id': channel_id},
-        {'$inc': {'xExchanges': 1}, '$set': {'updated_at': datetime.datetime.utcnow()}}
-    )
+    query = {'id': channel_id}
+    update = {'$inc': {'xExchanges': 1}, '$set': {'updated_at': datetime.datetime.utcnow()}}
+    if batch is not None:
+        batch.add(channels, UpdateOne(query, update))
+        return
+    channels.update_one(query, update)
     
+def campaign_channel_names(from_channel_id, to_channel_id):
+    """Channel names stored on a campaign so listings need no channel lookups"""
+    found = channel_loader.load_many([from_channel_id, to_channel_id])
+    return {
+        'from_channel_name': (found.get(from_channel_id) or {}).get('name'),
+        'to_channel_name': (found.get(to_channel_id) or {}).get('name')
+    }
+
+
+def sync_campaign_channel_names(channel_id, name):
+    """Keep the names stored on campaigns in step with a renamed channel"""
+    now = datetime.datetime.utcnow()
+    campaigns.update_many({'fromChannelId': channel_id}, {'$set': {'from_channel_name': name, 'updated_at': now}})
+    campaigns.update_many({'toChannelId': channel_id}, {'$set': {'to_channel_name': name, 'updated_at': now}})
+
+
+def encode_cursor(created_at, doc_id):
+    """Opaque cursor for a (timestamp, id) position, e.g. in a newest-first listing"""
+    if isinstance(created_at, datetime.datetime):
+        created_at = created_at.isoformat()
+    return base64.urlsafe_b64encode(f"{created_at}|{doc_id}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    """(timestamp, id) from encode_cursor(), or None if the cursor is malformed"""
+    try:
+        created_at, doc_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|', 1)
+        return datetime.datetime.fromisoformat(created_at), doc_id
+    except (ValueError, UnicodeDecodeError, AttributeError):
+        return None
+
+
 def create_manual_campaign(request_id, from_channel_id, to_channel_id, promo, 
                            scheduled_start, scheduled_end, duration_hours, user_role):
     """
@@ -643,6 +1398,7 @@ def create_manual_campaign(request_id, from_channel_id, to_channel_id, promo,
         'request_id': request_id,
         'fromChannelId': from_channel_id,
         'toChannelId': to_channel_id,
+        **campaign_channel_names(from_channel_id, to_channel_id),
         'promo': promo,
         'duration_hours': duration_hours,
         'user_role': user_role,
@@ -702,6 +1458,7 @@ def create_single_manual_campaign(request_id, from_channel_id, to_channel_id,
         'request_id_str': request_id_str,  # Store as string to avoid ObjectId issues
         'fromChannelId': from_channel_id,
         'toChannelId': to_channel_id,
+        **campaign_channel_names(from_channel_id, to_channel_id),
         'duration_hours': duration_hours,
         'cpc_cost': cpc_cost,
         
@@ -719,6 +1476,8 @@ def create_single_manual_campaign(request_id, from_channel_id, to_channel_id,
         'requester_ended_at': None,
         'requester_reward_given': False,
         'requester_deadline_notified': False,  # For expiry notification
+        'requester_expires_at': None,  # Set when the side goes active
+        'requester_notified_expiry': False,
         
         
         # Acceptor tracking
@@ -728,6 +1487,8 @@ def create_single_manual_campaign(request_id, from_channel_id, to_channel_id,
         'acceptor_ended_at': None,
         'acceptor_reward_given': False,
         'acceptor_deadline_notified': False,  # For expiry notification
+        'acceptor_expires_at': None,  # Set when the side goes active
+        'acceptor_notified_expiry': False,
         
         # Metadata
         'created_at': datetime.datetime.utcnow(),
@@ -737,81 +1498,221 @@ def create_single_manual_campaign(request_id, from_channel_id, to_channel_id,
     campaigns.insert_one(campaign_doc)
     return campaign_id
 
-def get_user_campaigns(telegram_id):
+def _requests_box_filter(channel_ids, box):
+    """Requests received (inbox), sent (outbox) or either (None) by channel_ids"""
+    if box == 'inbox':
+        return {'toChannelId': {'$in': channel_ids}}
+    if box == 'outbox':
+        return {'fromChannelId': {'$in': channel_ids}}
+    return {'$or': [
+        {'fromChannelId': {'$in': channel_ids}},
+        {'toChannelId': {'$in': channel_ids}}
+    ]}
+
+
+def get_user_requests(channel_ids, box=None, statuses=None, after=None, limit=None, updated_since=None):
     """
-    Get all campaigns for channels owned by the user
+    Cross-promo requests for channel_ids, newest first
+    
+    box is 'inbox', 'outbox' or None for both; statuses limits to those
+    statuses; after is a decoded cursor (created_at, _id as a string) to
+    continue from; updated_since keeps only requests written since then.
+    Documents keep their _id so the caller can build the next cursor.
+    """
+    if not channel_ids:
+        return []
+    
+    query = _requests_box_filter(channel_ids, box)
+    if updated_since:
+        query = {'$and': [query, {'updated_at': {'$gte': updated_since}}]}
+    if statuses:
+        query = {'$and': [query, {'status': {'$in': list(statuses)}}]}
+    if after:
+        created_at, last_id = after
+        try:
+            last_id = ObjectId(last_id)
+        except InvalidId:
+            return []
+        query = {'$and': [query, {'$or': [
+            {'created_at': {'$lt': created_at}},
+            {'created_at': created_at, '_id': {'$lt': last_id}}
+        ]}]}
+    
+    cursor = requests_col.find(query).sort([('created_at', -1), ('_id', -1)])
+    if limit:
+        cursor = cursor.limit(limit)
+    return list(cursor)
+
+
+def count_user_requests(channel_ids):
+    """
+    {'inbox': {status: n}, 'outbox': {status: n}} for channel_ids in one aggregation
+    A request between two of the user's own channels counts in both boxes
+    """
+    counts = {'inbox': {}, 'outbox': {}}
+    if not channel_ids:
+        return counts
+    
+    by_status = [{'$group': {'_id': '$status', 'count': {'$sum': 1}}}]
+    result = next(requests_col.aggregate([
+        {'$match': _requests_box_filter(channel_ids, None)},
+        {'$facet': {
+            'inbox': [{'$match': {'toChannelId': {'$in': channel_ids}}}] + by_status,
+            'outbox': [{'$match': {'fromChannelId': {'$in': channel_ids}}}] + by_status
+        }}
+    ]), {})
+    for box in counts:
+        counts[box] = {row['_id']: row['count'] for row in result.get(box, []) if row['_id']}
+    return counts
+
+
+# Fields get_user_campaigns returns as ISO strings
+CAMPAIGN_LISTING_DATE_FIELDS = [
+    'requester_posted_at', 'requester_ended_at', 'acceptor_posted_at', 'acceptor_ended_at',
+    'created_at', 'updated_at', 'actual_start_at', 'actual_end_at', 'posting_deadline'
+]
+
+
+def get_user_campaigns(telegram_id, status=None, after=None, limit=None, updated_since=None, channel_ids=None):
     """
+    Get campaigns for channels owned by the user, newest first, as seen by
+    the user's side (user_role, promo, status, times, partner name)
     
-     # ADDED: Check and expire campaigns before fetching
-    check_and_expire_campaigns()
+    status filters on that role-specific status; after is a decoded cursor
+    (created_at, id) to continue from; limit caps the page size (paged rows
+    also carry cursor_created_at, the raw datetime for the next cursor);
+    updated_since keeps only campaigns written since then.
+    Everything runs in one aggregation pipeline.
+    """
     
     # Get user's channel IDs
-    user_channels = list(channels.find({'owner_id': telegram_id}, {'id': 1, '_id': 0}))
-    channel_ids = [ch['id'] for ch in user_channels]
+    if channel_ids is None:
+        channel_ids = [ch['id'] for ch in channels.find({'owner_id': telegram_id}, {'id': 1, '_id': 0})]
     
     if not channel_ids:
         return []
     
-    # Get campaigns where user is either sender or receiver - EXCLUDE _id
-    user_campaigns = list(campaigns.find({
-        '$or': [
-            {'fromChannelId': {'$in': channel_ids}},
-            {'toChannelId': {'$in': channel_ids}}
-        ]
-    }, {'_id': 0}))
+    # Campaigns where user is either sender or receiver
+    match = {'$or': [
+        {'fromChannelId': {'$in': channel_ids}},
+        {'toChannelId': {'$in': channel_ids}}
+    ]}
+    if updated_since:
+        match = {'$and': [match, {'updated_at': {'$gte': updated_since}}]}
+    if after:
+        created_at, campaign_id = after
+        match = {'$and': [match, {'$or': [
+            {'created_at': {'$lt': created_at}},
+            {'created_at': created_at, 'id': {'$lt': campaign_id}}
+        ]}]}
     
-    # Determine user_role and get user-specific data for each campaign
-    for campaign in user_campaigns:
-        from_id = campaign.get('fromChannelId')
-        to_id = campaign.get('toChannelId')
-        is_auto = campaign.get('type') == 'cross_promo_auto'
-        
-        if from_id in channel_ids:
-            # User is the requester
-            campaign['user_role'] = 'requester'
-            campaign['promo'] = campaign.get('acceptor_promo', {})  # Requester hosts acceptor's promo
-            
-            if is_auto:
-                campaign['status'] = campaign.get('status', 'pending_posting')
-                campaign['actual_start_at'] = campaign.get('actual_start_at', campaign.get('start_at'))
-                campaign['actual_end_at'] = campaign.get('actual_end_at', campaign.get('end_at'))
-                campaign['post_verification_link'] = None
-                # Set dummy posting_deadline to format UI correctly
-                campaign['posting_deadline'] = campaign.get('start_at')
-            else:
-                campaign['status'] = campaign.get('requester_status', 'pending_posting')
-                campaign['post_verification_link'] = campaign.get('requester_post_link')
-                campaign['actual_start_at'] = campaign.get('requester_posted_at')
-                campaign['actual_end_at'] = campaign.get('requester_ended_at')
-            
-            # Get partner channel name
-            partner_ch = channels.find_one({'id': to_id}, {'name': 1, '_id': 0})
-            if partner_ch:
-                campaign['partner_channel_name'] = partner_ch.get('name')
-        else:
-            # User is the acceptor
-            campaign['user_role'] = 'acceptor'
-            campaign['promo'] = campaign.get('requester_promo', {})  # Acceptor hosts requester's promo
-            
-            if is_auto:
-                campaign['status'] = campaign.get('status', 'pending_posting')
-                campaign['actual_start_at'] = campaign.get('actual_start_at', campaign.get('start_at'))
-                campaign['actual_end_at'] = campaign.get('actual_end_at', campaign.get('end_at'))
-                campaign['post_verification_link'] = None
-                # Set dummy posting_deadline to format UI correctly
-                campaign['posting_deadline'] = campaign.get('start_at')
-            else:
-                campaign['status'] = campaign.get('acceptor_status', 'pending_posting')
-                campaign['post_verification_link'] = campaign.get('acceptor_post_link')
-                campaign['actual_start_at'] = campaign.get('acceptor_posted_at')
-                campaign['actual_end_at'] = campaign.get('acceptor_ended_at')
-            
-            # Get partner channel name
-            partner_ch = channels.find_one({'id': from_id}, {'name': 1, '_id': 0})
-            if partner_ch:
-                campaign['partner_channel_name'] = partner_ch.get('name')
+    is_requester = {'$in': ['$fromChannelId', channel_ids]}
+    is_auto = {'$eq': ['$type', 'cross_promo_auto']}
+    
+    def by_role(requester_value, acceptor_value):
+        return {'$cond': [is_requester, requester_value, acceptor_value]}
     
-    return user_campaigns
+    def by_kind(auto_value, manual_value):
+        return {'$cond': [is_auto, auto_value, manual_value]}
+    
+    pipeline = [
+        {'$match': match},
+        {'$sort': {'created_at': -1, 'id': -1}},
+        {'$unset': ['_id', 'request_id', 'requester_promo._id', 'acceptor_promo._id', 'prepared_posts']},
+        # Requester hosts the acceptor's promo and vice versa; auto campaigns have one shared status
+        {'$addFields': {
+            'user_role': by_role('requester', 'acceptor'),
+            'promo': by_role({'$ifNull': ['$acceptor_promo', {}]}, {'$ifNull': ['$requester_promo', {}]}),
+            'status': by_kind(
+                {'$ifNull': ['$status', 'pending_posting']},
+                by_role({'$ifNull': ['$requester_status', 'pending_posting']},
+                        {'$ifNull': ['$acceptor_status', 'pending_posting']})
+            ),
+            'post_verification_link': by_kind(None, by_role('$requester_post_link', '$acceptor_post_link')),
+            'actual_start_at': by_kind({'$ifNull': ['$actual_start_at', '$start_at']},
+                                       by_role('$requester_posted_at', '$acceptor_posted_at')),
+            'actual_end_at': by_kind({'$ifNull': ['$actual_end_at', '$end_at']},
+                                     by_role('$requester_ended_at', '$acceptor_ended_at')),
+            # Auto campaigns use start_at as the deadline so the UI formats them correctly
+            'posting_deadline': by_kind('$start_at', '$posting_deadline'),
+            'partner_channel_name': by_role('$to_channel_name', '$from_channel_name')
+        }}
+    ]
+    if status:
+        pipeline.append({'$match': {'status': status}})
+    if limit:
+        pipeline.append({'$limit': limit})
+        # Pages keep the exact created_at for the next cursor (the listing's copy loses microseconds)
+        pipeline.append({'$addFields': {'cursor_created_at': '$created_at'}})
+    pipeline.append({'$addFields': {
+        field: {'$cond': [
+            {'$eq': [{'$type': f'${field}'}, 'date']},
+            {'$dateToString': {'date': f'${field}', 'format': '%Y-%m-%dT%H:%M:%S.%L'}},
+            f'${field}'
+        ]}
+        for field in CAMPAIGN_LISTING_DATE_FIELDS
+    }})
+    
+    return list(campaigns.aggregate(pipeline))
+
+def tombstone_channel_history(channel_id, owner_id):
+    """
+    Record tombstones for the campaigns and requests of a channel that is
+    about to be deleted, so the owner's synced clients drop them. Entries
+    the owner still sees through another of their channels are kept.
+    """
+    now = datetime.datetime.utcnow()
+    docs = []
+    for kind, collection in (('campaigns', campaigns), ('requests', requests_col)):
+        rows = list(collection.find(
+            {'$or': [{'fromChannelId': channel_id}, {'toChannelId': channel_id}]},
+            {'_id': 0, 'id': 1, 'fromChannelId': 1, 'toChannelId': 1}
+        ))
+        partner_ids = [row.get('toChannelId') if row.get('fromChannelId') == channel_id else row.get('fromChannelId')
+                       for row in rows]
+        partner_channels = channel_loader.load_many(partner_ids)
+        for row, partner_id in zip(rows, partner_ids):
+            partner = partner_channels.get(partner_id)
+            if row.get('id') and not (partner and partner.get('owner_id') == owner_id):
+                docs.append({'kind': kind, 'id': row['id'], 'owner_ids': [owner_id], 'deleted_at': now})
+    if docs:
+        tombstones.insert_many(docs, ordered=False)
+    return len(docs)
+
+
+def get_sync_delta(telegram_id, since=None):
+    """
+    Campaigns and requests the user's client has not seen yet
+    
+    since is the datetime from the previous response's cursor. Without it,
+    or when it is older than the tombstones we keep, everything is returned
+    with reset=True and the client replaces its copy. Writes stamp
+    updated_at before they commit, so changes close to the cursor are sent
+    again (SYNC_OVERLAP_SECONDS); clients apply them by id.
+    """
+    now = datetime.datetime.utcnow()
+    reset = since is None or since < now - datetime.timedelta(days=SYNC_TOMBSTONE_DAYS)
+    updated_since = None if reset else since - datetime.timedelta(seconds=SYNC_OVERLAP_SECONDS)
+    
+    channel_ids = [ch['id'] for ch in channels.find({'owner_id': telegram_id}, {'id': 1, '_id': 0})]
+    user_requests = get_user_requests(channel_ids, updated_since=updated_since)
+    for req in user_requests:
+        req.pop('_id', None)
+    
+    deleted = {'campaigns': [], 'requests': []}
+    if not reset:
+        for row in tombstones.find({'owner_ids': telegram_id, 'deleted_at': {'$gte': updated_since}},
+                                   {'_id': 0, 'kind': 1, 'id': 1}):
+            deleted.setdefault(row['kind'], []).append(row['id'])
+    
+    return {
+        'campaigns': get_user_campaigns(telegram_id, updated_since=updated_since, channel_ids=channel_ids),
+        'requests': user_requests,
+        'deleted': deleted,
+        'reset': reset,
+        'cursor': encode_cursor(now, 'sync')
+    }
+
 
 def verify_and_start_user_campaign(campaign_id, telegram_id, post_link):
     """
@@ -821,13 +1722,15 @@ def verify_and_start_user_campaign(campaign_id, telegram_id, post_link):
     if not campaign:
         return {'error': 'Campaign not found'}
     
-    # Determine if user is requester or acceptor
-    from_channel = channels.find_one({'id': campaign.get('fromChannelId')})
-    to_channel = channels.find_one({'id': campaign.get('toChannelId')})
+    # Determine if user is requester or acceptor (the route has usually loaded both already)
+    found = channel_loader.load_many([campaign.get('fromChannelId'), campaign.get('toChannelId')])
+    from_channel = found.get(campaign.get('fromChannelId'))
+    to_channel = found.get(campaign.get('toChannelId'))
     
     is_requester = from_channel and from_channel.get('owner_id') == telegram_id
     
     now = datetime.datetime.utcnow()
+    expires_at = now + datetime.timedelta(hours=campaign.get('duration_hours', 2))
     
     if is_requester:
         # Update requester's side
@@ -838,6 +1741,8 @@ def verify_and_start_user_campaign(campaign_id, telegram_id, post_link):
                     'requester_status': 'active',
                     'requester_post_link': post_link,
                     'requester_posted_at': now,
+                    'requester_expires_at': expires_at,
+                    'requester_notified_expiry': False,
                     'updated_at': now
                 }
             }
@@ -851,11 +1756,17 @@ def verify_and_start_user_campaign(campaign_id, telegram_id, post_link):
                     'acceptor_status': 'active',
                     'acceptor_post_link': post_link,
                     'acceptor_posted_at': now,
+                    'acceptor_expires_at': expires_at,
+                    'acceptor_notified_expiry': False,
                     'updated_at': now
                 }
             }
         )
     
+    from events import publish
+    publish([ch.get('owner_id') for ch in (from_channel, to_channel) if ch], 'campaign_posted',
+            campaign_id=campaign_id, role='requester' if is_requester else 'acceptor')
+    
     return {'ok': True}
 
 def end_user_campaign_and_reward(campaign_id, telegram_id):
@@ -872,8 +1783,9 @@ def end_user_campaign_and_reward(campaign_id, telegram_id):
     to_channel_id = campaign.get('toChannelId')
     
     # Get channel owners
-    from_channel = channels.find_one({'id': from_channel_id})
-    to_channel = channels.find_one({'id': to_channel_id})
+    found = channel_loader.load_many([from_channel_id, to_channel_id])
+    from_channel = found.get(from_channel_id)
+    to_channel = found.get(to_channel_id)
     
     if not from_channel or not to_channel:
         return {'error': 'Channels not found'}
@@ -912,6 +1824,12 @@ def end_user_campaign_and_reward(campaign_id, telegram_id):
         
         # Increment exchange counter for requester's channel
         increment_channel_exchanges(from_channel_id)
+        user_loader.forget(requester_id)
+        channel_loader.forget(from_channel_id)
+        
+        from events import publish, reward_credited
+        publish([requester_id, acceptor_id], 'campaign_ended', campaign_id=campaign_id, role='requester')
+        reward_credited(requester_id, requester_bonus, 'campaign', campaign_id=campaign_id)
         
         return {
             'ok': True,
@@ -925,7 +1843,7 @@ def end_user_campaign_and_reward(campaign_id, telegram_id):
             return {'error': 'Reward already claimed'}
         
         # Verify requester has enough balance BEFORE deducting
-        requester_user = users.find_one({'telegram_id': requester_id})
+        requester_user = user_loader.load(requester_id)
         if not requester_user:
             return {'error': 'Requester not found'}
         
@@ -963,6 +1881,13 @@ def end_user_campaign_and_reward(campaign_id, telegram_id):
         
         # Increment exchange counter for acceptor's channel
         increment_channel_exchanges(to_channel_id)
+        user_loader.forget(requester_id, acceptor_id)
+        channel_loader.forget(to_channel_id)
+        
+        from events import publish, reward_credited
+        publish([requester_id, acceptor_id], 'campaign_ended', campaign_id=campaign_id, role='acceptor')
+        publish([requester_id], 'balance_changed', delta=-cpc_cost, reason='campaign')
+        reward_credited(acceptor_id, cpc_cost, 'campaign', campaign_id=campaign_id)
         
         return {
             'ok': True,
@@ -970,130 +1895,6 @@ def end_user_campaign_and_reward(campaign_id, telegram_id):
             'role': 'acceptor'
         }
         
-def check_and_expire_campaigns():
-    """
-    Check all pending campaigns and expire ONLY the user's side that failed to post.
-    Each side is independent - if requester posts but acceptor doesn't, only acceptor gets penalized.
-    Deduct 250 CP coins from users who failed to post within deadline.
-    """
-    from config import TELEGRAM_BOT_TOKEN
-    from bot import send_message
-    
-    now = datetime.datetime.utcnow()
-    
-    # Find all campaigns that have passed their deadline
-    expired_campaigns = campaigns.find({
-        'posting_deadline': {'$lt': now},
-        '$or': [
-            {'requester_status': 'pending_posting'},
-            {'acceptor_status': 'pending_posting'}
-        ]
-    })
-    
-    for campaign in expired_campaigns:
-        campaign_id = campaign.get('id')
-        from_channel_id = campaign.get('fromChannelId')
-        to_channel_id = campaign.get('toChannelId')
-        
-        # Get channel owners
-        from_channel = channels.find_one({'id': from_channel_id})
-        to_channel = channels.find_one({'id': to_channel_id})
-        
-        if not from_channel or not to_channel:
-            continue
-        
-        requester_id = from_channel.get('owner_id')
-        acceptor_id = to_channel.get('owner_id')
-        
-        requester_status = campaign.get('requester_status')
-        acceptor_status = campaign.get('acceptor_status')
-        
-        penalty = 250  # CP coins penalty
-        
-        # INDEPENDENT EXPIRATION: Handle requester side ONLY if they failed
-        if requester_status == 'pending_posting':
-            # Check requester's balance before deducting
-            requester_user = users.find_one({'telegram_id': requester_id})
-            if requester_user:
-                current_balance = requester_user.get('cpcBalance', 0)
-                # Deduct penalty (can go negative)
-                users.update_one(
-                    {'telegram_id': requester_id},
-                    {
-                        '$inc': {'cpcBalance': -penalty},
-                        '$set': {'updated_at': now}
-                    }
-                )
-                
-                # Update ONLY requester's status to expired
-                campaigns.update_one(
-                    {'id': campaign_id},
-                    {
-                        '$set': {
-                            'requester_status': 'expired',
-                            'requester_expired_at': now,
-                            'updated_at': now
-                        }
-                    }
-                )
-                
-                # Notify requester
-                try:
-                    send_message(
-                        requester_id,
-                        f"⚠️ Your Campaign Expired!\n\n"
-                        f"You failed to post your cross-promo within 48 hours.\n"
-                        f"Penalty: -{penalty} CP Coins deducted from your balance.\n\n"
-                        f"Partner: {to_channel.get('name')}\n\n"
-                        f"Note: Your partner's campaign will continue if they posted on time."
-                    )
-                except Exception as e:
-                    print(f"Failed to notify requester {requester_id}: {e}")
-                
-                print(f"Campaign {campaign_id} - Requester side expired. Penalty applied to {requester_id}")
-        
-        # INDEPENDENT EXPIRATION: Handle acceptor side ONLY if they failed
-        if acceptor_status == 'pending_posting':
-            # Check acceptor's balance before deducting
-            acceptor_user = users.find_one({'telegram_id': acceptor_id})
-            if acceptor_user:
-                current_balance = acceptor_user.get('cpcBalance', 0)
-                # Deduct penalty (can go negative)
-                users.update_one(
-                    {'telegram_id': acceptor_id},
-                    {
-                        '$inc': {'cpcBalance': -penalty},
-                        '$set': {'updated_at': now}
-                    }
-                )
-                
-                # Update ONLY acceptor's status to expired
-                campaigns.update_one(
-                    {'id': campaign_id},
-                    {
-                        '$set': {
-                            'acceptor_status': 'expired',
-                            'acceptor_expired_at': now,
-                            'updated_at': now
-                        }
-                    }
-                )
-                
-                # Notify acceptor
-                try:
-                    send_message(
-                        acceptor_id,
-                        f"⚠️ Your Campaign Expired!\n\n"
-                        f"You failed to post your cross-promo within 48 hours.\n"
-                        f"Penalty: -{penalty} CP Coins deducted from your balance.\n\n"
-                        f"Partner: {from_channel.get('name')}\n\n"
-                        f"Note: Your partner's campaign will continue if they posted on time."
-                    )
-                except Exception as e:
-                    print(f"Failed to notify acceptor {acceptor_id}: {e}")
-                
-                print(f"Campaign {campaign_id} - Acceptor side expired. Penalty applied to {acceptor_id}")
-                
 import datetime
 
 # Define follow-up messages configuration
@@ -1216,8 +2017,11 @@ def initialize_user_onboarding(telegram_id):
                     'next_message_at': first_message_time,
                     'sequence_active': True,
                     'messages_sent': [],
+                    'processing': False,
                     'updated_at': now
-                }
+                },
+                # A restart wins over any follow-up batch currently holding this user
+                '$unset': {'claim_id': '', 'claimed_at': ''}
             },
             upsert=True
         )
@@ -1230,17 +2034,51 @@ def initialize_user_onboarding(telegram_id):
         return False
 
 
-def get_pending_followup_messages():
+def claim_followup_batch(limit):
     """
-    Get all users who are due to receive their next follow-up message
+    Claim up to `limit` users due a follow-up message for this worker
+    Candidates are stamped with a fresh claim id in one update_many; only
+    documents that were still unclaimed get the stamp, so reading the batch
+    back by claim id returns exactly the users this worker owns.
+    Returns (claim_id, users)
     """
     now = datetime.datetime.utcnow()
+    claim_id = uuid.uuid4().hex
     
-    pending = list(user_onboarding.find({
+    candidate_ids = [doc['_id'] for doc in user_onboarding.find({
         'sequence_active': True,
         'next_message_at': {'$lte': now},
         'current_message_index': {'$lt': len(FOLLOW_UP_MESSAGES)},
-        'processing': {'$ne': True}  # ✅ Skip users currently being processed
-    }))
+        'processing': {'$ne': True}
+    }, {'_id': 1}).sort('next_message_at', 1).limit(limit)]
     
-    return pending
\ No newline at end of file
+    if not candidate_ids:
+        return claim_id, []
+    
+    user_onboarding.update_many(
+        {'_id': {'$in': candidate_ids}, 'processing': {'$ne': True}},
+        {'$set': {'processing': True, 'claim_id': claim_id, 'claimed_at': now}}
+    )
+    return claim_id, list(user_onboarding.find({'claim_id': claim_id}))
+
+
+def release_stale_followup_claims(max_age_minutes=15):
+    """Put users whose claim was abandoned (e.g. the worker died mid-batch) back in the queue"""
+    now = datetime.datetime.utcnow()
+    result = user_onboarding.update_many(
+        {
+            'processing': True,
+            '$or': [
+                {'claimed_at': {'$lt': now - datetime.timedelta(minutes=max_age_minutes)}},
+                # Locks taken before claim ids existed pushed next_message_at ~999 days out
+                {'claimed_at': {'$exists': False}, 'next_message_at': {'$gt': now + datetime.timedelta(days=365)}}
+            ]
+        },
+        {
+            '$set': {'processing': False, 'next_message_at': now},
+            '$unset': {'claim_id': '', 'claimed_at': ''}
+        }
+    )
+    if result.modified_count:
+        logging.warning(f"[ONBOARDING] Released {result.modified_count} stale follow-up claims")
+    return result.modified_count
\ No newline at end of file
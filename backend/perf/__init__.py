@@ -0,0 +1,4 @@
+"""
+Performance tooling: fake Telegram server, scheduler simulator and friends
+Run the tools from the backend directory, e.g. python -m perf.simulate --help
+"""
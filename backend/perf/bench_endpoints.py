@@ -0,0 +1,230 @@
+"""
+Benchmarks for the hot API routes
+
+Drives the Flask app in-process (test client) against a seeded *_perf
+database at one or more channel scales and reports latency percentiles,
+Mongo commands and Telegram calls per request and peak Python memory per
+request. Results can be compared with a JSON baseline:
+
+    cd backend
+    python -m perf.bench_endpoints --scales 1000,10000 --baseline perf/baseline.json
+    python -m perf.bench_endpoints --scales 1000,10000 --baseline perf/baseline.json --update-baseline
+
+A route regresses when its p95 latency or peak memory grows by more than
+--tolerance, or when it issues more Mongo commands than the baseline.
+Latency only compares fairly on the machine the baseline was recorded on;
+command counts compare anywhere.
+"""
+import argparse
+import datetime
+import hashlib
+import hmac
+import json
+import os
+import sys
+import time
+import tracemalloc
+from urllib.parse import urlencode
+
+from pymongo import monitoring
+
+from perf.fake_telegram import FakeTelegram
+from perf.stats import CommandCounter, summarize, format_seconds
+
+ADMIN_ID = '999999999'
+BOT_TOKEN = 'perf-token'
+
+# (name, method, path, who) where who is 'heavy', 'light', 'admin' or 'login'
+ROUTES = [
+    ('auth_telegram', 'POST', '/api/auth/telegram', 'login'),
+    ('me', 'GET', '/api/me', 'heavy'),
+    ('channels_all', 'GET', '/api/channels/all', 'light'),
+    ('campaigns', 'GET', '/api/campaigns', 'heavy'),
+    ('requests', 'GET', '/api/requests', 'heavy'),
+    ('partners', 'GET', '/api/partners', 'heavy'),
+    ('analytics', 'GET', '/api/analytics', 'heavy'),
+    ('admin_channels', 'GET', '/api/admin/channels', 'admin'),
+    ('admin_stats', 'GET', '/api/admin/stats', 'admin'),
+    ('admin_analytics', 'GET', '/api/admin/analytics', 'admin'),
+    ('admin_purchase_stats', 'GET', '/api/admin/purchases/stats', 'admin'),
+    ('admin_folder_registrations', 'GET', '/api/admin/folder-promos/registrations', 'admin'),
+]
+
+# Fixed anchor so every run benchmarks identical data
+DATASET_NOW = datetime.datetime(2026, 1, 5, 12, 0)
+
+
+def webapp_init_data(telegram_id, bot_token):
+    """Signed Telegram WebApp initData for telegram_id, as the Mini App would send it"""
+    fields = {
+        'auth_date': str(int(time.time())),
+        'query_id': 'perf',
+        'user': json.dumps({'id': int(telegram_id), 'first_name': 'Perf', 'username': f"perf_{telegram_id}"})
+    }
+    data_check_string = '\n'.join(f"{k}={v}" for k, v in sorted(fields.items()))
+    secret_key = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    fields['hash'] = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+    return urlencode(fields)
+
+
+def bench_route(client, commands, fake, method, path, headers, body, iterations, warmup):
+    for _ in range(warmup):
+        client.open(path, method=method, headers=headers, json=body)
+
+    latencies, command_counts, telegram_counts, errors = [], [], [], 0
+    for _ in range(iterations):
+        before_commands = sum(commands.snapshot(path).values())
+        before_telegram = sum(fake.snapshot().values())
+        commands.use(path)
+        started = time.perf_counter()
+        response = client.open(path, method=method, headers=headers, json=body)
+        latencies.append(time.perf_counter() - started)
+        commands.use(None)
+        command_counts.append(sum(commands.snapshot(path).values()) - before_commands)
+        telegram_counts.append(sum(fake.snapshot().values()) - before_telegram)
+        if response.status_code >= 400:
+            errors += 1
+
+    # Memory is measured on a separate request so tracing does not skew latency
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline, _ = tracemalloc.get_traced_memory()
+    client.open(path, method=method, headers=headers, json=body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latency = summarize(latencies)
+    return {
+        'p50_ms': latency['p50'] * 1000,
+        'p95_ms': latency['p95'] * 1000,
+        'p99_ms': latency['p99'] * 1000,
+        'mongo_commands': max(command_counts),
+        'telegram_calls': max(telegram_counts),
+        'peak_kb': (peak - baseline) / 1024,
+        'errors': errors
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Regression messages for results against baseline"""
+    problems = []
+    for scale, routes in results.items():
+        for name, current in routes.items():
+            previous = baseline.get(scale, {}).get(name)
+            if not previous:
+                continue
+            if current['mongo_commands'] > previous['mongo_commands']:
+                problems.append(f"{scale}/{name}: {previous['mongo_commands']} -> {current['mongo_commands']} Mongo commands")
+            for key in ('p95_ms', 'peak_kb'):
+                if previous[key] and current[key] > previous[key] * (1 + tolerance):
+                    problems.append(f"{scale}/{name}: {key} {previous[key]:.1f} -> {current[key]:.1f}")
+            if current['errors'] and not previous.get('errors'):
+                problems.append(f"{scale}/{name}: {current['errors']} error responses")
+    return problems
+
+
+def print_results(scale, routes, baseline, out=sys.stdout):
+    out.write(f"\n== {scale} channels ==\n")
+    out.write(f"{'route':28} {'p50':>9} {'p95':>9} {'p99':>9} {'mongo':>6} {'tg':>4} {'peak':>10} {'errors':>6}  vs baseline p95\n")
+    for name, r in routes.items():
+        previous = baseline.get(str(scale), {}).get(name)
+        delta = f"{(r['p95_ms'] / previous['p95_ms'] - 1) * 100:+.0f}%" if previous and previous['p95_ms'] else '-'
+        out.write(
+            f"{name:28} {format_seconds(r['p50_ms'] / 1000):>9} {format_seconds(r['p95_ms'] / 1000):>9} "
+            f"{format_seconds(r['p99_ms'] / 1000):>9} {r['mongo_commands']:>6} {r['telegram_calls']:>4} "
+            f"{r['peak_kb']:>8.0f}KB {r['errors']:>6}  {delta}\n"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the hot API routes in-process')
+    parser.add_argument('--mongo-uri', default='mongodb://localhost:27017/cpgram_perf')
+    parser.add_argument('--scales', default='1000,10000,100000', help='Comma separated channel counts')
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--routes', help='Comma separated route names to run (default: all)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--baseline', help='Baseline JSON to compare against (or write with --update-baseline)')
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed p95/memory growth before failing')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    db_name = args.mongo_uri.rsplit('/', 1)[-1].split('?', 1)[0]
+    if not db_name.endswith('_perf'):
+        parser.error(f"refusing to wipe database {db_name!r}: its name must end in _perf")
+
+    fake = FakeTelegram()
+    os.environ.update({
+        'MONGO_URI': args.mongo_uri,
+        'TELEGRAM_API_BASE': fake.start(),
+        'TELEGRAM_BOT_TOKEN': BOT_TOKEN,
+        'ADMIN_TELEGRAM_ID': ADMIN_ID,
+        'NO_SCHEDULER': '1'
+    })
+
+    commands = CommandCounter()
+    monitoring.register(commands)
+
+    import models
+    from perf import seed_dataset
+    from perf.workload import COLLECTIONS
+    from app import app
+    from auth import create_token
+
+    selected = [r for r in ROUTES if not args.routes or r[0] in args.routes.split(',')]
+    baseline = {}
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = {}
+    client = app.test_client()
+    for scale in [int(value) for value in args.scales.split(',')]:
+        for name in COLLECTIONS:
+            models.db[name].delete_many({})
+        models.ensure_indexes()
+        seeded = seed_dataset.generate(models.db, seed_dataset.scaled_counts(scale), seed=args.seed, now=DATASET_NOW)
+        models.backfill_channel_analytics()
+        models.backfill_platform_analytics()
+        models.users.insert_one({'telegram_id': ADMIN_ID, 'name': 'Perf Admin', 'isAdmin': True, 'cpcBalance': 0})
+
+        headers = {
+            'heavy': {'Authorization': f"Bearer {create_token(seeded['heavy_user_id'])}"},
+            'light': {'Authorization': f"Bearer {create_token(seeded['light_user_id'])}"},
+            'admin': {'Authorization': f"Bearer {create_token(ADMIN_ID)}"},
+            'login': {}
+        }
+        login_body = {'initData': webapp_init_data(seeded['heavy_user_id'], BOT_TOKEN)}
+
+        routes = {}
+        for name, method, path, who in selected:
+            body = login_body if who == 'login' else None
+            routes[name] = bench_route(client, commands, fake, method, path, headers[who], body,
+                                       args.iterations, args.warmup)
+        results[str(scale)] = routes
+        print_results(scale, routes, baseline)
+
+    fake.stop()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline and args.update_baseline:
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"\nBaseline written to {args.baseline}")
+        return
+
+    problems = compare(results, baseline, args.tolerance)
+    if problems:
+        print("\nRegressions against baseline:")
+        for problem in problems:
+            print(f"  {problem}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
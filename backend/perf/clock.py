@@ -0,0 +1,82 @@
+"""
+Virtual clock for running scheduler jobs faster than real time
+
+install() swaps the datetime/time names the backend modules imported for
+versions that read the clock, so datetime.utcnow(), time.sleep() and the
+rate limiter's time.monotonic() all follow virtual time.
+"""
+import datetime as _datetime
+import threading
+import types
+
+_real_datetime = _datetime.datetime
+
+
+class VirtualClock:
+    """Naive-UTC virtual time; sleep(n) moves it forward instead of waiting"""
+
+    def __init__(self, start):
+        self._now = start
+        self._origin = start
+        self._lock = threading.Lock()
+
+    def now(self):
+        with self._lock:
+            return self._now
+
+    def advance_to(self, moment):
+        with self._lock:
+            if moment > self._now:
+                self._now = moment
+
+    def sleep(self, seconds):
+        # Threads sleeping at the same time overlap, like real sleeps would
+        if seconds > 0:
+            self.advance_to(self.now() + _datetime.timedelta(seconds=seconds))
+
+    def monotonic(self):
+        return (self.now() - self._origin).total_seconds()
+
+
+def _datetime_class(clock):
+    class VirtualDatetime(_real_datetime):
+        @classmethod
+        def utcnow(cls):
+            return clock.now()
+
+        @classmethod
+        def now(cls, tz=None):
+            if tz is None:
+                return clock.now()
+            return clock.now().replace(tzinfo=_datetime.timezone.utc).astimezone(tz)
+
+    return VirtualDatetime
+
+
+def install(clock, scheduler_module, models_module, dispatcher_module):
+    """Point the scheduler, models and dispatcher modules at the virtual clock"""
+    import time as real_time
+
+    virtual_datetime = _datetime_class(clock)
+
+    datetime_module = types.SimpleNamespace(**{
+        name: getattr(_datetime, name) for name in dir(_datetime) if not name.startswith('__')
+    })
+    datetime_module.datetime = virtual_datetime
+
+    time_module = types.SimpleNamespace(**{
+        name: getattr(real_time, name) for name in dir(real_time) if not name.startswith('__')
+    })
+    time_module.sleep = clock.sleep
+    time_module.monotonic = clock.monotonic
+    time_module.time = lambda: clock.now().replace(tzinfo=_datetime.timezone.utc).timestamp()
+
+    scheduler_module.datetime = virtual_datetime
+    scheduler_module.time = time_module
+    models_module.datetime = datetime_module
+    dispatcher_module.time = time_module
+
+    # The shared limiter was created on the real clock
+    limiter = dispatcher_module.telegram_limiter
+    limiter.updated = clock.monotonic()
+    limiter.tokens = limiter.capacity
@@ -0,0 +1,198 @@
+"""
+Fake Telegram Bot API for benchmarks and simulations
+
+Answers every Bot API method the backend uses with plausible results, counts
+calls per method and can add latency or 429s. Point the backend at it with
+TELEGRAM_API_BASE=http://127.0.0.1:<port>
+
+    python -m perf.fake_telegram --port 8081 --latency-ms 40
+
+GET /_stats returns the call counts, POST /_reset clears them.
+"""
+import argparse
+import itertools
+import json
+import logging
+import random
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+_METHOD_PATH = re.compile(r'^/bot[^/]*/(\w+)$')
+
+
+def _chat_number(chat_id):
+    """Stable negative channel id for an @username (or whatever was passed)"""
+    try:
+        return int(chat_id)
+    except (TypeError, ValueError):
+        return -1000000000000 - zlib.crc32(str(chat_id).encode())
+
+
+class FakeTelegram:
+    """In-process fake Bot API server; start() returns its base URL"""
+
+    def __init__(self, host='127.0.0.1', port=0, latency_ms=0, rate_limit_ratio=0.0, seed=0):
+        self.latency = latency_ms / 1000.0
+        self.rate_limit_ratio = rate_limit_ratio
+        self.calls = Counter()
+        self.rate_limited = Counter()
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._message_ids = itertools.count(1)
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-telegram', daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def snapshot(self):
+        with self._lock:
+            return Counter(self.calls)
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+            self.rate_limited.clear()
+
+    def _count(self, method):
+        with self._lock:
+            self.calls[method] += 1
+            if self.rate_limit_ratio and self._random.random() < self.rate_limit_ratio:
+                self.rate_limited[method] += 1
+                return False
+            return True
+
+    def answer(self, method, params):
+        """Bot API response body for one call"""
+        if not self._count(method):
+            return {'ok': False, 'error_code': 429, 'description': 'Too Many Requests: retry after 1',
+                    'parameters': {'retry_after': 1}}
+        if self.latency:
+            time.sleep(self.latency)
+
+        chat_id = params.get('chat_id')
+        now = int(time.time())
+
+        if method in ('sendMessage', 'sendPhoto'):
+            message = {'message_id': next(self._message_ids), 'date': now,
+                       'chat': {'id': _chat_number(chat_id), 'type': 'channel'}}
+            if method == 'sendPhoto':
+                file_key = zlib.crc32(str(params.get('photo')).encode())
+                message['photo'] = [
+                    {'file_id': f"fake-photo-{file_key}-s", 'width': 90, 'height': 90},
+                    {'file_id': f"fake-photo-{file_key}", 'width': 1280, 'height': 720}
+                ]
+                message['caption'] = params.get('caption')
+            else:
+                message['text'] = params.get('text')
+            return {'ok': True, 'result': message}
+        if method == 'copyMessage':
+            return {'ok': True, 'result': {'message_id': next(self._message_ids)}}
+        if method == 'getChat':
+            number = _chat_number(chat_id)
+            username = str(chat_id).lstrip('@')
+            return {'ok': True, 'result': {'id': number, 'type': 'channel', 'title': f"Channel {username}",
+                                           'username': username}}
+        if method == 'getChatMemberCount':
+            return {'ok': True, 'result': 500 + zlib.crc32(str(chat_id).encode()) % 200000}
+        if method == 'getChatMember':
+            return {'ok': True, 'result': {'status': 'administrator', 'can_post_messages': True,
+                                           'user': {'id': params.get('user_id'), 'is_bot': False}}}
+        if method == 'getFile':
+            return {'ok': True, 'result': {'file_id': params.get('file_id'), 'file_path': 'photos/fake.jpg'}}
+        if method == 'getUpdates':
+            return {'ok': True, 'result': []}
+        if method == 'getWebhookInfo':
+            return {'ok': True, 'result': {'url': '', 'pending_update_count': 0}}
+        # deleteMessage, sendInvoice, setWebhook, answerPreCheckoutQuery, ...
+        return {'ok': True, 'result': True}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, body, status=200):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _params(self):
+                params = dict(parse_qsl(urlparse(self.path).query))
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    raw = self.rfile.read(length)
+                    if 'json' in (self.headers.get('Content-Type') or ''):
+                        try:
+                            params.update(json.loads(raw or b'{}'))
+                        except ValueError:
+                            pass
+                    else:
+                        params.update(parse_qsl(raw.decode(errors='replace')))
+                return params
+
+            def _dispatch(self):
+                path = urlparse(self.path).path
+                if path == '/_stats':
+                    with fake._lock:
+                        return self._reply({'calls': dict(fake.calls), 'rate_limited': dict(fake.rate_limited)})
+                if path == '/_reset':
+                    fake.reset()
+                    return self._reply({'ok': True})
+                if path.startswith('/file/'):
+                    return self._reply({'ok': True})
+                match = _METHOD_PATH.match(path)
+                if not match:
+                    return self._reply({'ok': False, 'error_code': 404, 'description': 'Not Found'}, 404)
+                body = fake.answer(match.group(1), self._params())
+                self._reply(body, 200 if body.get('ok') else body.get('error_code', 400))
+
+            do_GET = _dispatch
+            do_POST = _dispatch
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a fake Telegram Bot API server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency-ms', type=float, default=0, help='Delay added to every call')
+    parser.add_argument('--rate-limit-ratio', type=float, default=0.0, help='Share of calls answered with a 429')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    fake = FakeTelegram(args.host, args.port, args.latency_ms, args.rate_limit_ratio)
+    logging.info(f"[FAKE_TELEGRAM] Listening on {fake.base_url}")
+    try:
+        fake._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake._server.server_close()
+
+
+if __name__ == '__main__':
+    main()
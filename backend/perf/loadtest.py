@@ -0,0 +1,234 @@
+"""
+Load test: replay Mini App sessions against a running deployment
+
+Start the fake Telegram server and the app against a seeded *_perf database
+first, with the same bot token, e.g.
+
+    cd backend
+    python -m perf.fake_telegram --port 8081 &
+    python -m perf.seed_dataset --scale 10000
+    MONGO_URI=mongodb://localhost:27017/cpgram_perf TELEGRAM_API_BASE=http://127.0.0.1:8081 \\
+        TELEGRAM_BOT_TOKEN=perf-token NO_SCHEDULER=1 gunicorn -w 4 -b 127.0.0.1:5000 app:app
+    python -m perf.loadtest --base-url http://127.0.0.1:5000 --stages 10,25,50,100
+
+Every virtual user logs in with signed WebApp initData and then loops over
+its persona's session flow. Each stage runs a fixed number of users for
+--stage-seconds; throughput, error rate and latency percentiles are
+reported per route and stage.
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import requests
+from pymongo import MongoClient
+
+from perf.bench_endpoints import webapp_init_data
+from perf.stats import summarize, format_seconds
+
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+class Session:
+    """One virtual Mini App user"""
+
+    def __init__(self, base_url, user, channel_ids, bot_token, record, rng, think_ms):
+        self.base_url = base_url.rstrip('/')
+        self.user = user
+        self.channel_ids = channel_ids
+        self.bot_token = bot_token
+        self.record = record
+        self.rng = rng
+        self.think = think_ms / 1000.0
+        self.http = requests.Session()
+
+    def call(self, label, method, path, body=None):
+        started = time.perf_counter()
+        try:
+            response = self.http.request(method, self.base_url + path, json=body, timeout=30)
+            ok = response.status_code < 400
+            data = response.json() if ok and response.content else None
+        except (requests.RequestException, ValueError):
+            ok, data = False, None
+        self.record(label, time.perf_counter() - started, ok)
+        if self.think:
+            time.sleep(self.rng.expovariate(1.0 / self.think))
+        return data
+
+    def login(self):
+        data = self.call('POST /api/auth/telegram', 'POST', '/api/auth/telegram',
+                         {'initData': webapp_init_data(self.user['telegram_id'], self.bot_token)})
+        token = (data or {}).get('token')
+        if token:
+            self.http.headers['Authorization'] = f"Bearer {token}"
+        return bool(token)
+
+    def browse(self):
+        self.call('GET /api/me', 'GET', '/api/me')
+        self.call('GET /api/channels/all', 'GET', '/api/channels/all')
+        for channel_id in self.rng.sample(self.channel_ids, min(3, len(self.channel_ids))):
+            self.call('GET /api/channels/<id>', 'GET', f"/api/channels/{channel_id}")
+
+    def send_request(self):
+        to_id = self.rng.choice(self.channel_ids)
+        if to_id == self.user['channel_id']:
+            return
+        hour = self.rng.randint(0, 23)
+        self.call('POST /api/request', 'POST', '/api/request', {
+            'fromChannelId': self.user['channel_id'],
+            'toChannelId': to_id,
+            'daySelected': self.rng.choice(DAYS),
+            'timeSelected': f"{hour:02d}:00 - {(hour + 1) % 24:02d}:00 UTC",
+            'duration': self.rng.choice([2, 4, 6, 12, 24]),
+            'cpcCost': self.rng.randint(1, 50),
+            'promo': {'name': 'Load test', 'text': 'Load test promo', 'link': 'https://t.me/perf', 'cta': 'Join'}
+        })
+
+    # Persona flows: what one session does after logging in
+
+    def browser(self):
+        self.browse()
+        self.call('GET /api/campaigns', 'GET', '/api/campaigns')
+
+    def trader(self):
+        self.browse()
+        self.send_request()
+        self.call('GET /api/requests', 'GET', '/api/requests')
+        self.call('GET /api/campaigns', 'GET', '/api/campaigns')
+
+    def task_hunter(self):
+        self.call('GET /api/me', 'GET', '/api/me')
+        self.call('GET /api/tasks', 'GET', '/api/tasks')
+        self.call('GET /api/campaigns', 'GET', '/api/campaigns')
+        self.call('GET /api/analytics', 'GET', '/api/analytics')
+
+
+PERSONAS = [('browser', 60), ('trader', 30), ('task_hunter', 10)]
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def __call__(self, label, seconds, ok):
+        with self._lock:
+            self.samples[label].append(seconds)
+            if not ok:
+                self.errors[label] += 1
+
+
+def run_user(base_url, user, channel_ids, bot_token, recorder, seed, think_ms, stop):
+    rng = random.Random(seed)
+    persona = rng.choices([name for name, _ in PERSONAS], weights=[weight for _, weight in PERSONAS])[0]
+    session = Session(base_url, user, channel_ids, bot_token, recorder, rng, think_ms)
+    while not stop.is_set():
+        # A new Mini App launch logs in again
+        if session.login():
+            getattr(session, persona)()
+
+
+def run_stage(args, users, channel_ids, concurrency, stage_index):
+    recorder = Recorder()
+    stop = threading.Event()
+    threads = [
+        threading.Thread(
+            target=run_user,
+            args=(args.base_url, users[i % len(users)], channel_ids, args.bot_token, recorder,
+                  args.seed * 100003 + stage_index * 1009 + i, args.think_ms, stop),
+            daemon=True
+        )
+        for i in range(concurrency)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.stage_seconds)
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=60)
+    elapsed = time.perf_counter() - started
+
+    routes = {}
+    for label, samples in sorted(recorder.samples.items()):
+        latency = summarize(samples)
+        routes[label] = {
+            'requests': len(samples),
+            'rps': len(samples) / elapsed,
+            'error_rate': recorder.errors[label] / len(samples),
+            'p50_ms': latency['p50'] * 1000,
+            'p95_ms': latency['p95'] * 1000,
+            'p99_ms': latency['p99'] * 1000
+        }
+    total = sum(r['requests'] for r in routes.values())
+    return {
+        'concurrency': concurrency,
+        'seconds': elapsed,
+        'rps': total / elapsed if elapsed else 0,
+        'error_rate': sum(recorder.errors.values()) / total if total else 0,
+        'routes': routes
+    }
+
+
+def print_stage(stage, out=sys.stdout):
+    out.write(f"\n== {stage['concurrency']} users: {stage['rps']:.1f} req/s, {stage['error_rate'] * 100:.2f}% errors ==\n")
+    out.write(f"{'route':28} {'reqs':>7} {'req/s':>8} {'err%':>6} {'p50':>9} {'p95':>9} {'p99':>9}\n")
+    for label, r in stage['routes'].items():
+        out.write(
+            f"{label:28} {r['requests']:>7} {r['rps']:>8.1f} {r['error_rate'] * 100:>6.2f} "
+            f"{format_seconds(r['p50_ms'] / 1000):>9} {format_seconds(r['p95_ms'] / 1000):>9} "
+            f"{format_seconds(r['p99_ms'] / 1000):>9}\n"
+        )
+
+
+def load_users(mongo_uri, count, seed):
+    """Users owning an approved channel, plus the channel ids to browse"""
+    db = MongoClient(mongo_uri).get_default_database()
+    approved = list(db.channels.find({'status': 'approved', 'is_paused': False}, {'_id': 0, 'id': 1, 'owner_id': 1}))
+    owners = {}
+    for channel in approved:
+        owners.setdefault(channel['owner_id'], channel['id'])
+    rng = random.Random(seed)
+    picked = rng.sample(sorted(owners), min(count, len(owners)))
+    return [{'telegram_id': owner, 'channel_id': owners[owner]} for owner in picked], [c['id'] for c in approved]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ramp up simulated Mini App sessions against a running app')
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--mongo-uri', default='mongodb://localhost:27017/cpgram_perf', help='Seeded database the app uses')
+    parser.add_argument('--bot-token', default='perf-token', help="The app's TELEGRAM_BOT_TOKEN (signs initData)")
+    parser.add_argument('--stages', default='5,10,25,50,100', help='Concurrent users per stage')
+    parser.add_argument('--stage-seconds', type=int, default=30)
+    parser.add_argument('--think-ms', type=float, default=500, help='Mean pause between calls (0 to hammer)')
+    parser.add_argument('--users', type=int, default=1000, help='Distinct accounts to log in as')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    db_name = args.mongo_uri.rsplit('/', 1)[-1].split('?', 1)[0]
+    if not db_name.endswith('_perf'):
+        parser.error(f"refusing to load test against database {db_name!r}: its name must end in _perf")
+
+    users, channel_ids = load_users(args.mongo_uri, args.users, args.seed)
+    if not users:
+        parser.error('no approved channels found; seed the database with perf.seed_dataset first')
+
+    stages = []
+    for index, concurrency in enumerate(int(value) for value in args.stages.split(',')):
+        stage = run_stage(args, users, channel_ids, concurrency, index)
+        print_stage(stage)
+        stages.append(stage)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(stages, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
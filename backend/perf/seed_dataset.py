@@ -0,0 +1,370 @@
+"""
+Synthetic dataset generator for a local Mongo
+
+Fills a *_perf database with users, channels, requests in every status,
+campaigns of every type and lifecycle state, transactions, folder promo
+registrations and onboarding records. The same --seed always produces the
+same data (pass --now as well to pin the timestamps).
+
+    cd backend
+    python -m perf.seed_dataset --mongo-uri mongodb://localhost:27017/cpgram_perf --scale 10000
+
+--scale sets the channel count and derives the rest from it; any explicit
+count overrides the derived one.
+"""
+import argparse
+import datetime
+import itertools
+import math
+import random
+import uuid
+
+from perf.workload import NICHES, DURATIONS, COLLECTIONS, make_user, make_channel
+
+# Other collections per channel at --scale
+SCALE_RATIOS = {
+    'users': 1.5,
+    'requests': 10,
+    'campaigns': 6,
+    'transactions': 3,
+    'folder_registrations': 0.2,
+    'onboarding': 2
+}
+
+CHUNK_SIZE = 5000
+
+CHANNEL_STATUSES = [('approved', 80), ('pending', 13), ('rejected', 7)]
+REQUEST_STATUSES = [('Pending', 35), ('Accepted', 50), ('Rejected', 15)]
+TRANSACTION_STATUSES = [('SUCCESS', 80), ('PENDING', 12), ('FAILED', 8)]
+REGISTRATION_STATUSES = [('approved', 70), ('pending', 20), ('rejected', 10)]
+
+# (type, [(lifecycle state, weight), ...])
+CAMPAIGN_TYPES = [
+    ('cross_promo_auto', 45, [('pending_posting', 15), ('active', 10), ('completed', 60), ('failed', 15)]),
+    ('manual', 30, [('pending_posting', 20), ('active', 20), ('ended', 45), ('expired', 15)]),
+    ('regular', 10, [('scheduled', 15), ('running', 10), ('completed', 65), ('failed', 10)]),
+    ('invite_task', 10, [('scheduled', 15), ('active', 20), ('ended', 25), ('completed', 35), ('failed', 5)]),
+    ('folder_promo', 5, [('active', 20), ('completed', 80)]),
+]
+
+
+def _pick(rng, weighted):
+    return rng.choices([value for value, _ in weighted], weights=[weight for _, weight in weighted])[0]
+
+
+def _created_at(rng, now, days=180):
+    # Squaring skews towards recent dates, like a growing user base
+    return now - datetime.timedelta(days=days * rng.random() ** 2, seconds=rng.randint(0, 86399))
+
+
+def _uid(rng, length=12):
+    return uuid.UUID(int=rng.getrandbits(128)).hex[:length]
+
+
+def _insert(collection, docs):
+    """insert_many in chunks; returns how many were written"""
+    written = 0
+    chunk = []
+    for doc in docs:
+        chunk.append(doc)
+        if len(chunk) >= CHUNK_SIZE:
+            collection.insert_many(chunk, ordered=False)
+            written += len(chunk)
+            chunk = []
+    if chunk:
+        collection.insert_many(chunk, ordered=False)
+        written += len(chunk)
+    return written
+
+
+def _users(rng, count, now):
+    for i in range(count):
+        user = make_user(rng, str(1000000 + i), now)
+        user['created_at'] = _created_at(rng, now)
+        user['updated_at'] = user['created_at']
+        user['isAdmin'] = False
+        user['cpcBalance'] = int(rng.paretovariate(1.5) * 500)
+        yield user
+
+
+def _channels(rng, count, owner_ids, now):
+    # A few heavy users own many channels, most own one
+    owner_weights = list(itertools.accumulate(1.0 / (rank + 1) ** 0.8 for rank in range(len(owner_ids))))
+    for i in range(count):
+        channel = make_channel(rng, i, rng.choices(owner_ids, cum_weights=owner_weights)[0], now)
+        channel['status'] = _pick(rng, CHANNEL_STATUSES)
+        channel['is_paused'] = channel['status'] == 'approved' and rng.random() < 0.1
+        channel['created_at'] = _created_at(rng, now)
+        yield channel
+
+
+def _channel_weights(channels):
+    """Cumulative weights for rng.choices: bigger channels get more requests"""
+    return list(itertools.accumulate(math.sqrt(max(ch['subscribers'], 1)) for ch in channels))
+
+
+def _request_slot(rng, channel):
+    day = rng.choice(channel['selected_days'])
+    return day, rng.choice(channel['time_slots'])
+
+
+def _requests(rng, count, channels, now):
+    approved = [ch for ch in channels if ch['status'] == 'approved']
+    approved_weights = _channel_weights(approved)
+    for _ in range(count):
+        from_ch = to_ch = rng.choice(approved)
+        while to_ch is from_ch and len(approved) > 1:
+            to_ch = rng.choices(approved, cum_weights=approved_weights)[0]
+        duration = rng.choice(DURATIONS)
+        day, time_slot = _request_slot(rng, to_ch)
+        created_at = _created_at(rng, now)
+        status = _pick(rng, REQUEST_STATUSES)
+        # Anything old enough has been answered
+        if created_at < now - datetime.timedelta(days=7) and status == 'Pending':
+            status = rng.choice(['Accepted', 'Rejected'])
+        yield {
+            'id': _uid(rng, 24),
+            'fromChannel': from_ch['name'],
+            'fromChannelId': from_ch['id'],
+            'toChannel': to_ch['name'],
+            'toChannelId': to_ch['id'],
+            'daySelected': day,
+            'timeSelected': time_slot,
+            'duration': duration,
+            'cpcCost': to_ch['price_settings'][str(duration)]['price'],
+            'promo': rng.choice(from_ch['promo_materials']),
+            'status': status,
+            'created_at': created_at
+        }
+
+
+def _times(rng, state, now):
+    """(start_at, end_at, duration) consistent with a lifecycle state"""
+    duration = rng.choice(DURATIONS)
+    if state in ('pending_posting', 'scheduled'):
+        start_at = now + datetime.timedelta(hours=rng.randint(1, 24 * 7))
+    elif state in ('active', 'running'):
+        start_at = now - datetime.timedelta(minutes=rng.randint(1, duration * 60 - 1))
+    else:
+        start_at = _created_at(rng, now) - datetime.timedelta(hours=duration)
+    start_at = start_at.replace(minute=0, second=0, microsecond=0)
+    return start_at, start_at + datetime.timedelta(hours=duration), duration
+
+
+def _campaign(rng, campaign_type, state, channels, weights, now):
+    from_ch = rng.choice(channels)
+    to_ch = rng.choices(channels, cum_weights=weights)[0]
+    start_at, end_at, duration = _times(rng, state, now)
+    base = {'created_at': min(start_at, now) - datetime.timedelta(hours=rng.randint(1, 72)), 'updated_at': now,
+            'from_channel_name': from_ch['name'], 'to_channel_name': to_ch['name']}
+
+    if campaign_type == 'cross_promo_auto':
+        doc = dict(base, id=f"cp_auto_{_uid(rng)}", type='cross_promo_auto', status=state,
+                   fromChannelId=from_ch['id'], toChannelId=to_ch['id'],
+                   requester_promo=rng.choice(from_ch['promo_materials']),
+                   acceptor_promo=rng.choice(to_ch['promo_materials']),
+                   start_at=start_at, end_at=end_at, duration_hours=duration,
+                   cpc_cost=to_ch['price_settings'][str(duration)]['price'])
+        if state in ('active', 'completed'):
+            doc.update(requester_message_id=rng.randint(1, 10 ** 6), acceptor_message_id=rng.randint(1, 10 ** 6),
+                       from_chat_id=from_ch['telegram_id'], to_chat_id=to_ch['telegram_id'], actual_start_at=start_at)
+        if state == 'failed':
+            doc['error'] = 'Forbidden: bot is not a member of the channel chat'
+        return doc
+
+    if campaign_type == 'manual':
+        deadline = base['created_at'] + datetime.timedelta(hours=48)
+        doc = dict(base, id=f"camp_{_uid(rng)}", request_id_str=_uid(rng, 24),
+                   fromChannelId=from_ch['id'], toChannelId=to_ch['id'], duration_hours=duration,
+                   cpc_cost=to_ch['price_settings'][str(duration)]['price'], posting_deadline=deadline,
+                   requester_promo=rng.choice(from_ch['promo_materials']),
+                   acceptor_promo=rng.choice(to_ch['promo_materials']))
+        for side in ('requester', 'acceptor'):
+            # The two sides of a manual campaign move independently
+            side_state = state if rng.random() < 0.7 else rng.choice(['pending_posting', 'active', 'ended'])
+            posted_at = start_at if side_state in ('active', 'ended') else None
+            doc.update({
+                f'{side}_status': side_state,
+                f'{side}_post_link': f"https://t.me/{from_ch['username']}/{rng.randint(1, 5000)}" if posted_at else None,
+                f'{side}_posted_at': posted_at,
+                f'{side}_ended_at': end_at if side_state == 'ended' else None,
+                f'{side}_reward_given': side_state == 'ended',
+                f'{side}_deadline_notified': side_state == 'expired',
+                f'{side}_expires_at': posted_at + datetime.timedelta(hours=duration) if posted_at else None,
+                f'{side}_notified_expiry': side_state == 'ended'
+            })
+        return doc
+
+    if campaign_type == 'regular':
+        doc = dict(base, id=f"camp_{_uid(rng)}", type='regular', status=state, chat_id=from_ch['telegram_id'],
+                   promo=rng.choice(to_ch['promo_materials']), start_at=start_at, end_at=end_at,
+                   duration_hours=duration)
+        if state in ('running', 'completed'):
+            doc.update(message_id=rng.randint(1, 10 ** 6), posted_at=start_at)
+        return doc
+
+    if campaign_type == 'invite_task':
+        end_at = start_at + datetime.timedelta(hours=12)
+        posted = state in ('active', 'ended', 'completed')
+        return dict(base, id=f"invite_{_uid(rng)}", type='invite_task', status=state, user_id=from_ch['owner_id'],
+                    channel_id=from_ch['id'], channel_name=from_ch['name'], telegram_chat_id=from_ch['telegram_id'],
+                    duration_hours=12, start_at=start_at, end_at=end_at, reward=5000,
+                    promo={'name': 'CP Gram Promo', 'text': 'Grow your Telegram channel with CP Gram!',
+                           'link': 'https://t.me/perf_bot', 'image': 'https://ibb.co/Y7V6fX6c', 'cta': 'Join CP Gram'},
+                    post_link=f"https://t.me/{from_ch['username']}/{rng.randint(1, 5000)}" if posted else None,
+                    posted_at=start_at if posted else None,
+                    expires_at=end_at if posted else None,
+                    expiry_notified=state in ('ended', 'completed'),
+                    ended_at=end_at if state in ('ended', 'completed') else None,
+                    reward_given=state == 'completed')
+
+    # folder_promo
+    start_at = start_at.replace(hour=rng.choice([6, 12, 16, 22]))
+    return dict(base, id=f"fp_camp_{from_ch['owner_id']}_{from_ch['topic']}_{int(start_at.timestamp())}_{_uid(rng, 4)}",
+                type='folder_promo', status=state, user_id=from_ch['owner_id'], channel_id=from_ch['id'],
+                chat_id=from_ch['telegram_id'], message_id=rng.randint(1, 10 ** 6),
+                start_at=start_at, end_at=start_at + datetime.timedelta(hours=12))
+
+
+def _campaigns(rng, count, channels, now):
+    approved = [ch for ch in channels if ch['status'] == 'approved']
+    approved_weights = _channel_weights(approved)
+    type_weights = [weight for _, weight, _ in CAMPAIGN_TYPES]
+    for _ in range(count):
+        campaign_type, _, states = rng.choices(CAMPAIGN_TYPES, weights=type_weights)[0]
+        yield _campaign(rng, campaign_type, _pick(rng, states), approved, approved_weights, now)
+
+
+def _transactions(rng, count, user_ids, now):
+    for _ in range(count):
+        cpc_amount = rng.choice([500, 1000, 2500, 5000, 10000, 25000])
+        created_at = _created_at(rng, now)
+        yield {
+            'transaction_id': f"txn_{_uid(rng, 16)}",
+            'user_id': rng.choice(user_ids),
+            'cpc_amount': cpc_amount,
+            'stars_cost': cpc_amount * 0.2,
+            'status': _pick(rng, TRANSACTION_STATUSES),
+            'created_at': created_at,
+            'updated_at': created_at
+        }
+
+
+def _registrations(rng, count, channels, now):
+    for ch in rng.sample(channels, min(count, len(channels))):
+        created_at = _created_at(rng, now, days=60)
+        yield {
+            'id': f"fpr_{_uid(rng)}",
+            'user_telegram_id': ch['owner_id'],
+            'channel_id': ch['id'],
+            'channel_name': ch['name'],
+            'niche': ch['topic'] if ch['topic'] in NICHES else rng.choice(NICHES),
+            'status': _pick(rng, REGISTRATION_STATUSES),
+            'admin_reason': None,
+            'paid_amount': 10000,
+            'created_at': created_at,
+            'updated_at': created_at
+        }
+
+
+def _onboarding(rng, count, user_ids, now):
+    from models import FOLLOW_UP_MESSAGES
+    for telegram_id in rng.sample(user_ids, min(count, len(user_ids))):
+        index = rng.randint(0, len(FOLLOW_UP_MESSAGES))
+        active = index < len(FOLLOW_UP_MESSAGES) and rng.random() < 0.8
+        last_start_at = _created_at(rng, now, days=30)
+        yield {
+            'telegram_id': telegram_id,
+            'last_start_at': last_start_at,
+            'current_message_index': index,
+            'next_message_at': now + datetime.timedelta(minutes=rng.randint(-120, 7 * 24 * 60)) if active else None,
+            'sequence_active': active,
+            'messages_sent': list(range(1, index + 1)),
+            'processing': False,
+            'updated_at': last_start_at
+        }
+
+
+def scaled_counts(scale):
+    counts = {name: int(scale * ratio) for name, ratio in SCALE_RATIOS.items()}
+    counts['channels'] = scale
+    return counts
+
+
+def generate(db, counts, seed=42, now=None):
+    """
+    Write a dataset with the given counts into db
+    Returns {collection: documents written} plus a few handy ids
+    """
+    rng = random.Random(seed)
+    now = now or datetime.datetime.utcnow().replace(microsecond=0)
+
+    user_docs = list(_users(rng, max(counts['users'], 1), now))
+    user_ids = [user['telegram_id'] for user in user_docs]
+    written = {'users': _insert(db.users, user_docs)}
+
+    channel_docs = list(_channels(rng, counts['channels'], user_ids, now))
+    written['channels'] = _insert(db.channels, channel_docs)
+    del user_docs
+
+    written['requests'] = _insert(db.requests, _requests(rng, counts['requests'], channel_docs, now))
+    written['campaigns'] = _insert(db.campaigns, _campaigns(rng, counts['campaigns'], channel_docs, now))
+    written['transactions'] = _insert(db.transactions, _transactions(rng, counts['transactions'], user_ids, now))
+    written['folder_promo_registrations'] = _insert(
+        db.folder_promo_registrations, _registrations(rng, counts['folder_registrations'], channel_docs, now)
+    )
+    written['user_onboarding'] = _insert(db.user_onboarding, _onboarding(rng, counts['onboarding'], user_ids, now))
+    db.folder_promo_configs.insert_many([
+        {'niche': niche, 'text': f"The best {niche} channels in one folder",
+         'folder_link': f"https://t.me/addlist/{niche.lower()}",
+         'image_url': f"https://images.example.com/folder_{niche.lower()}.jpg"}
+        for niche in NICHES
+    ])
+
+    # The owner with the most channels makes a good "heavy user" for benchmarks
+    owned = {}
+    for ch in channel_docs:
+        owned[ch['owner_id']] = owned.get(ch['owner_id'], 0) + 1
+    written['heavy_user_id'] = max(owned, key=owned.get) if owned else None
+    written['light_user_id'] = min(owned, key=owned.get) if owned else None
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fill a local Mongo with a synthetic CP Gram dataset')
+    parser.add_argument('--mongo-uri', default='mongodb://localhost:27017/cpgram_perf')
+    parser.add_argument('--scale', type=int, default=1000, help='Channel count; other counts are derived from it')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--now', help='Anchor timestamps here (UTC ISO) instead of the current time')
+    parser.add_argument('--keep', action='store_true', help='Add to the existing data instead of wiping it first')
+    for name in ['users', 'channels', 'requests', 'campaigns', 'transactions', 'folder-registrations', 'onboarding']:
+        parser.add_argument(f'--{name}', type=int)
+    args = parser.parse_args()
+
+    db_name = args.mongo_uri.rsplit('/', 1)[-1].split('?', 1)[0]
+    if not db_name.endswith('_perf'):
+        parser.error(f"refusing to write to database {db_name!r}: its name must end in _perf")
+
+    import os
+    os.environ['MONGO_URI'] = args.mongo_uri
+    import models
+
+    counts = scaled_counts(args.scale)
+    for name in counts:
+        value = getattr(args, name)
+        if value is not None:
+            counts[name] = value
+
+    if not args.keep:
+        for name in COLLECTIONS:
+            models.db[name].delete_many({})
+    models.ensure_indexes()
+
+    now = datetime.datetime.fromisoformat(args.now) if args.now else None
+    written = generate(models.db, counts, seed=args.seed, now=now)
+    for name, value in written.items():
+        print(f"{name:28} {value}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,257 @@
+"""
+Scheduler simulator: a day of scheduler jobs in a few minutes
+
+Runs the real job functions from scheduler.py against a virtual clock, a
+seeded Mongo database and the fake Telegram server, at the intervals the
+active start_scheduler uses, and reports posting/deletion lag plus Telegram
+calls and Mongo commands per job.
+
+    cd backend
+    python -m perf.simulate --mongo-uri mongodb://localhost:27017/cpgram_perf --bookings 5000
+
+The database is wiped and re-seeded unless --no-seed is given, so its name
+must end in "_perf". Jobs run one at a time; time a job spends sleeping
+(rate limiter) moves the virtual clock forward, so its lag shows up in the
+jobs after it.
+"""
+import argparse
+import datetime
+import heapq
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+
+from pymongo import monitoring
+
+from perf.fake_telegram import FakeTelegram
+from perf.stats import CommandCounter, summarize, format_seconds
+
+# (job id, scheduler function, interval seconds) as registered in start_scheduler
+INTERVAL_JOBS = [
+    ('campaign_checker', 'check_and_post_campaigns', 20),
+    ('campaign_cleanup', 'cleanup_finished_campaigns', 30),
+    ('expiry_notifier', 'check_and_notify_expired_campaigns', 60),
+    ('deadline_expirer', 'expire_missed_posting_deadlines', 60),
+    ('slot_prewarmer', 'prewarm_upcoming_slots', 60),
+    ('followup_processor', 'process_followup_messages', 300),
+    ('subscriber_refresher', 'refresh_channel_subscribers_tick', None),  # SUBSCRIBER_REFRESH_TICK_SECONDS
+    ('analytics_rollup', 'roll_up_subscriber_gains_job', 900),
+]
+
+# (job id, scheduler function, [(hour, minute), ...]) cron jobs
+CRON_JOBS = [
+    ('folder_promo_runner', 'run_weekly_folder_promos', [(6, 0), (12, 0), (16, 0), (22, 0)]),
+    ('subscriber_history_downsampler', 'downsample_subscriber_history_job', [(0, 30)]),
+    ('platform_analytics_rollup', 'roll_up_platform_analytics_job', [(hour, 10) for hour in range(24)]),
+]
+
+
+class Simulation:
+    def __init__(self, clock, fake, commands):
+        self.clock = clock
+        self.fake = fake
+        self.commands = commands
+        self._queue = []
+        self._seq = itertools.count()
+        self._pending_slots = set()
+        self.jobs = defaultdict(lambda: {'runs': 0, 'items': 0, 'errors': 0, 'wall': [], 'telegram': Counter()})
+        self.lag = defaultdict(list)
+
+    def at(self, run_at, name, func, args=(), interval=None):
+        heapq.heappush(self._queue, (run_at, next(self._seq), name, func, args, interval))
+
+    def schedule_slot(self, scheduler_module, slot):
+        """Stand-in for scheduler._schedule_slot_dispatch (one queued run per slot)"""
+        if slot in self._pending_slots:
+            return
+        self._pending_slots.add(slot)
+        window_start = slot - datetime.timedelta(seconds=scheduler_module.SLOT_JITTER_SECONDS)
+        self.at(max(window_start, self.clock.now()), 'slot_dispatcher', scheduler_module.dispatch_slot, (slot,))
+
+    def schedule_slot_send(self, scheduler_module, claim, send_at):
+        """Stand-in for scheduler._schedule_slot_send"""
+        self.at(max(send_at, self.clock.now()), 'slot_sender', scheduler_module.send_slot_group, (claim, send_at))
+
+    def record_lag(self, observe_lag):
+        def recorder(histogram, due_at, done_at, campaign_type):
+            if due_at and done_at:
+                self.lag[(histogram.name, campaign_type or 'regular')].append(max((done_at - due_at).total_seconds(), 0))
+            return observe_lag(histogram, due_at, done_at, campaign_type)
+        return recorder
+
+    def run(self, until):
+        while self._queue and self._queue[0][0] <= until:
+            run_at, _, name, func, args, interval = heapq.heappop(self._queue)
+            self.clock.advance_to(run_at)
+            if name == 'slot_dispatcher':
+                self._pending_slots.discard(args[0])
+
+            stats = self.jobs[name]
+            telegram_before = self.fake.snapshot()
+            self.commands.use(name)
+            started = time.perf_counter()
+            try:
+                result = func(*args)
+                if isinstance(result, int):
+                    stats['items'] += result
+            except Exception as e:
+                stats['errors'] += 1
+                logging.error(f"[SIMULATE] {name} raised: {e}")
+            finally:
+                self.commands.use(None)
+            stats['wall'].append(time.perf_counter() - started)
+            stats['runs'] += 1
+            stats['telegram'].update(self.fake.snapshot() - telegram_before)
+
+            if interval:
+                next_run = run_at + datetime.timedelta(seconds=interval)
+                # A run that overran skips the ticks it missed, like APScheduler's coalescing
+                while next_run <= self.clock.now():
+                    next_run += datetime.timedelta(seconds=interval)
+                self.at(next_run, name, func, args, interval)
+
+    def report(self):
+        jobs = {}
+        for name, stats in sorted(self.jobs.items()):
+            wall = summarize(stats['wall'])
+            jobs[name] = {
+                'runs': stats['runs'],
+                'items': stats['items'],
+                'errors': stats['errors'],
+                'wall_seconds_total': sum(stats['wall']),
+                'wall_seconds_p95': wall.get('p95'),
+                'telegram_calls': dict(stats['telegram']),
+                'mongo_commands': dict(self.commands.snapshot(name))
+            }
+        lag = {f"{metric}{{type={kind}}}": summarize(values) for (metric, kind), values in sorted(self.lag.items())}
+        return {'jobs': jobs, 'lag_seconds': lag}
+
+
+def print_report(report, out=sys.stdout):
+    out.write(f"\n{'job':32} {'runs':>6} {'items':>7} {'errors':>6} {'wall':>9} {'p95 run':>9} {'tg calls':>9} {'mongo ops':>10}\n")
+    for name, job in report['jobs'].items():
+        out.write(
+            f"{name:32} {job['runs']:>6} {job['items']:>7} {job['errors']:>6} "
+            f"{format_seconds(job['wall_seconds_total']):>9} {format_seconds(job['wall_seconds_p95']):>9} "
+            f"{sum(job['telegram_calls'].values()):>9} {sum(job['mongo_commands'].values()):>10}\n"
+        )
+    out.write(f"\n{'lag':56} {'count':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}\n")
+    for name, lag in report['lag_seconds'].items():
+        out.write(
+            f"{name:56} {lag['count']:>6} {format_seconds(lag.get('p50')):>9} {format_seconds(lag.get('p95')):>9} "
+            f"{format_seconds(lag.get('p99')):>9} {format_seconds(lag.get('max')):>9}\n"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate a day of scheduler jobs on a virtual clock')
+    parser.add_argument('--mongo-uri', default='mongodb://localhost:27017/cpgram_perf')
+    parser.add_argument('--start', default='2026-01-05T00:00', help='Virtual start of the simulated day (UTC)')
+    parser.add_argument('--hours', type=float, default=24)
+    parser.add_argument('--no-seed', action='store_true', help='Use the data already in the database')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--channels', type=int, default=1000)
+    parser.add_argument('--bookings', type=int, default=3000)
+    parser.add_argument('--manual', type=int, default=500)
+    parser.add_argument('--onboarding', type=int, default=2000)
+    parser.add_argument('--folder-registrations', type=int, default=300)
+    parser.add_argument('--telegram-latency-ms', type=float, default=0)
+    parser.add_argument('--telegram-429-ratio', type=float, default=0.0)
+    parser.add_argument('--json', help='Also write the report to this file')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s %(levelname)s %(message)s')
+
+    db_name = args.mongo_uri.rsplit('/', 1)[-1].split('?', 1)[0]
+    if not args.no_seed and not db_name.endswith('_perf'):
+        parser.error(f"refusing to wipe database {db_name!r}: its name must end in _perf")
+
+    fake = FakeTelegram(latency_ms=args.telegram_latency_ms, rate_limit_ratio=args.telegram_429_ratio, seed=args.seed)
+    base_url = fake.start()
+
+    # The backend reads its settings at import time
+    os.environ['MONGO_URI'] = args.mongo_uri
+    os.environ['TELEGRAM_API_BASE'] = base_url
+    os.environ.setdefault('TELEGRAM_BOT_TOKEN', 'perf-token')
+    os.environ['SCHEDULER_CHANGE_STREAMS'] = '0'
+    os.environ['SCHEDULER_CATCHUP_ON_START'] = '0'
+    # scheduler imports app lazily (complete_invite_task); importing app must
+    # not start a second, real scheduler or point the bot's webhook anywhere
+    os.environ['NO_SCHEDULER'] = '1'
+    os.environ.setdefault('FOLDER_PROMO_STAGING_CHAT_ID', '-1009999999999')
+    os.environ.setdefault('MEDIA_STAGING_CHAT_ID', '-1009999999999')
+
+    commands = CommandCounter()
+    monitoring.register(commands)
+
+    import dispatcher
+    import models
+    import scheduler
+    # Run app's import-time index and backfill work now rather than inside the first job that needs it
+    import app  # noqa: F401
+    from config import SUBSCRIBER_REFRESH_TICK_SECONDS
+    from perf import clock as virtual_clock
+    from perf import workload
+
+    start = datetime.datetime.fromisoformat(args.start)
+    clock = virtual_clock.VirtualClock(start - datetime.timedelta(minutes=10))
+    virtual_clock.install(clock, scheduler, models, dispatcher)
+
+    if not args.no_seed:
+        commands.use('seed')
+        workload.reset(models.db)
+        seeded = workload.seed_day(
+            models.db, start, channel_count=args.channels, bookings=args.bookings, manual=args.manual,
+            onboarding=args.onboarding, folder_registrations=args.folder_registrations, seed=args.seed
+        )
+        commands.use(None)
+        print(f"Seeded {db_name}: {seeded}")
+    models.ensure_indexes()
+    fake.reset()
+
+    sim = Simulation(clock, fake, commands)
+    scheduler._schedule_slot_dispatch = lambda slot: sim.schedule_slot(scheduler, slot)
+    scheduler._schedule_slot_send = lambda claim, send_at: sim.schedule_slot_send(scheduler, claim, send_at)
+    scheduler.observe_lag = sim.record_lag(scheduler.observe_lag)
+
+    for name, func_name, interval in INTERVAL_JOBS:
+        sim.at(clock.now(), name, getattr(scheduler, func_name), interval=interval or SUBSCRIBER_REFRESH_TICK_SECONDS)
+    end = start + datetime.timedelta(hours=args.hours)
+    day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    while day < end:
+        for name, func_name, times in CRON_JOBS:
+            for hour, minute in times:
+                fire = day.replace(hour=hour, minute=minute)
+                if clock.now() <= fire <= end:
+                    sim.at(fire, name, getattr(scheduler, func_name))
+        day += datetime.timedelta(days=1)
+
+    started = time.perf_counter()
+    sim.run(end)
+    elapsed = time.perf_counter() - started
+
+    report = sim.report()
+    report['simulated_hours'] = args.hours
+    report['real_seconds'] = elapsed
+    report['telegram_rate_limited'] = dict(fake.rate_limited)
+    report['still_due'] = {
+        'posts': models.campaigns.count_documents(scheduler._due_posts_filter(end)),
+        'cleanups': models.campaigns.count_documents(scheduler._due_cleanups_filter(end))
+    }
+
+    print_report(report)
+    print(f"\nSimulated {args.hours:g}h in {elapsed:.1f}s; still due at the end: {report['still_due']}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+    fake.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Counters and summaries shared by the perf tools"""
+import math
+import threading
+from collections import Counter, defaultdict
+
+from pymongo import monitoring
+
+
+class CommandCounter(monitoring.CommandListener):
+    """
+    Counts Mongo commands per label (job, route, ...)
+    Register it before the backend's MongoClient is created:
+    monitoring.register(counter)
+    """
+
+    def __init__(self):
+        self.counts = defaultdict(Counter)
+        self.label = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def use(self, label):
+        """Label commands issued from now on (thread_label() wins for its thread)"""
+        self.label = label
+
+    def thread_label(self, label):
+        self._local.label = label
+
+    def started(self, event):
+        label = getattr(self._local, 'label', None) or self.label or '-'
+        with self._lock:
+            self.counts[label][event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def snapshot(self, label):
+        with self._lock:
+            return Counter(self.counts.get(label, {}))
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of values (None when empty)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(values):
+    """count / mean / p50 / p95 / p99 / max of a list of numbers"""
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'mean': sum(values) / len(values),
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'max': max(values)
+    }
+
+
+def format_seconds(value):
+    if value is None:
+        return '-'
+    if value < 1:
+        return f"{value * 1000:.1f}ms"
+    return f"{value:.2f}s"
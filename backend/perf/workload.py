@@ -0,0 +1,227 @@
+"""
+One day of scheduler work, written straight into Mongo
+
+Bookings cluster on the hour the way parse_day_time_to_utc slots do, with
+an evening peak; every job the scheduler runs gets something to do.
+"""
+import datetime
+import random
+import uuid
+
+NICHES = ['Crypto', 'Tech', 'Finance', 'Lifestyle', 'Education', 'Entertainment', 'News', 'Gaming']
+DURATIONS = [2, 4, 6, 12, 24]
+
+# Relative booking weight per UTC hour (quiet night, evening peak)
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 2, 3, 4, 5, 6, 6, 6, 7, 7, 7, 8, 9, 10, 12, 14, 14, 12, 8, 4]
+
+# Everything the simulator writes or the jobs touch
+COLLECTIONS = [
+    'users', 'channels', 'campaigns', 'requests', 'user_onboarding', 'folder_promo_configs',
+    'folder_promo_registrations', 'media_cache', 'scheduler_state', 'subscriber_history_hourly',
+    'subscriber_history_daily', 'user_tasks', 'transactions', 'channel_analytics_daily', 'platform_analytics'
+]
+
+
+def reset(db):
+    for name in COLLECTIONS:
+        db[name].delete_many({})
+
+
+def make_promo(rng, index, with_image=True):
+    return {
+        'id': f"promo_{index}",
+        'name': f"Promo {index}",
+        'text': f"Check out channel #{index} — fresh posts every day.",
+        'link': f"https://t.me/perf_channel_{index}",
+        'image': f"https://images.example.com/promo_{index % 200}.jpg" if with_image and rng.random() < 0.7 else '',
+        'cta': rng.choice(['Join', 'Subscribe', 'Learn More', 'Open'])
+    }
+
+
+def make_user(rng, telegram_id, now):
+    return {
+        'telegram_id': telegram_id,
+        'name': f"Perf User {telegram_id}",
+        'username': f"perf_user_{telegram_id}",
+        'cpcBalance': rng.randint(0, 50000),
+        'created_at': now,
+        'updated_at': now
+    }
+
+
+def make_channel(rng, index, owner_id, now):
+    username = f"perf_channel_{index}"
+    selected_days = sorted(rng.sample(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'],
+                                      rng.randint(2, 7)))
+    hours = sorted(rng.sample(range(24), rng.randint(1, 4)))
+    return {
+        'id': f"ch_perf_{index}",
+        'owner_id': owner_id,
+        'name': f"Perf Channel {index}",
+        'username': username,
+        # Half the channels only have a username, so pre-warming has to resolve them
+        'telegram_id': str(-1001000000000 - index) if index % 2 else username,
+        'avatar': None,
+        'subscribers': int(rng.lognormvariate(8, 1.5)),
+        'avgViews24h': 0,
+        'language': 'English',
+        'topic': rng.choice(NICHES),
+        'selected_days': selected_days,
+        'promos_per_day': rng.randint(1, 4),
+        'price_settings': {str(h): {'enabled': True, 'price': h * rng.randint(50, 300)} for h in DURATIONS},
+        'time_slots': [f"{h:02d}:00 - {(h + 1) % 24:02d}:00 UTC" for h in hours],
+        'promo_materials': [make_promo(rng, index * 10 + k) for k in range(rng.randint(1, 3))],
+        'status': 'approved',
+        'is_paused': False,
+        'xExchanges': rng.randint(0, 40),
+        'subscribers_refreshed_at': now - datetime.timedelta(minutes=rng.randint(0, 120)),
+        'created_at': now - datetime.timedelta(days=rng.randint(1, 365)),
+        'updated_at': now
+    }
+
+
+def _slot(rng, day_start):
+    hour = rng.choices(range(24), weights=HOUR_WEIGHTS)[0]
+    # Most bookings start exactly on the hour
+    minute = 0 if rng.random() < 0.85 else rng.randint(1, 59)
+    return day_start + datetime.timedelta(hours=hour, minutes=minute)
+
+
+def seed_day(db, day_start, channel_count=1000, bookings=3000, manual=500, onboarding=2000,
+             folder_registrations=300, seed=1):
+    """
+    Fill db with channels and one day's worth of scheduler work starting at
+    day_start (naive UTC). Returns a summary of what was written.
+    """
+    rng = random.Random(seed)
+    now = day_start
+
+    owners = [str(5000000 + i) for i in range(max(1, channel_count * 2 // 3))]
+    db.users.insert_many([make_user(rng, tid, now) for tid in owners])
+    chans = [make_channel(rng, i, rng.choice(owners), now) for i in range(channel_count)]
+    db.channels.insert_many(chans)
+
+    docs = []
+    for i in range(bookings):
+        start_at = _slot(rng, day_start)
+        duration = rng.choice(DURATIONS)
+        end_at = start_at + datetime.timedelta(hours=duration)
+        kind = rng.random()
+        if kind < 0.7:
+            from_ch, to_ch = rng.sample(chans, 2)
+            docs.append({
+                'id': f"cp_auto_{uuid.UUID(int=rng.getrandbits(128)).hex[:12]}",
+                'type': 'cross_promo_auto',
+                'status': 'pending_posting',
+                'fromChannelId': from_ch['id'],
+                'toChannelId': to_ch['id'],
+                'requester_promo': rng.choice(from_ch['promo_materials']),
+                'acceptor_promo': rng.choice(to_ch['promo_materials']),
+                'start_at': start_at,
+                'end_at': end_at,
+                'duration_hours': duration,
+                'cpc_cost': rng.randint(100, 5000),
+                'created_at': now,
+                'updated_at': now
+            })
+        elif kind < 0.85:
+            ch = rng.choice(chans)
+            docs.append({
+                'id': f"camp_{uuid.UUID(int=rng.getrandbits(128)).hex[:12]}",
+                'type': 'regular',
+                'status': 'scheduled',
+                'chat_id': ch['telegram_id'],
+                'promo': rng.choice(ch['promo_materials']),
+                'start_at': start_at,
+                'end_at': end_at,
+                'duration_hours': duration,
+                'created_at': now
+            })
+        else:
+            ch = rng.choice(chans)
+            docs.append({
+                'id': f"invite_{uuid.UUID(int=rng.getrandbits(128)).hex[:12]}",
+                'type': 'invite_task',
+                'user_id': ch['owner_id'],
+                'channel_id': ch['id'],
+                'channel_name': ch['name'],
+                'telegram_chat_id': ch['telegram_id'],
+                'status': 'scheduled',
+                'duration_hours': 12,
+                'start_at': start_at,
+                'end_at': start_at + datetime.timedelta(hours=12),
+                'reward': 5000,
+                'promo': {'name': 'CP Gram Promo', 'text': 'Grow your Telegram channel with CP Gram!',
+                          'link': 'https://t.me/perf_bot', 'image': 'https://ibb.co/Y7V6fX6c', 'cta': 'Join CP Gram'},
+                'expires_at': None,
+                'expiry_notified': False,
+                'reward_given': False,
+                'created_at': now
+            })
+
+    # Manual campaigns: some sides go live during the day (expiry sweep), the rest miss their deadline
+    for i in range(manual):
+        from_ch, to_ch = rng.sample(chans, 2)
+        deadline = day_start + datetime.timedelta(minutes=rng.randint(0, 24 * 60 - 1))
+        doc = {
+            'id': f"camp_{uuid.UUID(int=rng.getrandbits(128)).hex[:12]}",
+            'fromChannelId': from_ch['id'],
+            'toChannelId': to_ch['id'],
+            'duration_hours': rng.choice(DURATIONS),
+            'cpc_cost': rng.randint(100, 5000),
+            'posting_deadline': deadline,
+            'requester_promo': rng.choice(from_ch['promo_materials']),
+            'acceptor_promo': rng.choice(to_ch['promo_materials']),
+            'created_at': deadline - datetime.timedelta(hours=48),
+            'updated_at': now
+        }
+        for side in ('requester', 'acceptor'):
+            if rng.random() < 0.5:
+                posted_at = deadline - datetime.timedelta(hours=rng.randint(1, 40))
+                doc.update({
+                    f'{side}_status': 'active',
+                    f'{side}_posted_at': posted_at,
+                    f'{side}_expires_at': posted_at + datetime.timedelta(hours=doc['duration_hours'] + rng.randint(0, 30)),
+                    f'{side}_notified_expiry': False
+                })
+            else:
+                doc.update({f'{side}_status': 'pending_posting', f'{side}_expires_at': None,
+                            f'{side}_notified_expiry': False})
+            doc[f'{side}_deadline_notified'] = False
+        docs.append(doc)
+
+    if docs:
+        db.campaigns.insert_many(docs)
+
+    db.folder_promo_configs.insert_many([
+        {'niche': niche, 'text': f"The best {niche} channels in one folder", 'folder_link': f"https://t.me/addlist/{niche.lower()}",
+         'image_url': f"https://images.example.com/folder_{niche.lower()}.jpg"}
+        for niche in NICHES
+    ])
+    registrations = []
+    for ch in rng.sample(chans, min(folder_registrations, len(chans))):
+        registrations.append({'niche': ch['topic'], 'channel_id': ch['id'], 'user_telegram_id': ch['owner_id'],
+                              'status': 'approved', 'created_at': now})
+    if registrations:
+        db.folder_promo_registrations.insert_many(registrations)
+
+    followups = []
+    for i in range(onboarding):
+        followups.append({
+            'telegram_id': str(7000000 + i),
+            'sequence_active': True,
+            'current_message_index': rng.randint(0, 2),
+            'next_message_at': day_start + datetime.timedelta(minutes=rng.randint(0, 24 * 60 - 1)),
+            'processing': False,
+            'last_start_at': day_start - datetime.timedelta(hours=rng.randint(1, 48))
+        })
+    if followups:
+        db.user_onboarding.insert_many(followups)
+
+    return {
+        'channels': len(chans),
+        'bookings': bookings,
+        'manual_campaigns': manual,
+        'folder_registrations': len(registrations),
+        'onboarding': len(followups)
+    }
@@ -1,9 +1,30 @@
 from apscheduler.schedulers.background import BackgroundScheduler
-from datetime import datetime, timedelta
-from models import campaigns, channels, users, requests_col, folder_promo_configs, folder_promo_registrations
-from bot import  send_message, send_photo, delete_message, send_broadcast_message, send_invite_campaign_post, send_campaign_post, send_open_button_message, send_folder_promo_post
-from config import APP_URL, BOT_URL, TELEGRAM_BOT_TOKEN
+from datetime import datetime, timedelta, timezone
+from models import campaigns, channels, users, requests_col, folder_promo_configs, folder_promo_registrations, media_cache, client, db
+from models import get_channels_by_ids, increment_channel_exchanges, WriteBatch, roll_up_completed_campaign, roll_up_subscriber_gains, roll_up_platform_analytics
+from models import acquire_lease, lease_active, release_lease, scheduler_state
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from bot import  send_message, send_photo, delete_message, send_broadcast_message, send_invite_campaign_post, send_campaign_post, send_open_button_message, send_folder_promo_post, copy_message, folder_promo_keyboard
+from bot import build_campaign_post, build_invite_campaign_post, send_prepared_post, get_chat
+from dispatcher import dispatch, telegram_limiter
+from config import MONGO_USE_TRANSACTIONS, MONGO_WRITE_BATCH_SIZE
+from config import APP_URL, BOT_URL, TELEGRAM_BOT_TOKEN, SCHEDULER_CHANGE_STREAMS, SCHEDULER_SAFETY_POLL_SECONDS, SCHEDULER_LEADER_LEASE_SECONDS, FOLDER_PROMO_LATE_JOIN_MINUTES, FOLDER_PROMO_STAGING_CHAT_ID
+from config import SCHEDULER_CATCHUP_ON_START, SCHEDULER_CATCHUP_RATE, SCHEDULER_CATCHUP_STALE_POST_MINUTES, SCHEDULER_CATCHUP_STALE_POLICY
+from config import FOLLOWUP_BATCH_SIZE, SUBSCRIBER_REFRESH_INTERVAL_MINUTES, SUBSCRIBER_REFRESH_TICK_SECONDS, SUBSCRIBER_REFRESH_WORKERS
+from config import SLOT_PREWARM_MINUTES, SLOT_JITTER_SECONDS, MEDIA_STAGING_CHAT_ID, TELEGRAM_DISPATCH_WORKERS
+from loader import scoped
+import events
+from metrics import Gauge, timed_job, job_errors, posting_lag, deletion_lag, observe_lag
+from concurrent.futures import ThreadPoolExecutor
+import functools
 import logging
+import math
+import os
+import socket
+import time
+import uuid
+import zlib
 import threading
 
 s = BackgroundScheduler()
@@ -39,523 +60,698 @@ def start_scheduler():
     logging.info("[SCHEDULER] Scheduler started with expiry notifications")
 
 
+def _due_posts_filter(until):
+    """Campaigns waiting to be posted whose start_at is at or before `until`"""
+    return {'$or': [
+        {'status': 'scheduled', 'start_at': {'$lte': until}},
+        {'status': 'pending_posting', 'type': 'cross_promo_auto', 'start_at': {'$lte': until}}
+    ]}
+
+
+def _due_cleanups_filter(until):
+    """Posted campaigns whose end_at is at or before `until`"""
+    return {'$or': [
+        {'status': 'running', 'end_at': {'$lte': until}},
+        {'status': 'active', 'type': 'cross_promo_auto', 'end_at': {'$lte': until}},
+        {'status': 'active', 'type': 'folder_promo', 'end_at': {'$lte': until}}
+    ]}
+
+
+def _auto_channel_map(camps):
+    """Channels of every cross_promo_auto campaign in camps, fetched in one query"""
+    return get_channels_by_ids(
+        cid for camp in camps if camp.get('type') == 'cross_promo_auto'
+        for cid in (camp.get('fromChannelId'), camp.get('toChannelId'))
+    )
+
+
+def _collect_backlog():
+    """Overdue work per queue, computed when /metrics is scraped"""
+    now = datetime.utcnow()
+    from models import user_onboarding
+    return {
+        ('posts',): campaigns.count_documents(_due_posts_filter(now)),
+        ('cleanups',): campaigns.count_documents(_due_cleanups_filter(now)),
+        ('followups',): user_onboarding.count_documents({'sequence_active': True, 'next_message_at': {'$lte': now}})
+    }
+
+
+backlog = Gauge('scheduler_backlog', 'Overdue scheduler work items', ['queue'], collect=_collect_backlog)
+
+
+def _serialized(func):
+    """Never run two ticks of the same job at once (interval and due-time runs share it)"""
+    lock = threading.Lock()
+    
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with lock:
+            return func(*args, **kwargs)
+    return wrapper
+
+
+@_serialized
+@timed_job('campaign_checker')
+@scoped('campaign_checker')
 def check_and_post_campaigns():
     """Check and post scheduled campaigns"""
+    if catch_up_running():
+        return 0
     now = datetime.utcnow()
     logging.info(f"[SCHEDULER] Checking campaigns at {now}")
     
     # Find campaigns due in next 2 minutes (to catch any close to posting)
     check_window = now + timedelta(minutes=2)
-    to_post = list(campaigns.find({
-        '$or': [
-            {'status': 'scheduled', 'start_at': {'$lte': check_window}},
-            {'status': 'pending_posting', 'type': 'cross_promo_auto', 'start_at': {'$lte': check_window}}
-        ]
-    }))
+    to_post = list(campaigns.find(_due_posts_filter(check_window)))
     
     logging.info(f"[SCHEDULER] Found {len(to_post)} campaigns to post")
     
+    # Load every channel this tick needs in one query instead of per campaign
+    channel_map = _auto_channel_map(to_post)
+    
+    processed = 0
+    # Pre-warmed campaigns belong to their slot dispatcher until a minute past their send_at
+    dispatch_cutoff = now - timedelta(seconds=60)
+    
     for camp in to_post:
         # Skip if not actually due yet (give 30 second buffer)
         start_at = camp.get('start_at')
         if start_at and start_at > now + timedelta(seconds=30):
             continue
+        if camp.get('send_at') and camp['send_at'] > dispatch_cutoff:
+            continue
             
+        processed += 1
+        _post_guarded(camp, channel_map)
+    
+    _fail_stale_posting_claims(now)
+    return processed
+
+
+# A campaign left in 'posting' or 'ending' this long lost its worker mid-way
+CLAIM_TIMEOUT_MINUTES = 10
+
+
+class _Writes(list):
+    """Collects (collection, op) pairs from helpers that take a `batch` to queue on"""
+    
+    def add(self, collection, op):
+        self.append((collection, op))
+
+
+def _claim_time():
+    """utcnow at Mongo's millisecond precision, so a stored claim stamp can be matched again"""
+    now = datetime.utcnow()
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
+def _claim_filter(camp):
+    """
+    Match camp only while it is still under the claim it was read or claimed
+    with; a cleanup reclaimed by another worker carries a newer stamp
+    """
+    query = {'_id': camp['_id'], 'status': camp.get('status')}
+    if camp.get('status') == 'ending':
+        query['cleanup_claimed_at'] = camp.get('cleanup_claimed_at')
+    return query
+
+
+def _claim_campaign(camp, status, match=None, **fields):
+    """
+    Move camp from the status it was read with to `status` with one
+    conditional update, before any Telegram call is made for it.
+    Returns the campaign as claimed, or None when another worker (or job)
+    got there first.
+    """
+    now = datetime.utcnow()
+    claimed = campaigns.find_one_and_update(
+        {'_id': camp['_id'], 'status': camp.get('status'), **(match or {})},
+        {'$set': {'status': status, 'updated_at': now, **fields}},
+        projection={'_id': 1}
+    )
+    if claimed is None:
+        return None
+    return {**camp, 'status': status, 'updated_at': now, **fields}
+
+
+def _set_campaign_fields(camp, fields):
+    """
+    $set fields on a claimed campaign (stamping updated_at), only while it is
+    still under its claim. Returns whether it was written
+    """
+    result = campaigns.update_one(_claim_filter(camp), {'$set': {'updated_at': datetime.utcnow(), **fields}})
+    return result.modified_count > 0
+
+
+def _settle_campaigns(settlements):
+    """
+    Give claimed campaigns their final fields together with the writes that
+    go with them (balance credits, counters, rollups), MONGO_WRITE_BATCH_SIZE
+    campaigns per round: one bulk_write of conditional status updates, one
+    read-back of which of them matched, and one bulk_write per collection for
+    the writes of those only. A campaign whose claim was taken over meanwhile
+    does not match and is settled by its new claimant, so nothing is credited
+    twice. With MONGO_USE_TRANSACTIONS a round lands together or not at all;
+    without, a failure after the status writes loses that round's credits
+    rather than repeating them.
+    
+    settlements are (camp, fields, writes, on_settled) tuples; on_settled()
+    (notifications, events) runs once the campaign's round is committed.
+    Returns how many campaigns were settled
+    """
+    settled_total = 0
+    for start in range(0, len(settlements), MONGO_WRITE_BATCH_SIZE):
+        chunk = settlements[start:start + MONGO_WRITE_BATCH_SIZE]
+        settlement_id = uuid.uuid4().hex
+        
+        def write(session, chunk=chunk, settlement_id=settlement_id):
+            now = datetime.utcnow()
+            campaigns.bulk_write([
+                UpdateOne(_claim_filter(camp), {'$set': {'updated_at': now, 'settlement_id': settlement_id, **fields}})
+                for camp, fields, _, _ in chunk
+            ], ordered=False, session=session)
+            settled = {doc['_id'] for doc in campaigns.find(
+                {'_id': {'$in': [camp['_id'] for camp, _, _, _ in chunk]}, 'settlement_id': settlement_id},
+                {'_id': 1}, session=session
+            )}
+            by_collection = {}
+            for camp, _, writes, _ in chunk:
+                if camp['_id'] in settled:
+                    for collection, op in writes:
+                        by_collection.setdefault(collection.name, (collection, []))[1].append(op)
+            for collection, ops in by_collection.values():
+                collection.bulk_write(ops, ordered=False, session=session)
+            return settled
+        
         try:
-            campaign_id = camp.get('id', str(camp.get('_id')))
-            logging.info(f"[SCHEDULER] Processing campaign {campaign_id}")
-            
-            campaign_type = camp.get('type', 'regular')
-            
-            res = None
-            
-            # Handle different campaign types
-            if campaign_type == 'cross_promo_auto':
-                # Bilateral cross-promotion
-                from_id = camp.get('fromChannelId')
-                to_id = camp.get('toChannelId')
-                from_ch = channels.find_one({'id': from_id})
-                to_ch = channels.find_one({'id': to_id})
-                
-                if not from_ch or not to_ch:
-                    logging.error(f"[SCHEDULER] Channels missing for auto campaign {campaign_id}")
-                    campaigns.update_one({'_id': camp['_id']}, {'$set': {'status': 'failed', 'error': 'Missing channels'}})
-                    continue
-                
-                from_chat_id = from_ch.get('telegram_id') or from_ch.get('telegram_chat')
-                if isinstance(from_chat_id, str) and not str(from_chat_id).startswith('-') and not str(from_chat_id).startswith('@'):
-                    from_chat_id = f"@{from_chat_id}"
-                    
-                to_chat_id = to_ch.get('telegram_id') or to_ch.get('telegram_chat')
-                if isinstance(to_chat_id, str) and not str(to_chat_id).startswith('-') and not str(to_chat_id).startswith('@'):
-                    to_chat_id = f"@{to_chat_id}"
-                
-                requester_promo = camp.get('requester_promo', {})
-                acceptor_promo = camp.get('acceptor_promo', {})
-                
-                logging.info(f"[SCHEDULER] Sending bilateral auto-campaign to {from_chat_id} & {to_chat_id}")
-                
-                res_from = send_campaign_post(from_chat_id, acceptor_promo)
-                res_to = send_campaign_post(to_chat_id, requester_promo)
-                
-                from_ok = res_from and res_from.get('ok')
-                to_ok = res_to and res_to.get('ok')
-                
-                if from_ok and to_ok:
-                    req_msg_id = res_from['result'].get('message_id')
-                    acc_msg_id = res_to['result'].get('message_id')
-                    
-                    end_time_calc = camp.get('end_at')
-                    if not end_time_calc:
-                        dur_h = camp.get('duration_hours', 2)
-                        end_time_calc = datetime.utcnow() + timedelta(hours=dur_h)
-                        
-                    campaigns.update_one(
-                        {'_id': camp['_id']}, 
-                        {
-                            '$set': {
-                                'status': 'active',
-                                'requester_message_id': req_msg_id,
-                                'acceptor_message_id': acc_msg_id,
-                                'from_chat_id': from_chat_id,
-                                'to_chat_id': to_chat_id,
-                                'actual_start_at': datetime.utcnow(),
-                                'end_at': end_time_calc
-                            }
-                        }
-                    )
-                else:
-                    err_msg = f"Req Failure: {res_from} | Acc Failure: {res_to}"
-                    logging.error(f"[SCHEDULER] Failed bilateral campaign {campaign_id}: {err_msg}")
-                    campaigns.update_one({'_id': camp['_id']}, {'$set': {'status': 'failed', 'error': err_msg}})
-                
-                # Already handled natively, jump to next campaign loop iteration
-                continue
-                
-            elif campaign_type == 'invite_task':
-                # This is an invite task campaign
-                chat_id = camp.get('chat_id') or camp.get('telegram_chat_id')
-                
-                if not chat_id:
-                    error_msg = 'No chat_id provided'
-                    logging.error(f"[SCHEDULER] {error_msg} for campaign {campaign_id}")
-                    logging.error(f"[SCHEDULER] Campaign data: {camp}")
-                    campaigns.update_one(
-                        {'_id': camp['_id']},
-                        {'$set': {'status': 'failed', 'error': error_msg}}
-                    )
-                    continue
-                
-                promo_data = camp.get('promo', {})
-                promo_text = promo_data.get('text', '')
-                
-                if not promo_text:
-                    logging.error(f"[SCHEDULER] No promo_text for invite campaign {campaign_id}")
-                    campaigns.update_one(
-                        {'_id': camp['_id']},
-                        {'$set': {'status': 'failed', 'error': 'No promo_text'}}
-                    )
-                    continue
-                
-                logging.info(f"[SCHEDULER] Sending invite campaign to {chat_id}")
-                res = send_invite_campaign_post(chat_id, promo_text, BOT_URL)
-                
+            if MONGO_USE_TRANSACTIONS:
+                with client.start_session() as session:
+                    settled = session.with_transaction(write)
             else:
-                # This is a regular cross-promotion campaign
-                chat_id = camp.get('chat_id') or camp.get('telegram_chat_id')
-                
-                if not chat_id:
-                    error_msg = 'No chat_id provided'
-                    logging.error(f"[SCHEDULER] {error_msg} for campaign {campaign_id}")
-                    logging.error(f"[SCHEDULER] Campaign data: {camp}")
-                    campaigns.update_one(
-                        {'_id': camp['_id']},
-                        {'$set': {'status': 'failed', 'error': error_msg}}
-                    )
-                    continue
-                
-                promo = camp.get('promo', {})
-                
-                if not promo:
-                    logging.error(f"[SCHEDULER] No promo data for campaign {campaign_id}")
-                    campaigns.update_one(
-                        {'_id': camp['_id']},
-                        {'$set': {'status': 'failed', 'error': 'No promo data'}}
-                    )
-                    continue
-                
-                logging.info(f"[SCHEDULER] Sending regular campaign to {chat_id}")
-                res = send_campaign_post(chat_id, promo)
+                settled = write(None)
+        except Exception:
+            logging.exception(f"[SCHEDULER] Failed to settle {len(chunk)} campaigns")
+            continue
+        
+        settled_total += len(settled)
+        for camp, _, _, on_settled in chunk:
+            if camp['_id'] in settled and on_settled:
+                try:
+                    on_settled()
+                except Exception as e:
+                    logging.error(f"[SCHEDULER] Post-settlement step failed for campaign {camp.get('id')}: {e}")
+    return settled_total
+
+
+def _fail_stale_posting_claims(now):
+    """
+    A campaign stuck in 'posting' may or may not have reached Telegram, so it
+    is failed rather than posted again
+    """
+    stale = campaigns.update_many(
+        {'status': 'posting', 'posting_claimed_at': {'$lt': now - timedelta(minutes=CLAIM_TIMEOUT_MINUTES)}},
+        {'$set': {'status': 'failed', 'error': 'Interrupted while posting', 'updated_at': now}}
+    )
+    if stale.modified_count:
+        logging.warning(f"[SCHEDULER] Failed {stale.modified_count} campaigns interrupted while posting")
+
+
+def _post_guarded(camp, channel_map, job='campaign_checker'):
+    """
+    Claim and post one campaign; any exception marks it failed instead of
+    aborting the tick. Returns False on errors, True otherwise (also when
+    another worker had already claimed it)
+    """
+    campaign_id = camp.get('id', str(camp.get('_id')))
+    claimed = _claim_campaign(camp, 'posting', posting_claimed_at=_claim_time())
+    if claimed is None:
+        logging.info(f"[SCHEDULER] Campaign {campaign_id} was already claimed, skipping")
+        return True
+    try:
+        _post_campaign(claimed, campaign_id, channel_map)
+        return True
+    except Exception as e:
+        logging.exception(f'[SCHEDULER] Exception posting campaign {campaign_id}')
+        job_errors.inc(job=job)
+        _set_campaign_fields(claimed, {'status': 'failed', 'error': str(e)})
+        return False
+
+
+def _channel_chat_id(ch):
+    """Chat id to post to for a channel document (bare usernames get an @)"""
+    chat_id = ch.get('telegram_id') or ch.get('telegram_chat')
+    if isinstance(chat_id, str) and not str(chat_id).startswith('-') and not str(chat_id).startswith('@'):
+        chat_id = f"@{chat_id}"
+    return chat_id
+
+
+def _send_prepared_or(camp, side, send):
+    """Send the payload the slot pre-warmer built for this side of camp, else call send()"""
+    prepared = (camp.get('prepared_posts') or {}).get(side)
+    if prepared:
+        return send_prepared_post(prepared)
+    return send()
+
+
+def _post_campaign(camp, campaign_id, channel_map):
+    """Post a single claimed campaign and write its result straight away"""
+    logging.info(f"[SCHEDULER] Processing campaign {campaign_id}")
+    
+    campaign_type = camp.get('type', 'regular')
+    
+    res = None
+    
+    # Handle different campaign types
+    if campaign_type == 'cross_promo_auto':
+        # Bilateral cross-promotion
+        from_id = camp.get('fromChannelId')
+        to_id = camp.get('toChannelId')
+        from_ch = channel_map.get(from_id)
+        to_ch = channel_map.get(to_id)
+        
+        if not from_ch or not to_ch:
+            logging.error(f"[SCHEDULER] Channels missing for auto campaign {campaign_id}")
+            _set_campaign_fields(camp, {'status': 'failed', 'error': 'Missing channels'})
+            return
+        
+        from_chat_id = _channel_chat_id(from_ch)
+        to_chat_id = _channel_chat_id(to_ch)
+        
+        requester_promo = camp.get('requester_promo', {})
+        acceptor_promo = camp.get('acceptor_promo', {})
+        
+        logging.info(f"[SCHEDULER] Sending bilateral auto-campaign to {from_chat_id} & {to_chat_id}")
+        
+        res_from = _send_prepared_or(camp, 'from', lambda: send_campaign_post(from_chat_id, acceptor_promo))
+        res_to = _send_prepared_or(camp, 'to', lambda: send_campaign_post(to_chat_id, requester_promo))
+        
+        from_ok = res_from and res_from.get('ok')
+        to_ok = res_to and res_to.get('ok')
+        
+        if from_ok and to_ok:
+            req_msg_id = res_from['result'].get('message_id')
+            acc_msg_id = res_to['result'].get('message_id')
             
-            # Check result
-            if res and res.get('ok') and res.get('result'):
-                message_id = res['result'].get('message_id')
-                logging.info(f"[SCHEDULER] Successfully posted campaign {campaign_id}, message_id={message_id}")
-                
-                # Update campaign status
-                campaigns.update_one(
-                    {'_id': camp['_id']}, 
-                    {
-                        '$set': {
-                            'status': 'running',
-                            'message_id': message_id,
-                            'posted_at': datetime.utcnow()
-                        }
-                    }
-                )
-                
-                # Set end time if not already set
-                if not camp.get('end_at'):
-                    duration_hours = camp.get('duration_hours', 12)
-                    end_time = datetime.utcnow() + timedelta(hours=duration_hours)
-                    campaigns.update_one(
-                        {'_id': camp['_id']}, 
-                        {'$set': {'end_at': end_time}}
-                    )
-            else:
-                error_msg = res.get('description', 'Failed to send message') if res else 'No response from Telegram'
-                logging.error(f"[SCHEDULER] Failed to post campaign {campaign_id}: {error_msg}")
-                logging.error(f"[SCHEDULER] Full response: {res}")
-                
-                # Mark as failed
-                campaigns.update_one(
-                    {'_id': camp['_id']},
-                    {'$set': {'status': 'failed', 'error': error_msg}}
-                )
+            observe_lag(posting_lag, camp.get('start_at'), datetime.utcnow(), campaign_type)
+            
+            end_time_calc = camp.get('end_at')
+            if not end_time_calc:
+                dur_h = camp.get('duration_hours', 2)
+                end_time_calc = datetime.utcnow() + timedelta(hours=dur_h)
                 
-        except Exception as e:
-            logging.exception(f'[SCHEDULER] Exception posting campaign {campaign_id}')
-            campaigns.update_one(
-                {'_id': camp['_id']},
-                {'$set': {'status': 'failed', 'error': str(e)}}
-            )
-      
+            _set_campaign_fields(camp, {
+                'status': 'active',
+                'requester_message_id': req_msg_id,
+                'acceptor_message_id': acc_msg_id,
+                'from_chat_id': from_chat_id,
+                'to_chat_id': to_chat_id,
+                'actual_start_at': datetime.utcnow(),
+                'end_at': end_time_calc
+            })
+            events.publish([from_ch.get('owner_id'), to_ch.get('owner_id')], 'campaign_posted', campaign_id=campaign_id)
+        else:
+            err_msg = f"Req Failure: {res_from} | Acc Failure: {res_to}"
+            logging.error(f"[SCHEDULER] Failed bilateral campaign {campaign_id}: {err_msg}")
+            _set_campaign_fields(camp, {'status': 'failed', 'error': err_msg})
+        
+        # Already handled natively
+        return
+        
+    elif campaign_type == 'invite_task':
+        # This is an invite task campaign
+        chat_id = camp.get('chat_id') or camp.get('telegram_chat_id')
+        
+        if not chat_id:
+            error_msg = 'No chat_id provided'
+            logging.error(f"[SCHEDULER] {error_msg} for campaign {campaign_id}")
+            logging.error(f"[SCHEDULER] Campaign data: {camp}")
+            _set_campaign_fields(camp, {'status': 'failed', 'error': error_msg})
+            return
+        
+        promo_data = camp.get('promo', {})
+        promo_text = promo_data.get('text', '')
+        
+        if not promo_text:
+            logging.error(f"[SCHEDULER] No promo_text for invite campaign {campaign_id}")
+            _set_campaign_fields(camp, {'status': 'failed', 'error': 'No promo_text'})
+            return
+        
+        logging.info(f"[SCHEDULER] Sending invite campaign to {chat_id}")
+        res = _send_prepared_or(camp, 'main', lambda: send_invite_campaign_post(chat_id, promo_text, BOT_URL))
+        
+    else:
+        # This is a regular cross-promotion campaign
+        chat_id = camp.get('chat_id') or camp.get('telegram_chat_id')
+        
+        if not chat_id:
+            error_msg = 'No chat_id provided'
+            logging.error(f"[SCHEDULER] {error_msg} for campaign {campaign_id}")
+            logging.error(f"[SCHEDULER] Campaign data: {camp}")
+            _set_campaign_fields(camp, {'status': 'failed', 'error': error_msg})
+            return
+        
+        promo = camp.get('promo', {})
+        
+        if not promo:
+            logging.error(f"[SCHEDULER] No promo data for campaign {campaign_id}")
+            _set_campaign_fields(camp, {'status': 'failed', 'error': 'No promo data'})
+            return
+        
+        logging.info(f"[SCHEDULER] Sending regular campaign to {chat_id}")
+        res = _send_prepared_or(camp, 'main', lambda: send_campaign_post(chat_id, promo))
+    
+    # Check result
+    if res and res.get('ok') and res.get('result'):
+        message_id = res['result'].get('message_id')
+        logging.info(f"[SCHEDULER] Successfully posted campaign {campaign_id}, message_id={message_id}")
+        observe_lag(posting_lag, camp.get('start_at'), datetime.utcnow(), campaign_type)
+        
+        update = {
+            'status': 'running',
+            'message_id': message_id,
+            'posted_at': datetime.utcnow()
+        }
+        
+        # Set end time if not already set
+        if not camp.get('end_at'):
+            duration_hours = camp.get('duration_hours', 12)
+            update['end_at'] = datetime.utcnow() + timedelta(hours=duration_hours)
+        
+        _set_campaign_fields(camp, update)
+        if campaign_type == 'invite_task' and camp.get('user_id'):
+            events.publish([camp.get('user_id')], 'campaign_posted', campaign_id=campaign_id)
+    else:
+        error_msg = res.get('description', 'Failed to send message') if res else 'No response from Telegram'
+        logging.error(f"[SCHEDULER] Failed to post campaign {campaign_id}: {error_msg}")
+        logging.error(f"[SCHEDULER] Full response: {res}")
+        
+        # Mark as failed
+        _set_campaign_fields(camp, {'status': 'failed', 'error': error_msg})
+
+@_serialized
+@timed_job('campaign_cleanup')
+@scoped('campaign_cleanup')
 def cleanup_finished_campaigns():
     """Cleanup finished campaigns and complete invite tasks"""
+    if catch_up_running():
+        return 0
     now = datetime.utcnow()
-    finished = list(campaigns.find({
-        '$or': [
-            {'status': 'running', 'end_at': {'$lte': now}},
-            {'status': 'active', 'type': 'cross_promo_auto', 'end_at': {'$lte': now}},
-            {'status': 'active', 'type': 'folder_promo', 'end_at': {'$lte': now}}
-        ]
-    }))
+    # Cleanups whose worker died part way are picked up again; deleting a
+    # post twice is harmless and the settlement only ever applies once
+    stale_ending = {'status': 'ending', 'cleanup_claimed_at': {'$lt': now - timedelta(minutes=CLAIM_TIMEOUT_MINUTES)}}
+    finished = list(campaigns.find({'$or': [_due_cleanups_filter(now), stale_ending]}))
     
     logging.info(f"[SCHEDULER] Found {len(finished)} campaigns to cleanup")
     
+    channel_map = _auto_channel_map(finished)
+    
+    # Posts are deleted one by one; their settlements are written together
+    settlements = []
     for camp in finished:
-        try:
-            chat_id = camp.get('chat_id') or camp.get('telegram_chat_id')
-            message_id = camp.get('message_id')
-            campaign_type = camp.get('type', 'regular')
-            
-            if campaign_type == 'cross_promo_auto':
-                from_chat_id = camp.get('from_chat_id')
-                to_chat_id = camp.get('to_chat_id')
-                req_message_id = camp.get('requester_message_id')
-                acc_message_id = camp.get('acceptor_message_id')
-                
-                if from_chat_id and req_message_id:
-                    delete_message(from_chat_id, req_message_id)
-                if to_chat_id and acc_message_id:
-                    delete_message(to_chat_id, acc_message_id)
-                
-                cpc_cost = camp.get('cpc_cost', 0)
-                from_id = camp.get('fromChannelId')
-                to_id = camp.get('toChannelId')
-                from_ch = channels.find_one({'id': from_id})
-                to_ch = channels.find_one({'id': to_id})
-                
-                if from_ch and to_ch:
-                    req_id = from_ch.get('owner_id')
-                    acc_id = to_ch.get('owner_id')
-                    if req_id and acc_id:
-                        users.update_one({'telegram_id': req_id}, {'$inc': {'cpcBalance': 150 - cpc_cost}})
-                        users.update_one({'telegram_id': acc_id}, {'$inc': {'cpcBalance': cpc_cost}})
-                        
-                        from models import increment_channel_exchanges
-                        increment_channel_exchanges(from_id)
-                        increment_channel_exchanges(to_id)
-                        
-                        try:
-                            try:
-                                send_message(req_id, f"✅ Campaign Completed!\nYou earned +150 CP Coins natively from the bot posting!")
-                            except: pass
-                            try:
-                                send_message(acc_id, f"✅ Campaign Completed!\nYou earned +{cpc_cost} CP Coins natively from the bot posting!")
-                            except: pass
-                        except Exception as nerr:
-                            logging.error(f"[SCHEDULER] Msg fail: {str(nerr)}")
-                
-                campaigns.update_one(
-                    {'_id': camp['_id']}, 
-                    {'$set': {'status': 'completed', 'actual_end_at': datetime.utcnow()}}
-                )
-                continue
-                
-            # Delete the message
-            if chat_id and message_id:
-                logging.info(f"[SCHEDULER] Deleting message {message_id} from {chat_id}")
-                delete_message(chat_id, message_id)
+        _cleanup_guarded(camp, channel_map, settlements)
+    _settle_campaigns(settlements)
+    
+    return len(finished)
+
+
+def _cleanup_guarded(camp, channel_map, settlements, job='campaign_cleanup'):
+    """
+    Claim and clean up one campaign, adding its settlement to `settlements`;
+    failures are logged and left for a later tick
+    """
+    match = {'cleanup_claimed_at': camp.get('cleanup_claimed_at')} if camp.get('status') == 'ending' else None
+    claimed = _claim_campaign(camp, 'ending', match=match, cleanup_claimed_at=_claim_time())
+    if claimed is None:
+        return True
+    try:
+        settlements.append(_cleanup_campaign(claimed, channel_map))
+        observe_lag(deletion_lag, camp.get('end_at'), datetime.utcnow(), camp.get('type'))
+        logging.info(f"[SCHEDULER] Successfully cleaned up campaign {camp.get('id')}")
+        return True
+    except Exception as e:
+        logging.exception(f'[SCHEDULER] Failed to cleanup campaign {camp.get("id")}')
+        job_errors.inc(job=job)
+        return False
+
+
+def _notify_quietly(user_id, text):
+    """Send a notification, swallowing Telegram errors"""
+    try:
+        send_message(user_id, text)
+    except Exception as nerr:
+        logging.error(f"[SCHEDULER] Msg fail: {str(nerr)}")
+
+
+def _publish_auto_settlement(campaign_id, req_id, acc_id, cpc_cost):
+    """Events for a settled auto campaign: requester gets 150 back minus the cost, acceptor the cost"""
+    events.publish([req_id, acc_id], 'campaign_ended', campaign_id=campaign_id)
+    events.publish([req_id], 'reward_credited', amount=150, reason='campaign', campaign_id=campaign_id)
+    events.publish([req_id], 'balance_changed', delta=150 - cpc_cost, reason='campaign')
+    events.reward_credited(acc_id, cpc_cost, 'campaign', campaign_id=campaign_id)
+
+
+def _cleanup_campaign(camp, channel_map):
+    """Delete a claimed campaign's posts and return its settlement for _settle_campaigns"""
+    chat_id = camp.get('chat_id') or camp.get('telegram_chat_id')
+    message_id = camp.get('message_id')
+    campaign_type = camp.get('type', 'regular')
+    
+    if campaign_type == 'cross_promo_auto':
+        from_chat_id = camp.get('from_chat_id')
+        to_chat_id = camp.get('to_chat_id')
+        req_message_id = camp.get('requester_message_id')
+        acc_message_id = camp.get('acceptor_message_id')
+        
+        if from_chat_id and req_message_id:
+            delete_message(from_chat_id, req_message_id)
+        if to_chat_id and acc_message_id:
+            delete_message(to_chat_id, acc_message_id)
+        
+        cpc_cost = camp.get('cpc_cost', 0)
+        from_id = camp.get('fromChannelId')
+        to_id = camp.get('toChannelId')
+        from_ch = channel_map.get(from_id)
+        to_ch = channel_map.get(to_id)
+        req_id = from_ch.get('owner_id') if from_ch else None
+        acc_id = to_ch.get('owner_id') if to_ch else None
+        
+        writes = _Writes()
+        fields = {'status': 'completed', 'actual_end_at': datetime.utcnow()}
+        if req_id and acc_id:
+            writes.add(users, UpdateOne({'telegram_id': req_id}, {'$inc': {'cpcBalance': 150 - cpc_cost}}))
+            writes.add(users, UpdateOne({'telegram_id': acc_id}, {'$inc': {'cpcBalance': cpc_cost}}))
+            increment_channel_exchanges(from_id, batch=writes)
+            increment_channel_exchanges(to_id, batch=writes)
+            roll_up_completed_campaign(camp, to_ch, datetime.utcnow(), batch=writes)
+            # Its subscriber gain is rolled up by analytics_rollup once history after the end exists.
+            # Without the rollup the flags stay unset and backfill_channel_analytics picks it up later
+            fields.update({'analytics_rolled_up': True, 'analytics_subscribers_due': True})
+        
+        def on_settled():
+            if req_id and acc_id:
+                _notify_quietly(req_id, f"✅ Campaign Completed!\nYou earned +150 CP Coins natively from the bot posting!")
+                _notify_quietly(acc_id, f"✅ Campaign Completed!\nYou earned +{cpc_cost} CP Coins natively from the bot posting!")
+                _publish_auto_settlement(camp.get('id'), req_id, acc_id, cpc_cost)
+        return camp, fields, writes, on_settled
+        
+    # Delete the message
+    if chat_id and message_id:
+        logging.info(f"[SCHEDULER] Deleting message {message_id} from {chat_id}")
+        delete_message(chat_id, message_id)
+    
+    user_id = camp.get('user_id')
+    reward = 350
+    writes = _Writes()
+    if campaign_type == 'folder_promo' and user_id:
+        writes.add(users, UpdateOne({'telegram_id': user_id}, {'$inc': {'cpcBalance': reward}}))
+    
+    def on_settled():
+        # If this is an invite task, complete it and reward the user now that the end is written
+        if campaign_type == 'invite_task':
+            campaign_id = camp.get('id') or str(camp.get('_id'))
             
-            # Mark campaign as ended
-            campaigns.update_one(
-                {'_id': camp['_id']}, 
-                {'$set': {'status': 'ended', 'ended_at': datetime.utcnow()}}
+            if user_id and campaign_id:
+                logging.info(f"[SCHEDULER] Completing invite task for user {user_id}")
+                from app import complete_invite_task
+                complete_invite_task(campaign_id, user_id)
+                events.publish([user_id], 'campaign_ended', campaign_id=campaign_id)
+        elif campaign_type == 'folder_promo' and user_id:
+            logging.info(f"[SCHEDULER] Completed folder promo for user {user_id}")
+            events.publish([user_id], 'campaign_ended', campaign_id=camp.get('id'))
+            events.reward_credited(user_id, reward, 'folder_promo', campaign_id=camp.get('id'))
+            _notify_quietly(
+                user_id,
+                f"🎉 <b>Folder Cross Promotion Completed!</b>\n\n"
+                f"Your 12-hour folder cross promotion interval has elapsed!\n"
+                f"The bot has automatically deleted the post and deposited +<b>{reward} CP Coins</b>. Next sessions are at 06:00, 12:00, 16:00 and 22:00 UTC daily."
             )
-            
-            # If this is an invite task, complete it and reward the user
-            if campaign_type == 'invite_task':
-                user_id = camp.get('user_id')
-                campaign_id = camp.get('id') or str(camp.get('_id'))
-                
-                if user_id and campaign_id:
-                    logging.info(f"[SCHEDULER] Completing invite task for user {user_id}")
-                    from app import complete_invite_task
-                    complete_invite_task(campaign_id, user_id)
-            elif campaign_type == 'folder_promo':
-                user_id = camp.get('user_id')
-                if user_id:
-                    logging.info(f"[SCHEDULER] Completing folder promo for user {user_id}")
-                    reward = 350
-                    users.update_one({'telegram_id': user_id}, {'$inc': {'cpcBalance': reward}})
-                    try:
-                        send_message(
-                            user_id,
-                            f"🎉 <b>Folder Cross Promotion Completed!</b>\n\n"
-                            f"Your 12-hour folder cross promotion interval has elapsed!\n"
-                            f"The bot has automatically deleted the post and deposited +<b>{reward} CP Coins</b>. Next sessions are at 06:00, 12:00, 16:00 and 22:00 UTC daily."
-                        )
-                    except:
-                        pass
-            
-            logging.info(f"[SCHEDULER] Successfully cleaned up campaign {camp.get('id')}")
-            
-        except Exception as e:
-            logging.exception(f'[SCHEDULER] Failed to cleanup campaign {camp.get("id")}')
+    
+    # Mark campaign as ended
+    return camp, {'status': 'ended', 'ended_at': datetime.utcnow()}, writes, on_settled
 
 
+@timed_job('expiry_notifier')
 def check_and_notify_expired_campaigns():
     """
     Check for campaigns and invite tasks that have expired and notify users
-    Runs every minute
+    Runs every minute; only sides whose stored expires_at has passed are read
+    (see the partial indexes in ensure_indexes)
     """
     try:
         now = datetime.utcnow()
         
-        # ====== CHECK FOR MISSED 48-HOUR POSTING DEADLINES ======
-        check_posting_deadlines(now)
+        # Notified flags are flushed in one round trip at the end of the tick
+        batch = WriteBatch()
         
-        # ====== CHECK REQUESTER CAMPAIGNS ======
-        active_requester_campaigns = list(campaigns.find({
+        # ====== DUE REQUESTER / ACCEPTOR SIDES ======
+        due_requester_campaigns = list(campaigns.find({
             'requester_status': 'active',
-            'requester_notified_expiry': {'$ne': True}
-        }))
+            'requester_notified_expiry': False,
+            'requester_expires_at': {'$lte': now}
+        }, {'id': 1, 'fromChannelId': 1, 'to_channel_name': 1}))
         
-        for campaign in active_requester_campaigns:
-            requester_posted_at = campaign.get('requester_posted_at')
-            if not requester_posted_at:
-                continue
-            
-            duration_hours = campaign.get('duration_hours', 2)
-            expiry_time = requester_posted_at + timedelta(hours=duration_hours)
-            
-            # Check if campaign has expired
-            if now >= expiry_time:
-                from_channel_id = campaign.get('fromChannelId')
-                from_channel = channels.find_one({'id': from_channel_id})
-                
-                if from_channel:
-                    owner_id = from_channel.get('owner_id')
-                    partner_name = campaign.get('partner_channel_name', 'Partner')
-                    
-                    if owner_id:
-                        # Send notification
-                        message = (
-                            "⏰ <b>Campaign Timer Complete!</b>\n\n"
-                            f"Your campaign with <b>{partner_name}</b> has ended.\n\n"
-                            "✅ Next steps:\n"
-                            "1. Delete the promotional post from your channel\n"
-                            "2. Open the app and click 'End Campaign'\n"
-                            "3. Claim your reward!\n\n"
-                            "Thank you for using CP Gram! 🚀"
-                        )
-                        
-                        try:
-                            send_open_button_message(str(owner_id), message, button_text='Open App')
-                            logging.info(f"Sent expiry notification to requester {owner_id} for campaign {campaign.get('id')}")
-                        except:
-                            send_message(str(owner_id), message)
-                        
-                        # Mark as notified
-                        campaigns.update_one(
-                            {'id': campaign.get('id')},
-                            {'$set': {'requester_notified_expiry': True}}
-                        )
-        
-        # ====== CHECK ACCEPTOR CAMPAIGNS ======
-        active_acceptor_campaigns = list(campaigns.find({
+        due_acceptor_campaigns = list(campaigns.find({
             'acceptor_status': 'active',
-            'acceptor_notified_expiry': {'$ne': True}
-        }))
+            'acceptor_notified_expiry': False,
+            'acceptor_expires_at': {'$lte': now}
+        }, {'id': 1, 'toChannelId': 1, 'from_channel_name': 1}))
         
-        for campaign in active_acceptor_campaigns:
-            acceptor_posted_at = campaign.get('acceptor_posted_at')
-            if not acceptor_posted_at:
-                continue
-            
-            duration_hours = campaign.get('duration_hours', 2)
-            expiry_time = acceptor_posted_at + timedelta(hours=duration_hours)
+        # Owners of both sides are resolved from a single channel lookup
+        channel_map = get_channels_by_ids(
+            [c.get('fromChannelId') for c in due_requester_campaigns] +
+            [c.get('toChannelId') for c in due_acceptor_campaigns],
+            {'id': 1, 'owner_id': 1}
+        )
+        
+        sides = [(c, 'requester', c.get('fromChannelId')) for c in due_requester_campaigns] + \
+                [(c, 'acceptor', c.get('toChannelId')) for c in due_acceptor_campaigns]
+        
+        for campaign, role, channel_id in sides:
+            channel = channel_map.get(channel_id)
+            owner_id = channel.get('owner_id') if channel else None
             
-            if now >= expiry_time:
-                to_channel_id = campaign.get('toChannelId')
-                to_channel = channels.find_one({'id': to_channel_id})
+            if owner_id:
+                partner_field = 'to_channel_name' if role == 'requester' else 'from_channel_name'
+                partner_name = campaign.get(partner_field) or 'Partner'
+                # Send notification
+                message = (
+                    "⏰ <b>Campaign Timer Complete!</b>\n\n"
+                    f"Your campaign with <b>{partner_name}</b> has ended.\n\n"
+                    "✅ Next steps:\n"
+                    "1. Delete the promotional post from your channel\n"
+                    "2. Open the app and click 'End Campaign'\n"
+                    "3. Claim your reward!\n\n"
+                    "Thank you for using CP Gram! 🚀"
+                )
                 
-                if to_channel:
-                    owner_id = to_channel.get('owner_id')
-                    partner_name = campaign.get('partner_channel_name', 'Partner')
-                    
-                    if owner_id:
-                        # Send notification
-                        message = (
-                            "⏰ <b>Campaign Timer Complete!</b>\n\n"
-                            f"Your campaign with <b>{partner_name}</b> has ended.\n\n"
-                            "✅ Next steps:\n"
-                            "1. Delete the promotional post from your channel\n"
-                            "2. Open the app and click 'End Campaign'\n"
-                            "3. Claim your reward!\n\n"
-                            "Thank you for using CP Gram! 🚀"
-                        )
-                        
-                        try:
-                            send_open_button_message(str(owner_id), message, button_text='Open App')
-                            logging.info(f"Sent expiry notification to acceptor {owner_id} for campaign {campaign.get('id')}")
-                        except:
-                            send_message(str(owner_id), message)
-                        
-                        # Mark as notified
-                        campaigns.update_one(
-                            {'id': campaign.get('id')},
-                            {'$set': {'acceptor_notified_expiry': True}}
-                        )
-        
-        # ====== CHECK INVITE TASKS ======
-        active_invite_tasks = list(campaigns.find({
+                try:
+                    send_open_button_message(str(owner_id), message, button_text='Open App')
+                    logging.info(f"Sent expiry notification to {role} {owner_id} for campaign {campaign.get('id')}")
+                except:
+                    send_message(str(owner_id), message)
+            
+            # Mark as notified (also when the owner is gone, so the side isn't swept again)
+            batch.add(campaigns, UpdateOne({'_id': campaign['_id']}, {'$set': {f'{role}_notified_expiry': True, 'updated_at': now}}))
+        
+        # ====== DUE INVITE TASKS ======
+        due_invite_tasks = list(campaigns.find({
             'type': 'invite_task',
             'status': 'active',
-            'expiry_notified': {'$ne': True}
-        }))
+            'expiry_notified': False,
+            'expires_at': {'$lte': now}
+        }, {'id': 1, 'user_id': 1}))
         
-        for task in active_invite_tasks:
-            posted_at = task.get('posted_at')
-            if not posted_at:
-                continue
+        for task in due_invite_tasks:
+            user_id = task.get('user_id')
             
-            duration_hours = task.get('duration_hours', 12)
-            expiry_time = posted_at + timedelta(hours=duration_hours)
-            
-            if now >= expiry_time:
-                user_id = task.get('user_id')
+            if user_id:
+                # Send notification
+                message = (
+                    "⏰ <b>Invite Task Timer Complete!</b>\n\n"
+                    "Your 12-hour promotional post period has ended.\n\n"
+                    "✅ Next steps:\n"
+                    "1. Delete the promotional post from your channel\n"
+                    "2. Open the app and claim your 5,000 CP Coins!\n\n"
+                    "Don't forget to claim your reward! 🎉"
+                )
                 
-                if user_id:
-                    # Send notification
-                    message = (
-                        "⏰ <b>Invite Task Timer Complete!</b>\n\n"
-                        "Your 12-hour promotional post period has ended.\n\n"
-                        "✅ Next steps:\n"
-                        "1. Delete the promotional post from your channel\n"
-                        "2. Open the app and claim your 5,000 CP Coins!\n\n"
-                        "Don't forget to claim your reward! 🎉"
-                    )
-                    
-                    try:
-                        send_open_button_message(str(user_id), message, button_text='Claim Reward')
-                        logging.info(f"Sent expiry notification to user {user_id} for invite task {task.get('id')}")
-                    except:
-                        send_message(str(user_id), message)
-                    
-                    # Mark as notified
-                    campaigns.update_one(
-                        {'id': task.get('id')},
-                        {'$set': {'expiry_notified': True}}
-                    )
+                try:
+                    send_open_button_message(str(user_id), message, button_text='Claim Reward')
+                    logging.info(f"Sent expiry notification to user {user_id} for invite task {task.get('id')}")
+                except:
+                    send_message(str(user_id), message)
+            
+            # Mark as notified
+            batch.add(campaigns, UpdateOne({'_id': task['_id']}, {'$set': {'expiry_notified': True, 'updated_at': now}}))
+        
+        batch.flush()
         
         logging.info(f"Checked expired campaigns/tasks at {now}")
+        return len(sides) + len(due_invite_tasks)
         
     except Exception as e:
         logging.error(f"Error checking expired campaigns: {e}")
+        job_errors.inc(job='expiry_notifier')
         import traceback
         traceback.print_exc()
         
-def check_posting_deadlines(now):
+@timed_job('deadline_expirer')
+@scoped('deadline_expirer')
+def expire_missed_posting_deadlines():
     """
-    Check for campaigns where 48-hour posting deadline has passed
-    Penalize users who didn't post
+    Expire each campaign side whose 48-hour posting deadline passed without a post,
+    then penalize and notify its owner.
+    Sides are claimed atomically: one update_many flips every overdue side to
+    'expired' and stamps it with this run's claim id, and only the documents
+    carrying that stamp are penalized, so overlapping runs or workers never
+    penalize the same side twice.
     """
     try:
-        # Find campaigns with pending status that have passed the deadline
-        pending_campaigns = list(campaigns.find({
-            'posting_deadline': {'$lte': now},
-            '$or': [
-                {'requester_status': 'pending_posting', 'requester_deadline_notified': False},
-                {'acceptor_status': 'pending_posting', 'acceptor_deadline_notified': False}
-            ]
-        }))
+        now = datetime.utcnow()
+        claim_id = uuid.uuid4().hex
+        expired_sides = 0
         
-        for campaign in pending_campaigns:
-            campaign_id = campaign.get('id')
-            from_channel_id = campaign.get('fromChannelId')
-            to_channel_id = campaign.get('toChannelId')
-            
-            # Get channels
-            from_channel = channels.find_one({'id': from_channel_id})
-            to_channel = channels.find_one({'id': to_channel_id})
-            
-            # Check requester
-            if campaign.get('requester_status') == 'pending_posting' and not campaign.get('requester_deadline_notified'):
-                if from_channel:
-                    owner_id = from_channel.get('owner_id')
-                    if owner_id:
-                        # Penalize requester
-                        penalize_user_for_missed_deadline(owner_id, 'requester', campaign_id, to_channel.get('name') if to_channel else 'Partner')
-                        
-                        # Update campaign status
-                        campaigns.update_one(
-                            {'id': campaign_id},
-                            {
-                                '$set': {
-                                    'requester_status': 'expired',
-                                    'requester_deadline_notified': True,
-                                    'updated_at': datetime.utcnow()
-                                }
-                            }
-                        )
+        for role, own_field, partner_field in (('requester', 'fromChannelId', 'toChannelId'),
+                                               ('acceptor', 'toChannelId', 'fromChannelId')):
+            campaigns.update_many(
+                {'posting_deadline': {'$lte': now}, f'{role}_status': 'pending_posting'},
+                {'$set': {
+                    f'{role}_status': 'expired',
+                    f'{role}_expired_at': now,
+                    f'{role}_deadline_notified': True,
+                    f'{role}_expiry_claim': claim_id,
+                    'updated_at': now
+                }}
+            )
+            claimed = list(campaigns.find(
+                {f'{role}_expiry_claim': claim_id},
+                {'id': 1, 'fromChannelId': 1, 'toChannelId': 1}
+            ))
+            if not claimed:
+                continue
             
-            # Check acceptor
-            if campaign.get('acceptor_status') == 'pending_posting' and not campaign.get('acceptor_deadline_notified'):
-                if to_channel:
-                    owner_id = to_channel.get('owner_id')
-                    if owner_id:
-                        # Penalize acceptor
-                        penalize_user_for_missed_deadline(owner_id, 'acceptor', campaign_id, from_channel.get('name') if from_channel else 'Partner')
-                        
-                        # Update campaign status
-                        campaigns.update_one(
-                            {'id': campaign_id},
-                            {
-                                '$set': {
-                                    'acceptor_status': 'expired',
-                                    'acceptor_deadline_notified': True,
-                                    'updated_at': datetime.utcnow()
-                                }
-                            }
-                        )
-        
-        if pending_campaigns:
-            logging.info(f"Processed {len(pending_campaigns)} expired posting deadlines")
+            channel_map = get_channels_by_ids(
+                cid for c in claimed for cid in (c.get(own_field), c.get(partner_field))
+            )
+            for campaign in claimed:
+                own_channel = channel_map.get(campaign.get(own_field))
+                partner_channel = channel_map.get(campaign.get(partner_field))
+                owner_id = own_channel.get('owner_id') if own_channel else None
+                if not owner_id:
+                    continue
+                penalize_user_for_missed_deadline(
+                    owner_id, role, campaign.get('id'),
+                    partner_channel.get('name') if partner_channel else 'Partner'
+                )
+            expired_sides += len(claimed)
+        
+        if expired_sides:
+            logging.info(f"Processed {expired_sides} expired posting deadlines")
+        return expired_sides
             
     except Exception as e:
         logging.error(f"Error checking posting deadlines: {e}")
+        job_errors.inc(job='deadline_expirer')
         import traceback
         traceback.print_exc()
         
@@ -563,36 +759,39 @@ def check_posting_deadlines(now):
 def penalize_user_for_missed_deadline(telegram_id, user_role, campaign_id, partner_name):
     """
     Deduct 250 CP from user and notify them
+    Called right after the side was claimed as expired, so it runs once per side
     """
     try:
         penalty = 250
         
-        # Deduct CP coins from user
-        result = users.update_one(
-            {'telegram_id': telegram_id},
-            {
-                '$inc': {'cpcBalance': -penalty},
-                '$set': {'updated_at': datetime.utcnow()}
-            }
+        message = (
+            "⚠️ <b>Campaign Posting Deadline Missed</b>\n\n"
+            f"Your campaign with <b>{partner_name}</b> has expired.\n\n"
+            f"You had 48 hours to post the promotional material but did not complete it.\n\n"
+            f"<b>Penalty:</b> -{penalty} CP Coins\n\n"
+            "Please ensure you post campaigns within the deadline to avoid penalties in the future.\n\n"
+            "The other user will still receive their reward if they completed their side."
         )
         
-        if result.modified_count > 0:
-            # Send notification
-            message = (
-                "⚠️ <b>Campaign Posting Deadline Missed</b>\n\n"
-                f"Your campaign with <b>{partner_name}</b> has expired.\n\n"
-                f"You had 48 hours to post the promotional material but did not complete it.\n\n"
-                f"<b>Penalty:</b> -{penalty} CP Coins\n\n"
-                "Please ensure you post campaigns within the deadline to avoid penalties in the future.\n\n"
-                "The other user will still receive their reward if they completed their side."
-            )
-            
+        def notify():
+            events.publish([telegram_id], 'balance_changed', delta=-penalty, reason='missed_deadline')
             try:
                 send_open_button_message(str(telegram_id), message, button_text='View Campaigns')
                 logging.info(f"Penalized user {telegram_id} with {penalty} CP for missed deadline on campaign {campaign_id}")
             except:
                 send_message(str(telegram_id), message)
         
+        update = {
+            '$inc': {'cpcBalance': -penalty},
+            '$set': {'updated_at': datetime.utcnow()}
+        }
+        
+        # Deduct CP coins from user
+        result = users.update_one({'telegram_id': telegram_id}, update)
+        
+        if result.modified_count > 0:
+            notify()
+        
     except Exception as e:
         logging.error(f"Error penalizing user {telegram_id}: {e}")
         import traceback
@@ -623,7 +822,7 @@ def process_invite_campaigns():
             # Mark campaign as completed
             campaigns.update_one(
                 {'id': campaign_id},
-                {'$set': {'status': 'completed'}}
+                {'$set': {'status': 'completed', 'updated_at': datetime.utcnow()}}
             )
 
 # Store for tracking broadcast status
@@ -717,143 +916,347 @@ def process_broadcast(broadcast_id, user_ids, text, image, link, cta, admin_id):
         except Exception as e:
             logging.error(f"[BROADCAST] Failed to notify admin: {e}")
             
+@timed_job('followup_processor')
 def process_followup_messages():
     """
     Process and send pending follow-up messages
-    Runs every 5 minutes
+    Runs every 5 minutes; users are claimed in batches, messaged concurrently
+    through the rate-limited dispatcher and settled with one bulk_write per batch
     """
     try:
-        from models import get_pending_followup_messages, FOLLOW_UP_MESSAGES, user_onboarding
+        from models import claim_followup_batch, release_stale_followup_claims, FOLLOW_UP_MESSAGES, user_onboarding
         from bot import send_followup_message
-        import datetime
 
-        pending = get_pending_followup_messages()
+        release_stale_followup_claims()
 
-        if not pending:
-            return
+        processed = 0
+        while True:
+            claim_id, batch = claim_followup_batch(FOLLOWUP_BATCH_SIZE)
+            if not batch:
+                break
 
-        logging.info(f"[FOLLOWUP] Processing {len(pending)} pending follow-up messages")
+            logging.info(f"[FOLLOWUP] Processing batch of {len(batch)} pending follow-up messages")
+            processed += len(batch)
+            now = datetime.utcnow()
+            release = {'processing': False}
 
-        for user in pending:
-            try:
-                telegram_id = user.get('telegram_id')
+            ops = []
+            to_send = []
+            for user in batch:
                 current_index = user.get('current_message_index', 0)
-
-                # ✅ LOCK: Immediately push next_message_at far into the future
-                # This prevents any concurrent scheduler run from picking up the same user
-                lock_result = user_onboarding.update_one(
-                    {
-                        'telegram_id': telegram_id,
-                        'current_message_index': current_index,  # Only update if index hasn't changed
-                        'sequence_active': True
-                    },
-                    {
-                        '$set': {
-                            'next_message_at': datetime.datetime.utcnow() + datetime.timedelta(days=999),
-                            'processing': True
-                        }
-                    }
-                )
-
-                # If no document was modified, another process already grabbed this user — skip
-                if lock_result.modified_count == 0:
-                    logging.info(f"[FOLLOWUP] Skipping {telegram_id} — already being processed")
-                    continue
+                # Outcomes only apply if this claim still owns the user (a /start resets it)
+                owned = {'_id': user['_id'], 'claim_id': claim_id}
 
                 # Check if sequence is complete
                 if current_index >= len(FOLLOW_UP_MESSAGES):
-                    user_onboarding.update_one(
-                        {'telegram_id': telegram_id},
-                        {
-                            '$set': {
-                                'sequence_active': False,
-                                'completed_at': datetime.datetime.utcnow(),
-                                'processing': False
-                            }
-                        }
-                    )
+                    ops.append(UpdateOne(owned, {
+                        '$set': {'sequence_active': False, 'completed_at': now, **release},
+                        '$unset': {'claim_id': '', 'claimed_at': ''}
+                    }))
                     continue
 
-                message_config = FOLLOW_UP_MESSAGES[current_index]
+                to_send.append((user, FOLLOW_UP_MESSAGES[current_index]))
 
-                # Send the message
-                result = send_followup_message(telegram_id, message_config)
+            results = dispatch(send_followup_message, [(user.get('telegram_id'), config) for user, config in to_send])
+
+            for (user, message_config), result in zip(to_send, results):
+                telegram_id = user.get('telegram_id')
+                owned = {'_id': user['_id'], 'claim_id': claim_id}
 
                 if result and result.get('ok'):
-                    next_index = current_index + 1
+                    next_index = user.get('current_message_index', 0) + 1
+                    update_data = {'current_message_index': next_index, 'updated_at': now, **release}
 
-                    # Calculate next message time
+                    # Delay is absolute from start, so calculate gap between this and next
                     if next_index < len(FOLLOW_UP_MESSAGES):
-                        next_config = FOLLOW_UP_MESSAGES[next_index]
-                        # Delay is absolute from start, so calculate gap between this and next
-                        delay_gap = next_config['delay_hours'] - message_config['delay_hours']
-                        next_message_time = datetime.datetime.utcnow() + datetime.timedelta(hours=delay_gap)
-                    else:
-                        next_message_time = None
-
-                    update_data = {
-                        'current_message_index': next_index,
-                        'messages_sent': user.get('messages_sent', []) + [message_config['message_number']],
-                        'updated_at': datetime.datetime.utcnow(),
-                        'processing': False  # ✅ Release lock
-                    }
-
-                    if next_message_time:
-                        update_data['next_message_at'] = next_message_time
+                        delay_gap = FOLLOW_UP_MESSAGES[next_index]['delay_hours'] - message_config['delay_hours']
+                        update_data['next_message_at'] = now + timedelta(hours=delay_gap)
                     else:
                         update_data['sequence_active'] = False
-                        update_data['completed_at'] = datetime.datetime.utcnow()
-
-                    user_onboarding.update_one(
-                        {'telegram_id': telegram_id},
-                        {'$set': update_data}
-                    )
+                        update_data['completed_at'] = now
 
+                    ops.append(UpdateOne(owned, {
+                        '$set': update_data,
+                        '$push': {'messages_sent': message_config['message_number']},
+                        '$unset': {'claim_id': '', 'claimed_at': ''}
+                    }))
                     logging.info(f"[FOLLOWUP] Sent message {message_config['message_number']} to {telegram_id}")
-
                 else:
-                    # ✅ Send failed — release the lock and try again next cycle
-                    logging.error(f"[FOLLOWUP] Failed to send to {telegram_id}, releasing lock")
-                    user_onboarding.update_one(
-                        {'telegram_id': telegram_id},
-                        {
-                            '$set': {
-                                'next_message_at': datetime.datetime.utcnow() + datetime.timedelta(minutes=5),
-                                'processing': False  # ✅ Release lock so it retries
-                            }
-                        }
-                    )
-
-            except Exception as e:
-                logging.error(f"[FOLLOWUP] Error processing user {user.get('telegram_id')}: {e}")
-                # ✅ Release lock on exception too
-                try:
-                    user_onboarding.update_one(
-                        {'telegram_id': user.get('telegram_id')},
-                        {
-                            '$set': {
-                                'next_message_at': datetime.datetime.utcnow() + datetime.timedelta(minutes=5),
-                                'processing': False
-                            }
-                        }
-                    )
-                except Exception:
-                    pass
+                    # Send failed — release the claim and try again in 5 minutes
+                    logging.error(f"[FOLLOWUP] Failed to send to {telegram_id}, releasing claim")
+                    job_errors.inc(job='followup_processor')
+                    ops.append(UpdateOne(owned, {
+                        '$set': {'next_message_at': now + timedelta(minutes=5), **release},
+                        '$unset': {'claim_id': '', 'claimed_at': ''}
+                    }))
+
+            if ops:
+                user_onboarding.bulk_write(ops, ordered=False)
+
+        return processed
 
     except Exception as e:
         logging.error(f"[FOLLOWUP] Error in process_followup_messages: {e}")
+        job_errors.inc(job='followup_processor')
         import traceback
         traceback.print_exc()
         
+# ====== SLOT PRE-WARM / DISPATCH ======
+# Most campaigns are booked on the hour, so hundreds can come due in the same
+# second. A few minutes ahead the pre-warmer turns each one into ready-to-send
+# payloads (canonical chat ids, cached photo file_ids, keyboards) and gives it a
+# send_at spread over the SLOT_JITTER_SECONDS leading up to the slot, so every
+# post is out by start_at; dispatch_slot queues a send job for each send_at.
+
+DISPATCH_CLAIM_TIMEOUT_MINUTES = 10
+
+
+def _slot_offset(camp):
+    """Stable per-campaign lead (seconds before start_at) within the slot's jitter window"""
+    if SLOT_JITTER_SECONDS <= 0:
+        return 0
+    return zlib.crc32(str(camp['_id']).encode()) % (SLOT_JITTER_SECONDS + 1)
+
+
+def _canonical_chat_id(chat_id, chat_ids):
+    """Numeric id for an @username (getChat once per run), anything else unchanged"""
+    if not (isinstance(chat_id, str) and chat_id.startswith('@')):
+        return chat_id
+    if chat_id not in chat_ids:
+        telegram_limiter.acquire()
+        res = get_chat(chat_id)
+        resolved = (res.get('result') or {}).get('id') if res.get('ok') else None
+        chat_ids[chat_id] = resolved or chat_id
+    return chat_ids[chat_id]
+
+
+def _cached_file_id(url, media):
+    """Telegram file_id for a promo image URL, uploading it to the staging chat once"""
+    if url in media:
+        return media[url]
+    cached = media_cache.find_one({'_id': url})
+    file_id = cached.get('file_id') if cached else None
+    if not file_id and MEDIA_STAGING_CHAT_ID:
+        telegram_limiter.acquire()
+        res = send_photo(MEDIA_STAGING_CHAT_ID, url)
+        if res and res.get('ok'):
+            photos = (res.get('result') or {}).get('photo') or []
+            if photos:
+                file_id = photos[-1]['file_id']
+                media_cache.update_one({'_id': url}, {'$set': {'file_id': file_id, 'cached_at': datetime.utcnow()}}, upsert=True)
+            delete_message(MEDIA_STAGING_CHAT_ID, res['result'].get('message_id'))
+    media[url] = file_id
+    return file_id
+
+
+def _warm(post, media):
+    """Swap a photo URL for its cached file_id, keeping the URL version as fallback"""
+    photo = post['payload'].get('photo')
+    if isinstance(photo, str) and photo.startswith(('http://', 'https://')):
+        file_id = _cached_file_id(photo, media)
+        if file_id:
+            original = {'method': post['method'], 'payload': dict(post['payload'])}
+            if post.get('fallback'):
+                original['fallback'] = post['fallback']
+            post['payload']['photo'] = file_id
+            post['fallback'] = original
+    return post
+
+
+def _prepare_posts(camp, channel_map, chat_ids, media):
+    """
+    Ready-to-send payloads for camp keyed by side ('from'/'to' for auto
+    campaigns, 'main' otherwise); None if _post_campaign would fail it anyway
+    """
+    campaign_type = camp.get('type', 'regular')
+    
+    if campaign_type == 'cross_promo_auto':
+        from_ch = channel_map.get(camp.get('fromChannelId'))
+        to_ch = channel_map.get(camp.get('toChannelId'))
+        if not from_ch or not to_ch:
+            return None
+        from_chat_id = _canonical_chat_id(_channel_chat_id(from_ch), chat_ids)
+        to_chat_id = _canonical_chat_id(_channel_chat_id(to_ch), chat_ids)
+        return {
+            'from': _warm(build_campaign_post(from_chat_id, camp.get('acceptor_promo', {})), media),
+            'to': _warm(build_campaign_post(to_chat_id, camp.get('requester_promo', {})), media)
+        }
+    
+    chat_id = camp.get('chat_id') or camp.get('telegram_chat_id')
+    if not chat_id:
+        return None
+    chat_id = _canonical_chat_id(chat_id, chat_ids)
+    
+    if campaign_type == 'invite_task':
+        promo_text = (camp.get('promo') or {}).get('text', '')
+        if not promo_text:
+            return None
+        return {'main': _warm(build_invite_campaign_post(chat_id, promo_text, BOT_URL), media)}
+    
+    if not camp.get('promo'):
+        return None
+    return {'main': _warm(build_campaign_post(chat_id, camp['promo']), media)}
+
+
+def _schedule_slot_dispatch(slot):
+    """Queue dispatch_slot at the start of slot's jitter window (naive UTC); one job per slot"""
+    window_start = slot - timedelta(seconds=SLOT_JITTER_SECONDS)
+    run_at = max(window_start.replace(tzinfo=timezone.utc), datetime.now(timezone.utc))
+    s.add_job(
+        dispatch_slot,
+        'date',
+        run_date=run_at,
+        args=[slot],
+        id=f"slot_dispatch:{slot:%Y%m%d%H%M%S}",
+        misfire_grace_time=SLOT_JITTER_SECONDS + 30,
+        replace_existing=True
+    )
+
+
+@timed_job('slot_prewarmer')
+@scoped('slot_prewarmer')
+def prewarm_upcoming_slots():
+    """Prepare campaigns starting within SLOT_PREWARM_MINUTES and queue their slot dispatchers"""
+    now = datetime.utcnow()
+    
+    # Claims left behind by a dispatcher that died go back to the poller
+    released = campaigns.update_many(
+        {'status': 'dispatching', 'dispatch_claimed_at': {'$lt': now - timedelta(minutes=DISPATCH_CLAIM_TIMEOUT_MINUTES)}},
+        [
+            {'$set': {'status': '$claimed_from_status', 'updated_at': now}},
+            {'$unset': ['claimed_from_status', 'dispatch_claim', 'dispatch_claimed_at']}
+        ]
+    )
+    if released.modified_count:
+        logging.warning(f"[SCHEDULER] Released {released.modified_count} stale slot dispatch claims")
+    
+    horizon = now + timedelta(minutes=SLOT_PREWARM_MINUTES)
+    upcoming = list(campaigns.find({'$and': [
+        _due_posts_filter(horizon),
+        {'start_at': {'$gte': now - timedelta(seconds=SLOT_JITTER_SECONDS)}}
+    ]}))
+    
+    # Campaigns whose jitter window opens within a minute are left to the poller
+    ready_after = now + timedelta(seconds=SLOT_JITTER_SECONDS + 60)
+    to_prepare = [c for c in upcoming if not c.get('prepared_at') and c['start_at'] > ready_after]
+    channel_map = _auto_channel_map(to_prepare)
+    chat_ids, media = {}, {}
+    ops = []
+    
+    for camp in to_prepare:
+        campaign_id = camp.get('id', str(camp.get('_id')))
+        try:
+            prepared = _prepare_posts(camp, channel_map, chat_ids, media)
+        except Exception as e:
+            logging.error(f"[SCHEDULER] Failed to pre-warm campaign {campaign_id}: {e}")
+            job_errors.inc(job='slot_prewarmer')
+            continue
+        if not prepared:
+            continue
+        
+        fields = {
+            'prepared_posts': prepared,
+            'send_at': camp['start_at'] - timedelta(seconds=_slot_offset(camp)),
+            'prepared_at': now,
+            'updated_at': now
+        }
+        camp.update(fields)
+        ops.append(UpdateOne({'_id': camp['_id'], 'status': camp['status']}, {'$set': fields}))
+    
+    if ops:
+        campaigns.bulk_write(ops, ordered=False)
+        logging.info(f"[SCHEDULER] Pre-warmed {len(ops)} campaigns")
+    
+    for slot in {c['start_at'] for c in upcoming if c.get('prepared_at')}:
+        _schedule_slot_dispatch(slot)
+    
+    return len(ops)
+
+
+@timed_job('slot_dispatcher')
+@scoped('slot_dispatcher')
+def dispatch_slot(slot):
+    """Claim one slot's pre-warmed campaigns and queue a send job per distinct send_at"""
+    claim = str(uuid.uuid4())
+    campaigns.update_many(
+        {
+            'start_at': slot,
+            'status': {'$in': ['scheduled', 'pending_posting']},
+            'prepared_at': {'$exists': True}
+        },
+        [{'$set': {
+            'claimed_from_status': '$status',
+            'status': 'dispatching',
+            'dispatch_claim': claim,
+            'dispatch_claimed_at': datetime.utcnow(),
+            'updated_at': datetime.utcnow()
+        }}]
+    )
+    claimed = list(campaigns.find({'dispatch_claim': claim, 'status': 'dispatching'}).sort('send_at', 1))
+    if not claimed:
+        return 0
+    
+    logging.info(f"[SCHEDULER] Dispatching {len(claimed)} campaigns for slot {slot}")
+    for send_at in sorted({camp.get('send_at', slot) for camp in claimed}):
+        _schedule_slot_send(claim, send_at)
+    
+    return len(claimed)
+
+
+def _schedule_slot_send(claim, send_at):
+    """Queue send_slot_group for the campaigns in claim due at send_at (naive UTC)"""
+    run_at = max(send_at.replace(tzinfo=timezone.utc), datetime.now(timezone.utc))
+    s.add_job(
+        send_slot_group,
+        'date',
+        run_date=run_at,
+        args=[claim, send_at],
+        id=f"slot_send:{claim}:{send_at:%Y%m%d%H%M%S}",
+        misfire_grace_time=SLOT_JITTER_SECONDS + 30,
+        replace_existing=True
+    )
+
+
+@timed_job('slot_sender')
+@scoped('slot_sender')
+def send_slot_group(claim, send_at):
+    """Post the campaigns dispatch_slot claimed under claim with this send_at"""
+    due = list(campaigns.find({'dispatch_claim': claim, 'status': 'dispatching', 'send_at': send_at}))
+    if not due:
+        return 0
+    channel_map = _auto_channel_map(due)
+    
+    def send(camp):
+        # Auto campaigns post to both channels
+        for _ in range(2 if camp.get('type') == 'cross_promo_auto' else 1):
+            telegram_limiter.acquire()
+        _post_guarded(camp, channel_map, job='slot_sender')
+    
+    workers = min(TELEGRAM_DISPATCH_WORKERS, len(due))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='slot-dispatch') as pool:
+        list(pool.map(send, due))
+    
+    return len(due)
+
+
 # Update start_scheduler function
 def start_scheduler():
     if not TELEGRAM_BOT_TOKEN:
         logging.warning('[SCHEDULER] TELEGRAM_BOT_TOKEN is not set.')
 
-    # Existing jobs
-    s.add_job(check_and_post_campaigns, 'interval', seconds=20, id='campaign_checker')
-    s.add_job(cleanup_finished_campaigns, 'interval', seconds=30, id='campaign_cleanup')
+    # With change streams the due-time queue does the work and polling is only a safety net
+    post_interval, cleanup_interval = 20, 30
+    if SCHEDULER_CHANGE_STREAMS:
+        post_interval = cleanup_interval = SCHEDULER_SAFETY_POLL_SECONDS
+
+    # Existing jobs (they stand by while the leader's catch-up drains a downtime backlog)
+    s.add_job(check_and_post_campaigns, 'interval', seconds=post_interval, id='campaign_checker')
+    s.add_job(cleanup_finished_campaigns, 'interval', seconds=cleanup_interval, id='campaign_cleanup')
     s.add_job(check_and_notify_expired_campaigns, 'interval', minutes=1, id='expiry_notifier')
+    s.add_job(expire_missed_posting_deadlines, 'interval', minutes=1, id='deadline_expirer')
+    
+    # Build ready-to-send payloads for the next few minutes' slots and queue their dispatchers
+    s.add_job(prewarm_upcoming_slots, 'interval', minutes=1, id='slot_prewarmer', replace_existing=True)
     
     # ✅ NEW JOB: Process follow-up messages every 5 minutes
     s.add_job(
@@ -864,16 +1267,38 @@ def start_scheduler():
         replace_existing=True
     )
     
-    # ✅ NEW JOB: Refresh channel subscribers periodically in the background
+    # ✅ NEW JOB: Refresh channel subscribers incrementally in the background
     s.add_job(
-        refresh_all_channels_subscribers,
+        refresh_channel_subscribers_tick,
         'interval',
-        minutes=30,
+        seconds=SUBSCRIBER_REFRESH_TICK_SECONDS,
         id='subscriber_refresher',
         next_run_time=datetime.now(),
         replace_existing=True
     )
 
+    # Subscriber gains of completed campaigns into the per-channel analytics rollups
+    s.add_job(roll_up_subscriber_gains_job, 'interval', minutes=15, id='analytics_rollup', replace_existing=True)
+
+    # Per-niche daily/weekly platform rollups for the admin dashboard
+    s.add_job(
+        roll_up_platform_analytics_job,
+        'cron',
+        minute=10,
+        id='platform_analytics_rollup',
+        replace_existing=True
+    )
+
+    # Fold yesterday's hourly subscriber samples into daily history
+    s.add_job(
+        downsample_subscriber_history_job,
+        'cron',
+        hour=0,
+        minute=30,
+        id='subscriber_history_downsampler',
+        replace_existing=True
+    )
+
     # FOLDER PROMO DAILY RUNS (06:00, 12:00, 16:00, 22:00 UTC)
     s.add_job(
         run_weekly_folder_promos,
@@ -887,108 +1312,583 @@ def start_scheduler():
     s.start()
     logging.info("[SCHEDULER] Scheduler started with follow-up message processing and background subscriber refresh")
 
-def refresh_all_channels_subscribers():
-    """Background job to refresh subscriber counts for all channels to avoid API limits on page load"""
-    from models import refresh_channel_subscribers_from_telegram
-    import time
+    if SCHEDULER_CHANGE_STREAMS or SCHEDULER_CATCHUP_ON_START:
+        threading.Thread(target=_leader_loop, name='scheduler-leader', daemon=True).start()
+
+
+# ====== LEADERSHIP ======
+# Every gunicorn worker runs the scheduler; work that must happen in exactly
+# one process is tied to a lease in scheduler_state
+
+PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+LEADER_LEASE = 'scheduler_leader'
+is_leader = threading.Event()
+_catch_up_started = threading.Event()
+
+
+def _leader_loop():
+    """Hold (or wait for) the leader lease, starting and stopping the leader-only work with it"""
+    while True:
+        try:
+            held = acquire_lease(LEADER_LEASE, PROCESS_ID, SCHEDULER_LEADER_LEASE_SECONDS)
+        except Exception as e:
+            logging.error(f"[SCHEDULER] Leader lease renewal failed: {e}")
+            held = False
+        
+        if held and not is_leader.is_set():
+            is_leader.set()
+            logging.info(f"[SCHEDULER] {PROCESS_ID} is now the scheduler leader")
+            _start_leader_duties()
+        elif not held and is_leader.is_set():
+            is_leader.clear()
+            logging.warning(f"[SCHEDULER] {PROCESS_ID} lost the scheduler leader lease")
+            _stop_leader_duties()
+        
+        time.sleep(SCHEDULER_LEADER_LEASE_SECONDS / 3)
+
+
+def _start_leader_duties():
+    """Change-stream watchers and the due-time queue they feed, and the start-up catch-up"""
+    if SCHEDULER_CATCHUP_ON_START and not _catch_up_started.is_set():
+        _catch_up_started.set()
+        threading.Thread(target=run_catch_up, name='scheduler-catch-up', daemon=True).start()
+    
+    if not SCHEDULER_CHANGE_STREAMS:
+        return
+    try:
+        from apscheduler.jobstores.mongodb import MongoDBJobStore
+        from change_streams import start_change_streams
+        s.add_jobstore(MongoDBJobStore(database=db.name, collection='scheduler_due_jobs', client=client), DUE_JOBSTORE)
+        start_change_streams(schedule_campaign_due, join_current_folder_promo_slot, rescan_due_campaigns)
+        logging.info("[SCHEDULER] Change stream watchers started")
+    except Exception as e:
+        logging.error(f"[SCHEDULER] Could not start leader duties: {e}")
+
+
+def _stop_leader_duties():
+    """Stop consuming changes and due runs; the queued runs stay in Mongo for the next leader"""
+    if not SCHEDULER_CHANGE_STREAMS:
+        return
+    from change_streams import stop_change_streams
+    stop_change_streams()
+    try:
+        s.remove_jobstore(DUE_JOBSTORE)
+    except KeyError:
+        pass
+    logging.info("[SCHEDULER] Change stream watchers stopped")
+
+
+# ====== CATCH-UP MODE ======
+# Progress of the current/last catch-up run (served by /api/admin/scheduler/catch-up)
+catch_up_status = {'state': 'idle'}
+
+CATCHUP_CHUNK_SIZE = 25
+# Held while a catch-up runs; the regular post/cleanup ticks of every worker skip meanwhile
+CATCHUP_LEASE = 'catch_up'
+CATCHUP_LEASE_SECONDS = 120
+
+
+def catch_up_running():
+    return lease_active(CATCHUP_LEASE)
+
+
+def get_catch_up_status():
+    """Progress of the current/last catch-up run in whichever worker ran it"""
+    saved = scheduler_state.find_one({'_id': 'catch_up_status'}, {'_id': 0, 'status': 1})
+    return saved['status'] if saved else dict(catch_up_status)
+
+
+def _save_catch_up_status():
+    scheduler_state.update_one(
+        {'_id': 'catch_up_status'},
+        {'$set': {'status': dict(catch_up_status), 'updated_at': datetime.utcnow()}},
+        upsert=True
+    )
+
+
+def run_catch_up():
+    """
+    Drain the post/cleanup backlog left by downtime at a controlled rate
+    Overdue deletions go first (oldest end_at first), then posts (oldest
+    start_at first). Posts more than SCHEDULER_CATCHUP_STALE_POST_MINUTES late
+    follow SCHEDULER_CATCHUP_STALE_POLICY:
+      post  - publish anyway (never once end_at has passed)
+      skip  - mark failed without publishing
+      shift - publish now and move end_at so the full duration still runs
+    Only one process runs it at a time (it holds CATCHUP_LEASE); the regular
+    post/cleanup ticks stand by until the backlog is drained
+    """
+    from dispatcher import TokenBucket
     
-    logging.info("[SCHEDULER] Starting background channel subscriber refresh")
+    if not acquire_lease(CATCHUP_LEASE, PROCESS_ID, CATCHUP_LEASE_SECONDS):
+        logging.info("[SCHEDULER] Catch-up is already running in another process")
+        return
+    
+    now = datetime.utcnow()
+    limiter = TokenBucket(SCHEDULER_CATCHUP_RATE)
+    stale_before = now - timedelta(minutes=SCHEDULER_CATCHUP_STALE_POST_MINUTES)
+    
+    catch_up_status.clear()
+    catch_up_status.update({
+        'state': 'running',
+        'started_at': now.isoformat(),
+        'policy': SCHEDULER_CATCHUP_STALE_POLICY,
+        'cleanups_total': 0, 'cleanups_done': 0,
+        'posts_total': 0, 'posts_done': 0, 'posts_skipped': 0, 'posts_shifted': 0,
+        'errors': 0
+    })
     
     try:
-        # Get all channels
-        all_channels = list(channels.find({}))
+        cleanups = list(campaigns.find(_due_cleanups_filter(now)).sort('end_at', 1))
+        posts = list(campaigns.find(_due_posts_filter(now)).sort('start_at', 1))
+        catch_up_status['cleanups_total'] = len(cleanups)
+        catch_up_status['posts_total'] = len(posts)
         
-        updated_count = 0
-        failed_count = 0
+        if cleanups or posts:
+            logging.info(f"[SCHEDULER] Catch-up: {len(cleanups)} overdue deletions, {len(posts)} overdue posts")
         
-        for channel in all_channels:
-            telegram_channel_id = channel.get('telegram_id')
-            telegram_identifier = telegram_channel_id or channel.get('username') or channel.get('telegram_chat')
-            
-            if not telegram_identifier:
-                continue
-                
-            try:
-                fresh_subscribers = refresh_channel_subscribers_from_telegram(telegram_identifier, TELEGRAM_BOT_TOKEN)
-                
-                if fresh_subscribers is not None:
-                    channels.update_one(
-                        {'_id': channel['_id']},
-                        {'$set': {'subscribers': fresh_subscribers}}
-                    )
-                    updated_count += 1
-                else:
-                    failed_count += 1
-                    
-                # Sleep briefly to avoid Telegram's rate limit of ~30 requests per second
-                time.sleep(0.1)
-                
-            except Exception as e:
-                logging.error(f"[SCHEDULER] Error refreshing subscribers for {telegram_identifier}: {e}")
-                failed_count += 1
-                
-        logging.info(f"[SCHEDULER] Finished subscriber refresh: {updated_count} updated, {failed_count} failed")
+        for start in range(0, len(cleanups), CATCHUP_CHUNK_SIZE):
+            chunk = cleanups[start:start + CATCHUP_CHUNK_SIZE]
+            channel_map = _auto_channel_map(chunk)
+            settlements = []
+            for camp in chunk:
+                limiter.acquire()
+                if not _cleanup_guarded(camp, channel_map, settlements, job='catch_up'):
+                    catch_up_status['errors'] += 1
+                catch_up_status['cleanups_done'] += 1
+            _settle_campaigns(settlements)
+            _log_catch_up_progress()
+        
+        for start in range(0, len(posts), CATCHUP_CHUNK_SIZE):
+            chunk = posts[start:start + CATCHUP_CHUNK_SIZE]
+            channel_map = _auto_channel_map(chunk)
+            for camp in chunk:
+                _catch_up_post(camp, channel_map, limiter, stale_before)
+                catch_up_status['posts_done'] += 1
+            _log_catch_up_progress()
+        
+        catch_up_status['state'] = 'done'
+        
+    except Exception as e:
+        logging.exception('[SCHEDULER] Catch-up failed')
+        catch_up_status['state'] = 'failed'
+        catch_up_status['error'] = str(e)
+    finally:
+        catch_up_status['finished_at'] = datetime.utcnow().isoformat()
+        _save_catch_up_status()
+        release_lease(CATCHUP_LEASE, PROCESS_ID)
+        logging.info(f"[SCHEDULER] Catch-up finished: {catch_up_status}")
+
+
+def _catch_up_post(camp, channel_map, limiter, stale_before):
+    now = datetime.utcnow()
+    start_at = camp.get('start_at')
+    end_at = camp.get('end_at')
+    stale = start_at is not None and start_at < stale_before
+    policy = SCHEDULER_CATCHUP_STALE_POLICY if stale else 'post'
+    
+    if policy == 'skip' or (policy == 'post' and end_at and end_at <= now):
+        _set_campaign_fields(camp, {'status': 'failed', 'error': 'Skipped: start time passed during scheduler downtime'})
+        catch_up_status['posts_skipped'] += 1
+        return
+    
+    if policy == 'shift' and start_at:
+        shifted = {'start_at': now, 'shifted_from': start_at}
+        if end_at:
+            shifted['end_at'] = now + (end_at - start_at)
+        if not _set_campaign_fields(camp, shifted):
+            return  # Picked up elsewhere meanwhile
+        camp.update(shifted)
+        catch_up_status['posts_shifted'] += 1
+    
+    # Bilateral campaigns send two posts
+    for _ in range(2 if camp.get('type') == 'cross_promo_auto' else 1):
+        limiter.acquire()
+    if not _post_guarded(camp, channel_map, job='catch_up'):
+        catch_up_status['errors'] += 1
+
+
+def _log_catch_up_progress():
+    """Log and publish progress after each chunk, renewing the catch-up lease"""
+    acquire_lease(CATCHUP_LEASE, PROCESS_ID, CATCHUP_LEASE_SECONDS)
+    _save_catch_up_status()
+    st = catch_up_status
+    logging.info(
+        f"[SCHEDULER] Catch-up progress: deletions {st['cleanups_done']}/{st['cleanups_total']}, "
+        f"posts {st['posts_done']}/{st['posts_total']} "
+        f"(skipped {st['posts_skipped']}, shifted {st['posts_shifted']}, errors {st['errors']})"
+    )
+
+
+# ====== CHANGE-STREAM DUE-TIME QUEUE ======
+# Due runs are APScheduler date jobs kept in Mongo, so together with the
+# persisted resume tokens a restart needs no rescan
+
+DUE_JOBSTORE = 'due'
+
+
+def run_due_posts():
+    check_and_post_campaigns()
+
+
+def run_due_cleanups():
+    cleanup_finished_campaigns()
+
+
+def _queue_due_run(func, due_at):
+    """Queue func for due_at (naive UTC); runs due in the same second share one job"""
+    run_at = max(due_at.replace(tzinfo=timezone.utc), datetime.now(timezone.utc))
+    s.add_job(
+        func,
+        'date',
+        run_date=run_at,
+        id=f"{func.__name__}:{run_at:%Y%m%d%H%M%S}",
+        jobstore=DUE_JOBSTORE,
+        misfire_grace_time=None,
+        coalesce=True,
+        replace_existing=True
+    )
+
+
+def schedule_campaign_due(camp):
+    """Push a changed campaign's next post or cleanup time into the due-time queue"""
+    status = camp.get('status')
+    campaign_type = camp.get('type', 'regular')
+    
+    if status == 'scheduled' or (status == 'pending_posting' and campaign_type == 'cross_promo_auto'):
+        if camp.get('start_at'):
+            _queue_due_run(run_due_posts, camp['start_at'])
+    elif status == 'running' or (status == 'active' and campaign_type in ('cross_promo_auto', 'folder_promo')):
+        if camp.get('end_at'):
+            _queue_due_run(run_due_cleanups, camp['end_at'])
+
+
+def rescan_due_campaigns():
+    """Rebuild the due-time queue from scratch (first start or lost resume token)"""
+    pending = campaigns.find(
+        {'$or': [
+            {'status': {'$in': ['scheduled', 'running']}},
+            {'status': 'pending_posting', 'type': 'cross_promo_auto'},
+            {'status': 'active', 'type': {'$in': ['cross_promo_auto', 'folder_promo']}}
+        ]},
+        {'status': 1, 'type': 1, 'start_at': 1, 'end_at': 1}
+    )
+    count = 0
+    for camp in pending:
+        schedule_campaign_due(camp)
+        count += 1
+    logging.info(f"[SCHEDULER] Rescanned {count} campaigns into the due-time queue")
+
+
+def _current_folder_promo_slot(now):
+    """Start of the folder promo slot (06, 12, 16 or 22 UTC) now falls in"""
+    for day in (now, now - timedelta(days=1)):
+        for hour in (22, 16, 12, 6):
+            slot = day.replace(hour=hour, minute=0, second=0, microsecond=0)
+            if slot <= now:
+                return slot
+
+
+def join_current_folder_promo_slot(reg):
+    """
+    Let a registration approved shortly after a slot started join that slot
+    instead of waiting for the next one
+    """
+    if reg.get('status') != 'approved':
+        return
+    
+    now = datetime.utcnow()
+    slot = _current_folder_promo_slot(now)
+    if now - slot > timedelta(minutes=FOLDER_PROMO_LATE_JOIN_MINUTES):
+        return
+    
+    config = folder_promo_configs.find_one({'niche': reg.get('niche')})
+    if not config:
+        return
+    
+    logging.info(f"[SCHEDULER] Late-joining registration {reg.get('id')} into the {slot:%H:%M} folder promo slot")
+    _post_folder_promo(reg, config, channels.find_one({'id': reg.get('channel_id')}), now, slot)
+
+
+@timed_job('subscriber_refresher')
+def refresh_channel_subscribers_tick():
+    """
+    Refresh a slice of channel subscriber counts
+    Runs every SUBSCRIBER_REFRESH_TICK_SECONDS and takes just enough channels
+    per tick to cover every channel once per SUBSCRIBER_REFRESH_INTERVAL_MINUTES.
+    Recently viewed channels go first, then approved and then the rest, each
+    oldest refresh first
+    """
+    from models import refresh_channel_subscribers_from_telegram, pop_viewed_channels, record_subscriber_samples
+    
+    try:
+        now = datetime.utcnow()
+        interval_seconds = SUBSCRIBER_REFRESH_INTERVAL_MINUTES * 60
+        stale_before = now - timedelta(seconds=interval_seconds)
+        budget = math.ceil(channels.estimated_document_count() * SUBSCRIBER_REFRESH_TICK_SECONDS / interval_seconds)
+        if budget <= 0:
+            return 0
+        
+        projection = {'_id': 1, 'id': 1, 'telegram_id': 1, 'username': 1, 'telegram_chat': 1, 'subscribers': 1}
+        due = []
         
+        # Viewed channels jump the queue unless they were refreshed within the last tick
+        viewed = list(pop_viewed_channels())
+        if viewed:
+            due.extend(channels.find({
+                'id': {'$in': viewed},
+                '$or': [
+                    {'subscribers_refreshed_at': {'$exists': False}},
+                    {'subscribers_refreshed_at': {'$lt': now - timedelta(seconds=SUBSCRIBER_REFRESH_TICK_SECONDS)}}
+                ]
+            }, projection).limit(budget))
+        
+        for status_filter in ({'status': 'approved'}, {'status': {'$ne': 'approved'}}):
+            remaining = budget - len(due)
+            if remaining <= 0:
+                break
+            query = dict(status_filter)
+            query['_id'] = {'$nin': [ch['_id'] for ch in due]}
+            query['$or'] = [
+                {'subscribers_refreshed_at': {'$exists': False}},
+                {'subscribers_refreshed_at': {'$lt': stale_before}}
+            ]
+            due.extend(channels.find(query, projection).sort('subscribers_refreshed_at', 1).limit(remaining))
+        
+        targets = []
+        for channel in due:
+            identifier = channel.get('telegram_id') or channel.get('username') or channel.get('telegram_chat')
+            if identifier:
+                targets.append((channel, identifier))
+        
+        results = dispatch(
+            refresh_channel_subscribers_from_telegram,
+            [(identifier, TELEGRAM_BOT_TOKEN) for _, identifier in targets],
+            workers=SUBSCRIBER_REFRESH_WORKERS
+        )
+        
+        # Still rate limited after dispatch's retries: those channels keep their place in the queue
+        limited = {channel['_id'] for (channel, _), fresh in zip(targets, results) if isinstance(fresh, dict)}
+        results = [None if isinstance(fresh, dict) else fresh for fresh in results]
+        if limited:
+            logging.warning(f"[SCHEDULER] Subscriber refresh rate limited by Telegram for {len(limited)} channels, retrying next tick")
+        
+        # Only counts that moved are rewritten; every other attempted channel goes to the back of the queue
+        changed = [
+            UpdateOne({'_id': channel['_id']}, {'$set': {'subscribers': fresh}})
+            for (channel, _), fresh in zip(targets, results)
+            if fresh is not None and fresh != channel.get('subscribers')
+        ]
+        failed_count = sum(1 for fresh in results if fresh is None)
+        if changed:
+            channels.bulk_write(changed, ordered=False)
+        record_subscriber_samples({
+            channel['id']: fresh
+            for (channel, _), fresh in zip(targets, results)
+            if fresh is not None and channel.get('id')
+        }, now)
+        attempted = [ch['_id'] for ch in due if ch['_id'] not in limited]
+        if attempted:
+            channels.update_many(
+                {'_id': {'$in': attempted}},
+                {'$set': {'subscribers_refreshed_at': now}}
+            )
+        
+        logging.info(f"[SCHEDULER] Subscriber refresh tick: {len(targets)} checked, {len(changed)} changed, {failed_count} failed")
+        return len(targets)
+        
+    except Exception as e:
+        logging.error(f"[SCHEDULER] Fatal error in refresh_channel_subscribers_tick: {e}")
+        job_errors.inc(job='subscriber_refresher')
+
+
+@timed_job('analytics_rollup')
+def roll_up_subscriber_gains_job():
+    """Add settled subscriber gains of completed campaigns to the channel analytics rollups"""
+    try:
+        done = roll_up_subscriber_gains()
+        if done:
+            logging.info(f"[SCHEDULER] Rolled up subscriber gains for {done} campaigns")
+        return done
     except Exception as e:
-        logging.error(f"[SCHEDULER] Fatal error in refresh_all_channels_subscribers: {e}")
+        logging.error(f"[SCHEDULER] Failed to roll up subscriber gains: {e}")
+        job_errors.inc(job='analytics_rollup')
 
+
+@timed_job('platform_analytics_rollup')
+def roll_up_platform_analytics_job():
+    """Rebuild the last few days (and their weeks) of the admin dashboard's platform rollups"""
+    try:
+        roll_up_platform_analytics()
+    except Exception as e:
+        logging.error(f"[SCHEDULER] Failed to roll up platform analytics: {e}")
+        job_errors.inc(job='platform_analytics_rollup')
+
+
+@timed_job('subscriber_history_downsampler')
+def downsample_subscriber_history_job():
+    """Roll hourly subscriber buckets up into daily documents before the TTL removes them"""
+    from models import downsample_subscriber_history
+    try:
+        downsample_subscriber_history()
+        logging.info("[SCHEDULER] Subscriber history downsampled")
+    except Exception as e:
+        logging.error(f"[SCHEDULER] Failed to downsample subscriber history: {e}")
+        job_errors.inc(job='subscriber_history_downsampler')
+
+
+@timed_job('folder_promo_runner')
+@scoped('folder_promo_runner')
 def run_weekly_folder_promos():
     """
-    Run weekly folder promotions on Saturdays at 16:00 UTC
+    Run folder promotions at the 06:00, 12:00, 16:00 and 22:00 UTC slots
+    Each niche's promo is posted once to the staging chat and copied into
+    every registered channel through the rate-limited dispatcher
     """
     logging.info("[SCHEDULER] Running weekly folder promos...")
     now = datetime.utcnow()
+    slot = _current_folder_promo_slot(now)
+    posted = 0
     
     try:
-        # Get all distinct niches with approved registrations
-        active_niches = folder_promo_registrations.distinct("niche", {"status": "approved"})
+        # Load every approved registration once and group it by niche
+        regs_by_niche = {}
+        for reg in folder_promo_registrations.find({"status": "approved"}):
+            regs_by_niche.setdefault(reg.get("niche"), []).append(reg)
+        
+        configs = {
+            cfg.get("niche"): cfg
+            for cfg in folder_promo_configs.find({"niche": {"$in": list(regs_by_niche)}})
+        }
+        channel_map = get_channels_by_ids(
+            reg.get("channel_id") for regs in regs_by_niche.values() for reg in regs
+        )
         
-        for niche in active_niches:
-            config = folder_promo_configs.find_one({"niche": niche})
+        new_campaigns = []
+        for niche, approved_regs in regs_by_niche.items():
+            config = configs.get(niche)
             if not config:
                 logging.warning(f"[SCHEDULER] No folder promo config found for niche: {niche}. Skipping.")
                 continue
-                
-            promo_text = config.get("text", "")
-            promo_link = config.get("folder_link", "")
-            promo_image = config.get("image_url", "")
-            
-            # Get all approved channels for this niche
-            approved_regs = list(folder_promo_registrations.find({"niche": niche, "status": "approved"}))
             
-            for reg in approved_regs:
-                channel_id = reg.get("channel_id")
-                user_id = reg.get("user_telegram_id")
-                channel = channels.find_one({"id": channel_id})
-                
-                if channel:
-                    chat_id = channel.get("telegram_id") or channel.get("username") or channel.get("telegram_chat")
-                    if chat_id:
-                        # Append formatting for chat_id if necessary
-                        if isinstance(chat_id, str) and not chat_id.startswith('-') and not chat_id.startswith('@'):
-                            chat_id = f"@{chat_id}"
-                            
-                        logging.info(f"[SCHEDULER] Sending folder promo for niche {niche} to {chat_id}")
-                        result = send_folder_promo_post(chat_id, promo_text, promo_link, promo_image, BOT_URL)
-                        
-                        if result and result.get('ok'):
-                            message_id = result.get('result', {}).get('message_id')
-                            
-                            # Create a campaign entry for this 12-hour period
-                            campaign_id = f"fp_camp_{user_id}_{niche}_{int(now.timestamp())}"
-                            
-                            campaigns.insert_one({
-                                'id': campaign_id,
-                                'type': 'folder_promo',
-                                'status': 'active',
-                                'user_id': user_id,
-                                'channel_id': channel_id,
-                                'chat_id': chat_id,
-                                'message_id': message_id,
-                                'start_at': now,
-                                'end_at': now + timedelta(hours=12),
-                                'created_at': now
-                            })
+            new_campaigns.extend(_fan_out_folder_promo(niche, config, approved_regs, channel_map, now, slot))
+        
+        # One round trip for the whole slot
+        posted = len(new_campaigns)
+        if new_campaigns:
+            try:
+                campaigns.insert_many(new_campaigns, ordered=False)
+            except BulkWriteError as e:
+                # Channels that already had this slot's campaign (late join or another run)
+                duplicates = sum(1 for err in e.details.get('writeErrors', []) if err.get('code') == 11000)
+                if duplicates != len(e.details.get('writeErrors', [])):
+                    raise
+                logging.warning(f"[SCHEDULER] {duplicates} channels already had a campaign for this folder promo slot")
+                posted -= duplicates
+        
+        logging.info(f"[SCHEDULER] Folder promos posted to {posted} channels")
+        return posted
                             
     except Exception as e:
         logging.error(f"[SCHEDULER] Fatal error in run_weekly_folder_promos: {e}")
+        job_errors.inc(job='folder_promo_runner')
+
+
+def _folder_promo_chat_id(channel):
+    if not channel:
+        return None
+    chat_id = channel.get("telegram_id") or channel.get("username") or channel.get("telegram_chat")
+    # Append formatting for chat_id if necessary
+    if isinstance(chat_id, str) and not chat_id.startswith('-') and not chat_id.startswith('@'):
+        chat_id = f"@{chat_id}"
+    return chat_id
+
+
+def _folder_promo_campaign(reg, chat_id, message_id, now, slot):
+    """Campaign entry for one channel's 12-hour folder promo period"""
+    user_id = reg.get("user_telegram_id")
+    return {
+        'id': f"fp_camp_{user_id}_{reg.get('niche')}_{int(now.timestamp())}",
+        'type': 'folder_promo',
+        'status': 'active',
+        'user_id': user_id,
+        'channel_id': reg.get("channel_id"),
+        'promo_slot': slot,
+        'chat_id': chat_id,
+        'message_id': message_id,
+        'start_at': now,
+        'end_at': now + timedelta(hours=12),
+        'created_at': now,
+        'updated_at': now
+    }
+
+
+def _fan_out_folder_promo(niche, config, regs, channel_map, now, slot):
+    """
+    Post one niche's promo to all of its registered channels
+    Returns the campaign documents for the channels it reached
+    """
+    targets = []
+    for reg in regs:
+        chat_id = _folder_promo_chat_id(channel_map.get(reg.get("channel_id")))
+        if chat_id:
+            targets.append((reg, chat_id))
+    if not targets:
+        return []
+    
+    promo_text = config.get("text", "")
+    promo_link = config.get("folder_link", "")
+    promo_image = config.get("image_url", "")
+    
+    staged = None
+    if FOLDER_PROMO_STAGING_CHAT_ID:
+        staged = send_folder_promo_post(FOLDER_PROMO_STAGING_CHAT_ID, promo_text, promo_link, promo_image, BOT_URL)
+        if not (staged and staged.get('ok')):
+            logging.error(f"[SCHEDULER] Staging post failed for niche {niche}, sending directly: {staged}")
+            staged = None
+    
+    logging.info(f"[SCHEDULER] Sending folder promo for niche {niche} to {len(targets)} channels")
+    if staged:
+        staged_id = staged['result'].get('message_id')
+        keyboard = folder_promo_keyboard(promo_link)
+        results = dispatch(copy_message, [(chat_id, FOLDER_PROMO_STAGING_CHAT_ID, staged_id, keyboard) for _, chat_id in targets])
+    else:
+        results = dispatch(send_folder_promo_post, [(chat_id, promo_text, promo_link, promo_image, BOT_URL) for _, chat_id in targets])
+    
+    docs = []
+    for (reg, chat_id), result in zip(targets, results):
+        if result and result.get('ok'):
+            docs.append(_folder_promo_campaign(reg, chat_id, result.get('result', {}).get('message_id'), now, slot))
+        else:
+            logging.error(f"[SCHEDULER] Folder promo for niche {niche} failed in {chat_id}: {result}")
+    
+    if staged:
+        delete_message(FOLDER_PROMO_STAGING_CHAT_ID, staged_id)
+    return docs
+
+
+def _post_folder_promo(reg, config, channel, now, slot):
+    """
+    Post a niche's folder promo to one registered channel and open its 12-hour campaign
+    The campaign is inserted as a 'posting' claim first; the unique slot/channel
+    index makes a repeated attempt (another worker, a replayed change) a no-op
+    """
+    chat_id = _folder_promo_chat_id(channel)
+    if not chat_id:
+        return
+    
+    camp = _folder_promo_campaign(reg, chat_id, None, now, slot)
+    camp.update({'status': 'posting', 'posting_claimed_at': now})
+    try:
+        campaigns.insert_one(camp)
+    except DuplicateKeyError:
+        logging.info(f"[SCHEDULER] Channel {reg.get('channel_id')} already has the {slot:%H:%M} folder promo")
+        return
+        
+    logging.info(f"[SCHEDULER] Sending folder promo for niche {reg.get('niche')} to {chat_id}")
+    result = send_folder_promo_post(chat_id, config.get("text", ""), config.get("folder_link", ""), config.get("image_url", ""), BOT_URL)
+    
+    if result and result.get('ok'):
+        _set_campaign_fields(camp, {'status': 'active', 'message_id': result.get('result', {}).get('message_id')})
+    else:
+        _set_campaign_fields(camp, {'status': 'failed', 'error': str(result)})
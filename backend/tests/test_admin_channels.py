@@ -0,0 +1,74 @@
+"""
+/api/admin/channels paging against a real MongoDB
+
+Needs TEST_MONGO_URI pointing at a database whose name ends in "_test"
+(it is wiped); skipped otherwise.
+
+    cd backend
+    TEST_MONGO_URI=mongodb://localhost:27017/cpgram_test python -m pytest tests
+"""
+import datetime
+import os
+import sys
+
+import pytest
+
+pytest.importorskip('flask')
+pytest.importorskip('pymongo')
+
+MONGO_URI = os.environ.get('TEST_MONGO_URI', '')
+if not MONGO_URI.rsplit('/', 1)[-1].split('?', 1)[0].endswith('_test'):
+    pytest.skip('TEST_MONGO_URI (a *_test database) is not set', allow_module_level=True)
+
+ADMIN_ID = '900000001'
+
+os.environ.update({
+    'MONGO_URI': MONGO_URI,
+    'ADMIN_TELEGRAM_ID': ADMIN_ID,
+    'TELEGRAM_BOT_TOKEN': 'test-token',
+    'NO_SCHEDULER': '1'
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import models  # noqa: E402
+from app import app  # noqa: E402
+from auth import create_token  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    models.channels.delete_many({})
+    models.users.delete_many({})
+    now = datetime.datetime.utcnow()
+    for i in range(5):
+        channel = {'id': f"ch_{i}", 'name': f"Channel {i}", 'username': f"channel{i}",
+                   'owner_id': f"owner_{i}", 'status': 'approved'}
+        # The two oldest channels predate created_at
+        if i >= 2:
+            channel['created_at'] = now + datetime.timedelta(minutes=i)
+        models.channels.insert_one(channel)
+    return app.test_client()
+
+
+def test_admin_channels_two_pages(client):
+    headers = {'Authorization': f"Bearer {create_token(ADMIN_ID)}"}
+
+    first = client.get('/api/admin/channels?limit=3', headers=headers)
+    assert first.status_code == 200
+    body = first.get_json()
+    assert [ch['id'] for ch in body['channels']] == ['ch_4', 'ch_3', 'ch_2']
+    assert all('_id' not in ch for ch in body['channels'])
+    assert body['next_cursor']
+    assert body['counts']['approved'] == 5
+
+    second = client.get(f"/api/admin/channels?limit=3&cursor={body['next_cursor']}", headers=headers)
+    assert second.status_code == 200
+    body = second.get_json()
+    assert [ch['id'] for ch in body['channels']] == ['ch_1', 'ch_0']
+    assert body['next_cursor'] is None
+    assert 'counts' not in body
+
+
+def test_admin_channels_rejects_bad_cursor(client):
+    headers = {'Authorization': f"Bearer {create_token(ADMIN_ID)}"}
+    assert client.get('/api/admin/channels?cursor=not-a-cursor', headers=headers).status_code == 400
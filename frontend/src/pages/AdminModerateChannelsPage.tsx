@@ -53,6 +53,18 @@ interface Channel {
   xExchanges: number;
   created_at: string;
   updated_at: string;
+  // Sizes sent with list rows; the lists themselves come with the details
+  promoCount: number;
+  daysCount: number;
+  slotsCount: number;
+}
+
+interface ChannelCounts {
+  total: number;
+  pending: number;
+  approved: number;
+  rejected: number;
+  paused: number;
 }
 
 interface Owner {
@@ -68,13 +80,17 @@ export default function AdminModerateChannelsPage() {
 
   const [channels, setChannels] = useState<Channel[]>([]);
   const [owners, setOwners] = useState<{ [key: string]: Owner }>({});
+  const [counts, setCounts] = useState<ChannelCounts | null>(null);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [success, setSuccess] = useState<string | null>(null);
 
   // Filters
   const [statusFilter, setStatusFilter] = useState<'all' | 'pending' | 'approved' | 'rejected' | 'paused'>('pending');
   const [searchQuery, setSearchQuery] = useState('');
+  const [debouncedSearch, setDebouncedSearch] = useState('');
 
   // Modal state
   const [selectedChannel, setSelectedChannel] = useState<Channel | null>(null);
@@ -83,6 +99,12 @@ export default function AdminModerateChannelsPage() {
   const [reason, setReason] = useState('');
   const [processing, setProcessing] = useState(false);
 
+  // Search runs on the server, so wait for a pause in typing
+  useEffect(() => {
+    const timer = setTimeout(() => setDebouncedSearch(searchQuery.trim()), 300);
+    return () => clearTimeout(timer);
+  }, [searchQuery]);
+
   useEffect(() => {
     if (!user) {
       navigate('/login');
@@ -90,44 +112,77 @@ export default function AdminModerateChannelsPage() {
     }
 
     fetchChannels();
-  }, [user, navigate]);
+  }, [user, navigate, statusFilter, debouncedSearch]);
+
+  const normalizeChannel = (channel: any): Channel => ({
+    ...channel,
+    name: safeString(channel.name),
+    username: safeString(channel.username),
+    telegram_id: safeString(channel.telegram_id),
+    avatar: safeString(channel.avatar),
+    subscribers: safeNumber(channel.subscribers),
+    avgViews24h: safeNumber(channel.avgViews24h),
+    language: safeString(channel.language),
+    topic: safeString(channel.topic),
+    acceptedDays: safeArray<string>(channel.selected_days),
+    promosPerDay: safeNumber(channel.promos_per_day),
+    durationPrices: Object.fromEntries(
+      Object.entries(safeObject(channel.price_settings))
+        .filter(([, setting]) => setting?.enabled)
+        .map(([hours, setting]) => [hours, safeNumber(setting.price)])
+    ),
+    availableTimeSlots: safeArray<string>(channel.time_slots),
+    promoMaterials: safeArray<Channel['promoMaterials'][0]>(channel.promo_materials),
+    owner_id: safeString(channel.owner_id),
+    status: safeString(channel.status) || 'pending',
+    xExchanges: safeNumber(channel.xExchanges),
+    created_at: safeString(channel.created_at),
+    updated_at: safeString(channel.updated_at),
+    promoCount: safeNumber(channel.promo_count ?? safeArray(channel.promo_materials).length),
+    daysCount: safeNumber(channel.days_count ?? safeArray(channel.selected_days).length),
+    slotsCount: safeNumber(channel.slots_count ?? safeArray(channel.time_slots).length)
+  });
 
-  const fetchChannels = async () => {
+  const fetchChannels = async (cursor?: string) => {
     try {
-      setLoading(true);
+      if (cursor) {
+        setLoadingMore(true);
+      }
       setError(null);
-      const data = await apiService.getAllChannels();
+      const data = await apiService.getAllChannels({
+        status: statusFilter !== 'all' ? statusFilter : undefined,
+        search: debouncedSearch || undefined,
+        cursor
+      });
       
       // Validate and normalize channel data
-      const validatedChannels = safeArray<Channel>(data?.channels).map(channel => ({
-        ...channel,
-        name: safeString(channel.name),
-        username: safeString(channel.username),
-        telegram_id: safeString(channel.telegram_id),
-        avatar: safeString(channel.avatar),
-        subscribers: safeNumber(channel.subscribers),
-        avgViews24h: safeNumber(channel.avgViews24h),
-        language: safeString(channel.language),
-        topic: safeString(channel.topic),
-        acceptedDays: safeArray<string>(channel.acceptedDays),
-        promosPerDay: safeNumber(channel.promosPerDay),
-        durationPrices: safeObject(channel.durationPrices),
-        availableTimeSlots: safeArray<string>(channel.availableTimeSlots),
-        promoMaterials: safeArray<Channel['promoMaterials'][0]>(channel.promoMaterials),
-        owner_id: safeString(channel.owner_id),
-        status: safeString(channel.status) || 'pending',
-        xExchanges: safeNumber(channel.xExchanges),
-        created_at: safeString(channel.created_at),
-        updated_at: safeString(channel.updated_at)
-      }));
+      const validatedChannels = safeArray<any>(data?.channels).map(normalizeChannel);
       
-      setChannels(validatedChannels);
-      setOwners(safeObject(data?.owners));
+      setChannels(prev => (cursor ? [...prev, ...validatedChannels] : validatedChannels));
+      setOwners(prev => (cursor ? { ...prev, ...safeObject(data?.owners) } : safeObject(data?.owners)));
+      setNextCursor(data?.next_cursor || null);
+      if (data?.counts) {
+        setCounts(data.counts);
+      }
     } catch (err: any) {
       console.error('Error fetching channels:', err);
       setError(err.message || 'Failed to load channels');
     } finally {
       setLoading(false);
+      setLoadingMore(false);
+    }
+  };
+
+  const openDetails = async (channel: Channel) => {
+    setSelectedChannel(channel);
+    try {
+      // List rows are slim; load the full channel for the details view
+      const data = await apiService.getAdminChannel(channel.id);
+      if (data?.channel) {
+        setSelectedChannel(current => (current?.id === channel.id ? normalizeChannel(data.channel) : current));
+      }
+    } catch (err: any) {
+      console.error('Error fetching channel details:', err);
     }
   };
 
@@ -156,6 +211,15 @@ export default function AdminModerateChannelsPage() {
         )
       );
 
+      setCounts(prev => {
+        if (!prev) return prev;
+        const next = actionType === 'approve' ? 'approved' : 'rejected';
+        const previous = selectedChannel.status as keyof ChannelCounts;
+        return previous in prev && previous !== next
+          ? { ...prev, [previous]: prev[previous] - 1, [next]: prev[next] + 1 }
+          : prev;
+      });
+
       setSuccess(`Channel ${actionType === 'approve' ? 'approved' : 'rejected'} successfully!`);
       setShowModal(false);
       setSelectedChannel(null);
@@ -168,38 +232,14 @@ export default function AdminModerateChannelsPage() {
     }
   };
 
-  const filteredChannels = channels.filter(channel => {
-    try {
-      // Status filter
-      if (statusFilter !== 'all' && channel.status !== statusFilter) {
-        return false;
-      }
-
-      // Search filter
-      if (searchQuery) {
-        const query = searchQuery.toLowerCase();
-        const owner = owners[channel.owner_id];
-        return (
-          safeString(channel.name).toLowerCase().includes(query) ||
-          safeString(channel.username).toLowerCase().includes(query) ||
-          safeString(channel.topic).toLowerCase().includes(query) ||
-          safeString(owner?.first_name).toLowerCase().includes(query) ||
-          safeString(owner?.username).toLowerCase().includes(query)
-        );
-      }
-
-      return true;
-    } catch (err) {
-      console.error('Error filtering channel:', err);
-      return false;
-    }
-  });
+  // Status and search are applied by the server
+  const filteredChannels = channels;
 
   const stats = {
-    pending: channels.filter(ch => ch.status === 'pending').length,
-    approved: channels.filter(ch => ch.status === 'approved').length,
-    rejected: channels.filter(ch => ch.status === 'rejected').length,
-    total: channels.length
+    pending: safeNumber(counts?.pending),
+    approved: safeNumber(counts?.approved),
+    rejected: safeNumber(counts?.rejected),
+    total: safeNumber(counts?.total)
   };
 
   if (loading) {
@@ -293,7 +333,7 @@ export default function AdminModerateChannelsPage() {
                 type="text"
                 value={searchQuery}
                 onChange={(e) => setSearchQuery(e.target.value)}
-                placeholder="Search channels, owners, topics..."
+                placeholder="Channel name or username starts with..."
                 className="input-glass w-full pl-12 py-3.5 focus:shadow-[0_0_15px_rgba(0,240,255,0.1)] font-sans"
               />
             </div>
@@ -332,10 +372,7 @@ export default function AdminModerateChannelsPage() {
           ) : (
             filteredChannels.map((channel) => {
               const owner = owners[channel.owner_id];
-              const acceptedDays = safeArray(channel.acceptedDays);
-              const timeSlots = safeArray(channel.availableTimeSlots);
-              const promoMaterials = safeArray(channel.promoMaterials);
-              
+
               return (
                 <div
                   key={channel.id}
@@ -404,14 +441,14 @@ export default function AdminModerateChannelsPage() {
                       <div className="bg-surface/50 border border-surfaceBorder rounded-xl p-4 flex flex-col justify-center">
                         <p className="text-contentMuted text-xs font-bold tracking-widest uppercase mb-1">Settings</p>
                         <div className="flex items-center gap-3">
-                           <span className="text-neon-cyan font-mono font-bold text-sm flex items-center gap-1" title="Accepted Days"><Calendar size={14}/> {acceptedDays.length}</span>
-                           <span className="text-neon-violet font-mono font-bold text-sm flex items-center gap-1" title="Time Slots"><Users size={14}/> {timeSlots.length}</span>
+                           <span className="text-neon-cyan font-mono font-bold text-sm flex items-center gap-1" title="Accepted Days"><Calendar size={14}/> {channel.daysCount}</span>
+                           <span className="text-neon-violet font-mono font-bold text-sm flex items-center gap-1" title="Time Slots"><Users size={14}/> {channel.slotsCount}</span>
                         </div>
                       </div>
                       <div className="bg-surface/50 border border-surfaceBorder rounded-xl p-4 flex flex-col justify-center">
                         <p className="text-contentMuted text-xs font-bold tracking-widest uppercase mb-1">Materials</p>
                         <p className="text-neon-emerald font-mono font-bold text-xl flex items-center gap-2">
-                           <TrendingUp size={20}/> {promoMaterials.length}
+                           <TrendingUp size={20}/> {channel.promoCount}
                         </p>
                       </div>
                     </div>
@@ -435,7 +472,7 @@ export default function AdminModerateChannelsPage() {
 
                       <div className="flex flex-col sm:flex-row xl:flex-col gap-2 mt-auto">
                         <button
-                          onClick={() => setSelectedChannel(channel)}
+                          onClick={() => openDetails(channel)}
                           className="flex-1 btn-secondary py-2.5 px-4 rounded-xl text-sm font-bold flex items-center justify-center gap-2 group/btn"
                         >
                           <Eye size={16} className="text-contentMuted group-hover/btn:text-white" />
@@ -469,6 +506,18 @@ export default function AdminModerateChannelsPage() {
           )}
         </div>
 
+        {nextCursor && (
+          <div className="flex justify-center mt-8">
+            <button
+              onClick={() => fetchChannels(nextCursor)}
+              disabled={loadingMore}
+              className="btn-secondary py-3 px-8 rounded-xl text-sm font-bold disabled:opacity-50 disabled:cursor-not-allowed"
+            >
+              {loadingMore ? 'LOADING...' : 'LOAD MORE'}
+            </button>
+          </div>
+        )}
+
         {/* Action Modal */}
         {showModal && selectedChannel && actionType && (
           <div className="fixed inset-0 bg-obsidian/90 backdrop-blur-md flex items-center justify-center z-50 p-4 animate-in fade-in duration-200">
@@ -42,8 +42,21 @@ export default function CampaignsPage() {
   useEffect(() => {
     if (user) {
       fetchCampaigns();
-      const interval = setInterval(fetchCampaigns, 30000);
-      return () => clearInterval(interval);
+      // Refetch when the server says a campaign changed; poll only if streaming is unavailable
+      let interval: ReturnType<typeof setInterval> | null = null;
+      const unsubscribe = apiService.subscribeToEvents((type) => {
+        if (type.startsWith('campaign_') || type === 'request_accepted') {
+          fetchCampaigns();
+        }
+      }, () => {
+        interval = setInterval(fetchCampaigns, 30000);
+      });
+      return () => {
+        unsubscribe();
+        if (interval) {
+          clearInterval(interval);
+        }
+      };
     }
   }, [user]);
 
@@ -263,8 +263,20 @@ async updateUserSettings(settings: UserSettings): Promise<SettingsResponse> {
 
   // Admin endpoints
 
-async getAllChannels(): Promise<any> {
-  const response = await this.api.get('/api/admin/channels');
+async getAllChannels(params: {
+  status?: string;
+  topic?: string;
+  language?: string;
+  search?: string;
+  cursor?: string;
+  limit?: number;
+} = {}): Promise<any> {
+  const response = await this.api.get('/api/admin/channels', { params });
+  return response.data;
+}
+
+async getAdminChannel(channelId: string): Promise<any> {
+  const response = await this.api.get(`/api/admin/channels/${channelId}`);
   return response.data;
 }
 
@@ -469,6 +481,77 @@ async adminRejectFolderPromo(regId: string, reason: string): Promise<any> {
     localStorage.setItem('authToken', token);
   }
 
+  // --- Live events (Server-Sent Events) ---
+  // Calls onEvent for every campaign, request and balance event of the user.
+  // onUnavailable is called once if the server has streaming turned off (or a
+  // ticket cannot be had), so the caller can fall back to polling.
+  // Returns a function that closes the stream.
+  subscribeToEvents(onEvent: (type: string, data: any) => void, onUnavailable: () => void): () => void {
+    const types = [
+      'request_received', 'request_accepted', 'request_declined',
+      'campaign_posted', 'campaign_ended', 'reward_credited', 'balance_changed'
+    ];
+    let source: EventSource | null = null;
+    let retry: ReturnType<typeof setTimeout> | null = null;
+    let lastEventId = '';
+    let closed = false;
+
+    const handler = (event: MessageEvent) => {
+      if (event.lastEventId) {
+        lastEventId = event.lastEventId;
+      }
+      try {
+        onEvent(event.type, JSON.parse(event.data));
+      } catch {
+        // Ignore malformed events
+      }
+    };
+
+    // Every (re)connect gets a fresh short-lived ticket; the browser's own
+    // reconnect would reuse an expired one
+    const connect = async () => {
+      let ticket: string;
+      try {
+        const response = await this.api.post('/api/events/ticket');
+        ticket = response.data.ticket;
+      } catch {
+        if (!closed) {
+          onUnavailable();
+        }
+        return;
+      }
+      if (closed) {
+        return;
+      }
+      const params = new URLSearchParams({ ticket });
+      if (lastEventId) {
+        params.set('last_event_id', lastEventId);
+      }
+      source = new EventSource(`${API_BASE_URL}/api/events?${params.toString()}`);
+      types.forEach(type => source!.addEventListener(type, handler as EventListener));
+      source.onerror = () => {
+        source?.close();
+        source = null;
+        if (!closed) {
+          retry = setTimeout(connect, 3000);
+        }
+      };
+    };
+
+    if (!this.getToken() || typeof EventSource === 'undefined') {
+      onUnavailable();
+    } else {
+      connect();
+    }
+    return () => {
+      closed = true;
+      if (retry) {
+        clearTimeout(retry);
+      }
+      source?.close();
+    };
+  }
+
   // Clear auth
   clearAuth(): void {
     localStorage.removeItem('authToken');